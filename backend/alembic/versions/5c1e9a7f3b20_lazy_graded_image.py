@@ -0,0 +1,38 @@
+"""graded images rendered on demand from the grading result
+
+Revision ID: 5c1e9a7f3b20
+Revises: d236ca4eb141
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9a7f3b20'
+down_revision: Union[str, None] = 'd236ca4eb141'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # batch mode so SQLite can change the column's nullability
+    with op.batch_alter_table('submission') as batch_op:
+        batch_op.add_column(sa.Column('result', sa.String(), nullable=True))
+        batch_op.alter_column('graded_image', existing_type=sa.LargeBinary(), nullable=True)
+
+
+def downgrade() -> None:
+    # submissions that were never viewed have no graded image yet, they keep their grades
+    pending = op.get_bind().execute(sa.text(
+        "SELECT count(*) FROM submission WHERE graded_image IS NULL")).scalar()
+    if pending:
+        raise RuntimeError(f"{pending} submissions have no graded image yet, request them "
+                           "(GET /submission/image/graded/{id}) so they are rendered before downgrading")
+
+    with op.batch_alter_table('submission') as batch_op:
+        batch_op.alter_column('graded_image', existing_type=sa.LargeBinary(), nullable=False)
+        batch_op.drop_column('result')
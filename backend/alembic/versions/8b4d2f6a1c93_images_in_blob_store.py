@@ -0,0 +1,93 @@
+"""image columns moved out of the database into the blob store
+
+Revision ID: 8b4d2f6a1c93
+Revises: 5c1e9a7f3b20
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from blobstore import blob_store
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4d2f6a1c93'
+down_revision: Union[str, None] = '5c1e9a7f3b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table: [(image column, required), ...]
+IMAGE_COLUMNS = {
+    'submission': [('submission_image', True), ('graded_image', False)],
+    'tests': [('answer_key_blank', True), ('answer_key_filled', True)],
+}
+
+
+def move_blobs(table: str, source: str, store: bool) -> None:
+    '''
+    copy every image of table.source into the blob store (store=True) or back
+    into the row, one row at a time so the images are never all in memory
+    '''
+    conn = op.get_bind()
+    if store:
+        ids = conn.execute(sa.text(f"SELECT id FROM {table} WHERE {source} IS NOT NULL")).scalars().all()
+    else:
+        ids = conn.execute(sa.text(f"SELECT id FROM {table} WHERE {source}_hash IS NOT NULL")).scalars().all()
+
+    for row_id in ids:
+        if store:
+            data = conn.execute(sa.text(f"SELECT {source} FROM {table} WHERE id = :id"), {"id": row_id}).scalar()
+            digest, size = blob_store.put(bytes(data))
+            conn.execute(
+                sa.text(f"UPDATE {table} SET {source}_hash = :digest, {source}_size = :size WHERE id = :id"),
+                {"digest": digest, "size": size, "id": row_id},
+            )
+        else:
+            digest = conn.execute(sa.text(f"SELECT {source}_hash FROM {table} WHERE id = :id"), {"id": row_id}).scalar()
+            conn.execute(
+                sa.text(f"UPDATE {table} SET {source} = :data WHERE id = :id"),
+                {"data": blob_store.get(digest), "id": row_id},
+            )
+
+
+def upgrade() -> None:
+    for table, columns in IMAGE_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column, _ in columns:
+                batch_op.add_column(sa.Column(f'{column}_hash', sa.String(64), nullable=True))
+                batch_op.add_column(sa.Column(f'{column}_size', sa.Integer(), nullable=True))
+
+        for column, _ in columns:
+            move_blobs(table, column, store=True)
+
+        # batch mode so SQLite can change nullability and drop the columns
+        with op.batch_alter_table(table) as batch_op:
+            for column, required in columns:
+                if required:
+                    batch_op.alter_column(f'{column}_hash', existing_type=sa.String(64), nullable=False)
+                    batch_op.alter_column(f'{column}_size', existing_type=sa.Integer(), nullable=False)
+                batch_op.drop_column(column)
+                # db.release_blobs looks blobs up by hash
+                batch_op.create_index(op.f(f'ix_{table}_{column}_hash'), [f'{column}_hash'])
+
+
+def downgrade() -> None:
+    # the blobs are left in the store, they are shared and cheap to sweep later
+    for table, columns in IMAGE_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column, _ in columns:
+                batch_op.add_column(sa.Column(column, sa.LargeBinary(), nullable=True))
+
+        for column, _ in columns:
+            move_blobs(table, column, store=False)
+
+        with op.batch_alter_table(table) as batch_op:
+            for column, required in columns:
+                if required:
+                    batch_op.alter_column(column, existing_type=sa.LargeBinary(), nullable=False)
+                batch_op.drop_index(op.f(f'ix_{table}_{column}_hash'))
+                batch_op.drop_column(f'{column}_hash')
+                batch_op.drop_column(f'{column}_size')
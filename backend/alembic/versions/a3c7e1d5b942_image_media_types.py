@@ -0,0 +1,109 @@
+"""stored images kept as plain image files with their media type
+
+Revision ID: a3c7e1d5b942
+Revises: 8b4d2f6a1c93
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+import io
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from PIL import Image
+
+from blobstore import blob_store
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c7e1d5b942'
+down_revision: Union[str, None] = '8b4d2f6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table: [(image column, required), ...]
+IMAGE_COLUMNS = {
+    'submission': [('submission_image', True), ('graded_image', False)],
+    'tests': [('answer_key_blank', True), ('answer_key_filled', True)],
+}
+
+
+def convert_blobs(table: str, column: str, upgrade: bool) -> set:
+    '''
+    upgrade: replace the zlib compressed blobs of table.column by the image they
+    hold and record its media type. downgrade: zlib compress them again.
+
+    returns the hashes that were replaced
+    '''
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        f"SELECT id, {column}_hash FROM {table} WHERE {column}_hash IS NOT NULL")).all()
+
+    replaced = set()
+    for row_id, digest in rows:
+        data = blob_store.get(digest)
+        if upgrade:
+            try:
+                data = zlib.decompress(data)
+            except zlib.error:
+                pass # already a plain image
+            media_type = Image.MIME[Image.open(io.BytesIO(data)).format]
+        else:
+            data, media_type = zlib.compress(data, level=9), None
+
+        new_digest, size = blob_store.put(data)
+        values = {"digest": new_digest, "size": size, "id": row_id}
+        if upgrade:
+            values["type"] = media_type
+            conn.execute(sa.text(
+                f"UPDATE {table} SET {column}_hash = :digest, {column}_size = :size, "
+                f"{column}_type = :type WHERE id = :id"), values)
+        else:
+            conn.execute(sa.text(
+                f"UPDATE {table} SET {column}_hash = :digest, {column}_size = :size WHERE id = :id"), values)
+        if new_digest != digest:
+            replaced.add(digest)
+    return replaced
+
+
+def release(replaced: set) -> None:
+    '''
+    delete the replaced blobs no row uses anymore
+    '''
+    conn = op.get_bind()
+    in_use = set()
+    for table, columns in IMAGE_COLUMNS.items():
+        for column, _ in columns:
+            in_use.update(conn.execute(sa.text(f"SELECT {column}_hash FROM {table}")).scalars())
+    for digest in replaced - in_use:
+        blob_store.delete(digest)
+
+
+def upgrade() -> None:
+    replaced = set()
+    for table, columns in IMAGE_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column, _ in columns:
+                batch_op.add_column(sa.Column(f'{column}_type', sa.String(32), nullable=True))
+
+        for column, _ in columns:
+            replaced |= convert_blobs(table, column, upgrade=True)
+
+        with op.batch_alter_table(table) as batch_op:
+            for column, required in columns:
+                if required:
+                    batch_op.alter_column(f'{column}_type', existing_type=sa.String(32), nullable=False)
+    release(replaced)
+
+
+def downgrade() -> None:
+    replaced = set()
+    for table, columns in IMAGE_COLUMNS.items():
+        for column, _ in columns:
+            replaced |= convert_blobs(table, column, upgrade=False)
+
+        with op.batch_alter_table(table) as batch_op:
+            for column, _ in columns:
+                batch_op.drop_column(f'{column}_type')
+    release(replaced)
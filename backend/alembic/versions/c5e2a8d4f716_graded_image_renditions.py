@@ -0,0 +1,39 @@
+"""preview and thumbnail sizes of the graded image
+
+Revision ID: c5e2a8d4f716
+Revises: a3c7e1d5b942
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e2a8d4f716'
+down_revision: Union[str, None] = 'a3c7e1d5b942'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RENDITIONS = ('graded_preview', 'graded_thumbnail')
+
+
+def upgrade() -> None:
+    # existing submissions get theirs the next time their graded image is viewed
+    with op.batch_alter_table('submission') as batch_op:
+        for rendition in RENDITIONS:
+            batch_op.add_column(sa.Column(f'{rendition}_hash', sa.String(64), nullable=True))
+            batch_op.add_column(sa.Column(f'{rendition}_size', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column(f'{rendition}_type', sa.String(32), nullable=True))
+            batch_op.create_index(op.f(f'ix_submission_{rendition}_hash'), [f'{rendition}_hash'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('submission') as batch_op:
+        for rendition in RENDITIONS:
+            batch_op.drop_index(op.f(f'ix_submission_{rendition}_hash'))
+            batch_op.drop_column(f'{rendition}_hash')
+            batch_op.drop_column(f'{rendition}_size')
+            batch_op.drop_column(f'{rendition}_type')
@@ -0,0 +1,45 @@
+"""answer key images drawn after the test is created
+
+Revision ID: e8d3b6f1a247
+Revises: c5e2a8d4f716
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8d3b6f1a247'
+down_revision: Union[str, None] = 'c5e2a8d4f716'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+IMAGE_COLUMNS = ('answer_key_blank', 'answer_key_filled')
+
+
+def upgrade() -> None:
+    # every existing test has its images already
+    with op.batch_alter_table('tests') as batch_op:
+        batch_op.add_column(sa.Column('answer_key_status', sa.String(16), nullable=False, server_default='ready'))
+        for column in IMAGE_COLUMNS:
+            batch_op.alter_column(f'{column}_hash', existing_type=sa.String(64), nullable=True)
+            batch_op.alter_column(f'{column}_size', existing_type=sa.Integer(), nullable=True)
+            batch_op.alter_column(f'{column}_type', existing_type=sa.String(32), nullable=True)
+
+
+def downgrade() -> None:
+    pending = op.get_bind().execute(sa.text(
+        "SELECT count(*) FROM tests WHERE answer_key_blank_hash IS NULL OR answer_key_filled_hash IS NULL")).scalar()
+    if pending:
+        raise RuntimeError(f"{pending} tests have no answer key images yet, request them "
+                           "(GET /test/image/key/{id}/) so they are drawn before downgrading")
+
+    with op.batch_alter_table('tests') as batch_op:
+        for column in IMAGE_COLUMNS:
+            batch_op.alter_column(f'{column}_hash', existing_type=sa.String(64), nullable=False)
+            batch_op.alter_column(f'{column}_size', existing_type=sa.Integer(), nullable=False)
+            batch_op.alter_column(f'{column}_type', existing_type=sa.String(32), nullable=False)
+        batch_op.drop_column('answer_key_status')
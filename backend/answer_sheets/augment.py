@@ -0,0 +1,304 @@
+"""
+LiveTest /answer_sheets/augment.py
+
+Turns Pictron answer sheets into synthetic phone "photographs" for stress testing
+the mechanical=False path of the OMRGrader (isolate_document / register_fiducials
+and everything after it) without collecting real photos.
+
+Every photo is built from a seeded RNG so a corpus can be regenerated exactly:
+    perspective   the page's corners are jittered independently
+    rotation      small in plane tilt plus, sometimes, a quarter/half turn
+    clutter       the sheet lies on a textured desk with papers, pens and blobs
+    lighting      smooth brightness gradient and vignette
+    shadow        a soft edged polygon darkening part of the photo
+    blur          gaussian (focus) or linear (motion) blur
+    noise         sensor noise
+    jpeg          re-encoded at a random quality
+
+The ground truth written next to each photo holds the answer key and where the
+page's top-left, top-right, bottom-right and bottom-left corners ended up in the
+photo, so both grading accuracy and registration error can be measured.
+
+usage:
+    python augment.py --out generatedSheets/photos --count 50 --seed 7
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# how far each effect may go at severity 1.0, effects scale linearly with severity
+AUGMENT_LIMITS = {
+    "tilt_deg": 12.0,           # in plane rotation on top of the quarter turns
+    "quarter_turn_prob": 0.35,  # chance the sheet is turned 90/180/270 degrees
+    "perspective": 0.07,        # corner jitter as a fraction of the sheet's width
+    "lighting": 0.45,           # brightness swing of the gradient
+    "shadow_prob": 0.6,
+    "shadow_strength": 0.45,
+    "blur_sigma": 2.2,
+    "motion_blur_px": 13,
+    "noise_sigma": 6.0,
+    "jpeg_quality": (40, 95),
+    "clutter_items": 14,
+}
+
+
+class PhotoAugmenter:
+    '''
+    seed: RNG seed, the same seed and sheets give the same photos
+    photo_size: (width, height) of the produced photos, a 12MP portrait phone photo by default
+    severity: 0 places the sheet cleanly, 1 uses AUGMENT_LIMITS, > 1 goes past them
+    fill: range of the photo's short side the sheet's width spans
+    '''
+    def __init__(self, seed:int=None, photo_size:tuple=(3024, 4032),
+                 severity:float=1.0, fill:tuple=(0.55, 0.85)):
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.photo_size = tuple(photo_size)
+        self.severity = severity
+        self.fill = fill
+
+
+    def uniform(self, low, high):
+        return float(self.rng.uniform(low, high))
+
+
+    def chance(self, p):
+        return bool(self.rng.random() < min(1.0, p * self.severity))
+
+
+    def place_sheet(self, sheet_size):
+        '''
+        pick where the sheet's corners land in the photo
+
+        returns (corners, quarter_turns, tilt) corners ordered as the page's
+        top-left, top-right, bottom-right, bottom-left
+        '''
+        W, H = self.photo_size
+        w, h = sheet_size
+        limit = AUGMENT_LIMITS
+
+        quarter_turns = int(self.rng.integers(1, 4)) if self.chance(limit["quarter_turn_prob"]) else 0
+        tilt = self.uniform(-1, 1) * limit["tilt_deg"] * self.severity
+
+        for _ in range(50):
+            angle = np.deg2rad(quarter_turns * 90 + tilt)
+            # the sheet's extent along the photo's short side after turning
+            across = w if quarter_turns % 2 == 0 else h
+            scale = self.uniform(*self.fill) * min(W, H) / across
+
+            half = np.array([[-w, -h], [w, -h], [w, h], [-w, h]], dtype=np.float64) * scale / 2
+            rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+            corners = half @ rotation.T
+            corners += self.rng.uniform(-1, 1, corners.shape) * limit["perspective"] * self.severity * w * scale
+
+            # keep the sheet fully in frame with a small margin
+            span = corners.max(axis=0) - corners.min(axis=0)
+            margin = 0.02 * min(W, H)
+            room = np.array([W, H]) - span - 2 * margin
+            if (room <= 0).any():
+                continue
+            offset = np.array([margin, margin]) - corners.min(axis=0) + self.rng.uniform(0, 1, 2) * room
+            return (corners + offset).astype(np.float32), quarter_turns, tilt
+
+        raise ValueError("sheet does not fit the photo, lower fill or severity")
+
+
+    def clutter(self):
+        '''
+        a desk like background: base color, wood like texture and random objects
+        '''
+        W, H = self.photo_size
+        base = self.rng.integers(30, 200, 3)
+        background = np.empty((H, W, 3), np.uint8)
+        background[:] = base
+
+        # low frequency texture, generated small and upscaled
+        texture = self.rng.normal(0, 18, (H // 64 + 1, W // 16 + 1)).astype(np.float32)
+        texture = cv2.resize(texture, (W, H), interpolation=cv2.INTER_CUBIC)
+        background = np.clip(background + texture[..., None], 0, 255).astype(np.uint8)
+
+        for _ in range(int(self.rng.integers(0, AUGMENT_LIMITS["clutter_items"] * self.severity + 1))):
+            color = tuple(int(c) for c in self.rng.integers(0, 256, 3))
+            kind = self.rng.integers(0, 3)
+            if kind == 0: # papers, books, phones
+                center = tuple(float(v) for v in self.rng.uniform(0, 1, 2) * (W, H))
+                size = tuple(float(v) for v in self.rng.uniform(0.08, 0.45, 2) * min(W, H))
+                box = cv2.boxPoints((center, size, self.uniform(0, 180))).astype(np.int32)
+                cv2.fillPoly(background, [box], color, lineType=cv2.LINE_AA)
+            elif kind == 1: # pens, cables
+                p1 = tuple(int(v) for v in self.rng.uniform(0, 1, 2) * (W, H))
+                p2 = tuple(int(v) for v in self.rng.uniform(0, 1, 2) * (W, H))
+                cv2.line(background, p1, p2, color, int(self.rng.integers(6, 40)), lineType=cv2.LINE_AA)
+            else: # cups, stains
+                center = tuple(int(v) for v in self.rng.uniform(0, 1, 2) * (W, H))
+                cv2.circle(background, center, int(self.rng.uniform(0.02, 0.12) * min(W, H)),
+                           color, -1, lineType=cv2.LINE_AA)
+        return background
+
+
+    def lighting(self, image):
+        '''
+        multiply the photo by a smooth brightness field, a linear gradient plus a vignette
+        '''
+        H, W = image.shape[:2]
+        swing = AUGMENT_LIMITS["lighting"] * self.severity
+        y, x = np.mgrid[0:H:8, 0:W:8].astype(np.float32)
+        angle = self.uniform(0, 2 * np.pi)
+        gradient = (np.cos(angle) * x / W + np.sin(angle) * y / H)
+        gradient = (gradient - gradient.min()) / max(1e-6, np.ptp(gradient))
+        cx, cy = self.uniform(0.2, 0.8) * W, self.uniform(0.2, 0.8) * H
+        vignette = np.hypot(x - cx, y - cy) / np.hypot(W, H)
+
+        field = 1.0 - swing * (self.uniform(0.3, 1.0) * gradient + self.uniform(0, 0.8) * vignette)
+        field += self.uniform(-0.1, 0.15) * self.severity # overall exposure
+        field = cv2.resize(field.astype(np.float32), (W, H), interpolation=cv2.INTER_LINEAR)
+        return np.clip(image * field[..., None], 0, 255).astype(np.uint8)
+
+
+    def shadow(self, image):
+        '''
+        darken a random soft edged polygon, a hand or phone between the sheet and the light
+        '''
+        H, W = image.shape[:2]
+        mask = np.zeros((H // 4, W // 4), np.float32)
+        center = self.rng.uniform(0, 1, 2) * (W // 4, H // 4)
+        radius = self.uniform(0.15, 0.5) * min(W, H) / 4
+        angles = np.sort(self.rng.uniform(0, 2 * np.pi, int(self.rng.integers(4, 9))))
+        points = center + np.stack([np.cos(angles), np.sin(angles)], axis=1) * \
+            radius * self.rng.uniform(0.5, 1.5, (len(angles), 1))
+        cv2.fillPoly(mask, [points.astype(np.int32)], 1.0)
+        mask = cv2.GaussianBlur(mask, (0, 0), self.uniform(5, 25))
+        mask = cv2.resize(mask, (W, H), interpolation=cv2.INTER_LINEAR)
+
+        strength = AUGMENT_LIMITS["shadow_strength"] * self.severity * self.uniform(0.4, 1.0)
+        return np.clip(image * (1 - strength * mask[..., None]), 0, 255).astype(np.uint8)
+
+
+    def blur(self, image):
+        if self.chance(0.5):
+            sigma = self.uniform(0.3, 1.0) * AUGMENT_LIMITS["blur_sigma"] * self.severity
+            return cv2.GaussianBlur(image, (0, 0), max(sigma, 0.1)), {"type": "gaussian", "sigma": round(sigma, 3)}
+
+        length = max(1, int(self.uniform(0.2, 1.0) * AUGMENT_LIMITS["motion_blur_px"] * self.severity))
+        kernel = np.zeros((length, length), np.float32)
+        kernel[length // 2, :] = 1.0 / length
+        angle = self.uniform(0, 180)
+        rotation = cv2.getRotationMatrix2D(((length - 1) / 2, (length - 1) / 2), angle, 1.0)
+        kernel = cv2.warpAffine(kernel, rotation, (length, length))
+        kernel /= max(kernel.sum(), 1e-6)
+        return cv2.filter2D(image, -1, kernel), {"type": "motion", "length": length, "angle": round(angle, 2)}
+
+
+    def augment(self, sheet):
+        '''
+        sheet: the answer sheet, a PIL image (Pictron.image) or a BGR numpy array
+
+        returns (jpeg_bytes, truth)
+        truth: {"corners": [[x, y] * 4], "photo_size": [w, h], "quarter_turns": 0, ...}
+        '''
+        if isinstance(sheet, Image.Image):
+            sheet = cv2.cvtColor(np.asarray(sheet.convert("RGB")), cv2.COLOR_RGB2BGR)
+        h, w = sheet.shape[:2]
+        W, H = self.photo_size
+
+        corners, quarter_turns, tilt = self.place_sheet((w, h))
+        M = cv2.getPerspectiveTransform(
+            np.float32([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]]), corners)
+
+        photo = self.clutter()
+        warped = cv2.warpPerspective(sheet, M, (W, H), flags=cv2.INTER_LINEAR)
+        mask = cv2.warpPerspective(np.full((h, w), 255, np.uint8), M, (W, H), flags=cv2.INTER_LINEAR)
+        alpha = (mask.astype(np.float32) / 255)[..., None]
+        photo = (warped * alpha + photo * (1 - alpha)).astype(np.uint8)
+
+        photo = self.lighting(photo)
+        shadowed = self.chance(AUGMENT_LIMITS["shadow_prob"])
+        if shadowed:
+            photo = self.shadow(photo)
+        photo, blur = self.blur(photo)
+
+        noise_sigma = self.uniform(0.2, 1.0) * AUGMENT_LIMITS["noise_sigma"] * self.severity
+        noise = self.rng.standard_normal(photo.shape, dtype=np.float32) * noise_sigma
+        photo = np.clip(photo + noise, 0, 255).astype(np.uint8)
+
+        low, high = AUGMENT_LIMITS["jpeg_quality"]
+        quality = int(round(high - (high - low) * min(1.0, self.severity) * self.rng.random()))
+        success, encoded = cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not success:
+            raise ValueError("could not encode the photo")
+
+        truth = {
+            "corners": corners.round(2).tolist(),
+            "photo_size": [W, H],
+            "sheet_size": [w, h],
+            "quarter_turns": quarter_turns,
+            "tilt_deg": round(tilt, 3),
+            "shadow": shadowed,
+            "blur": blur,
+            "noise_sigma": round(noise_sigma, 3),
+            "jpeg_quality": quality,
+            "severity": self.severity,
+        }
+        return encoded.tobytes(), truth
+
+
+def generate_corpus(out_path:str, count:int, seed:int=0, choices=(2, 3, 4, 5, 6, 7),
+                    questions=(10, 20, 30, 40, 50, 75, 100, 150, 200), **augmenter_kwargs):
+    '''
+    write count augmented photos of random filled Pictron sheets (cycling through
+    the given templates) to out_path as photo-NNNN.jpg with a photo-NNNN.json holding
+    the ground truth, the template and the answer key.
+
+    returns the list of written photo paths
+    '''
+    from answer_sheets.main import Pictron
+
+    os.makedirs(out_path, exist_ok=True)
+    random.seed(seed) # Pictron fills the bubbles with the random module
+    augmenter = PhotoAugmenter(seed=seed, **augmenter_kwargs)
+    templates = [(c, q) for c in choices for q in questions]
+
+    paths = []
+    for i in range(count):
+        num_choices, num_questions = templates[i % len(templates)]
+        pictron = Pictron(**Pictron.find_best_config(num_questions, num_choices))
+        pictron.generate(random_filled=True)
+        photo, truth = augmenter.augment(pictron.image)
+
+        truth |= {
+            "num_choices": num_choices,
+            "num_questions": num_questions,
+            "key": {str(q): c for q, c in pictron.random_choices.items()},
+        }
+        name = os.path.join(out_path, f"photo-{i:04d}")
+        with open(f"{name}.jpg", "wb") as photo_file:
+            photo_file.write(photo)
+        with open(f"{name}.json", "w") as truth_file:
+            json.dump(truth, truth_file)
+        paths.append(f"{name}.jpg")
+
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic photos of filled LiveTest answer sheets.")
+    parser.add_argument("--out", default="generatedSheets/photos", help="output directory")
+    parser.add_argument("--count", type=int, default=20, help="number of photos")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--severity", type=float, default=1.0, help="0 clean, 1 default limits, >1 harsher")
+    parser.add_argument("--choices", type=int, nargs="+", default=[2, 3, 4, 5, 6, 7])
+    parser.add_argument("--questions", type=int, nargs="+", default=[10, 20, 30, 40, 50, 75, 100, 150, 200])
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    paths = generate_corpus(args.out, args.count, seed=args.seed, choices=args.choices,
+                            questions=args.questions, severity=args.severity)
+    print(f"wrote {len(paths)} photos to {args.out}")
@@ -9,9 +9,29 @@ there is an example in the __main__ func below.
 '''
 
 import cv2
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import numpy as np
+import functools
+import io
+import math
 import os
+import sys
+import threading
+import time
+import itertools
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    from answer_sheets.templates import registry, template_size
+except ModuleNotFoundError: # run as a script from answer_sheets/
+    from templates import registry, template_size
+
+try:
+    import resource # peak memory samples, not available on Windows
+except ImportError:
+    resource = None
 
 
 class DocumentExtractionFailedError(Exception):
@@ -57,6 +77,53 @@ def show_image(title, temp):
 
 
 
+class Scratch(threading.local):
+    '''
+    working buffers and the CLAHE object, reused from sheet to sheet instead of being
+    allocated for every one. One set per thread, a worker grades one sheet at a time
+    on each of its threads.
+
+    only for arrays that are done with by the end of the stage that fills them,
+    whatever a grader keeps (image, gray, thresh) is its own array.
+    '''
+    def __init__(self):
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self.buffers = {}
+
+    def buffer(self, name:str, shape:tuple, dtype=np.uint8):
+        '''
+        the buffer called name, reallocated only when a sheet of another size comes along
+        '''
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self.buffers[name] = np.empty(shape, dtype)
+        return buffer
+
+
+scratch = Scratch()
+
+
+@functools.lru_cache(maxsize=None)
+def square_kernel(size:int):
+    '''
+    size x size structuring element for cv2.dilate, shared and read only
+    '''
+    kernel = np.ones((size, size), np.uint8)
+    kernel.setflags(write=False)
+    return kernel
+
+
+def to_gray(image, buffer:str=None):
+    '''
+    image in grayscale, image itself when it already is. Written to the scratch
+    buffer called buffer when one is given
+    '''
+    if image.ndim == 2:
+        return image
+    dst = scratch.buffer(buffer, image.shape[:2]) if buffer is not None else None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=dst)
+
+
 def pre_process(image):
     '''
     prepares the image for finding contours.
@@ -75,36 +142,147 @@ def pre_process(image):
     Once we have the edges detected we dilate the image to further bring out the edges into the foreground
     This helps with splotchy background in removing background noise. 
     '''
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-    thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
-    edges = cv2.Canny(thresh, 50, 150)
-    kernel = np.ones((5, 5), np.uint8)
-    dilated = cv2.dilate(edges, kernel, iterations=2)
+    gray = to_gray(image, "pre_process_gray")
+    # blurred and thresholded in the same buffer
+    thresh = cv2.GaussianBlur(gray, (5, 5), 0, dst=scratch.buffer("pre_process_thresh", gray.shape))
+    cv2.threshold(thresh, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU, dst=thresh)
+    edges = cv2.Canny(thresh, 50, 150, edges=scratch.buffer("pre_process_edges", gray.shape))
+    dilated = cv2.dilate(edges, square_kernel(5), iterations=2)
     return dilated
 
 
-def equalize_histogram(image):
+# photos are decoded at a reduced size (see reduced_decode_factor) as long as the
+# template's smallest bubble keeps at least this many pixels across, assuming the
+# sheet spans at least MIN_SHEET_FILL of the photo's short side
+MIN_BUBBLE_PX = 24
+MIN_SHEET_FILL = 0.5
+
+# cv2.imdecode flags that have libjpeg scale a JPEG down while decoding it
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def reduced_decode_factor(image_bytes:bytes, min_short_side:int) -> int:
+    '''
+    the largest factor in REDUCED_DECODE_FLAGS a photo can be decoded smaller by and
+    keep min_short_side pixels on its short side. Only read from the JPEG's header, 
+    other formats are decoded at full size (1), they would be decoded in full anyway.
+    '''
+    if not image_bytes.startswith(b"\xff\xd8"):
+        return 1
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as header:
+            short_side = min(header.size)
+    except Exception:
+        return 1 # let cv2.imdecode report it
+    for factor in sorted(REDUCED_DECODE_FLAGS, reverse=True):
+        if short_side // factor >= min_short_side:
+            return factor
+    return 1
+
+
+# pixels the dilation in pre_process grows the edges outward by, (5 // 2) * 2 iterations
+PRE_PROCESS_GROWTH = 4
+
+
+def shrink_quad(pts, distance):
+    '''
+    move every vertex of a convex quadrilateral inward so each side moves by distance,
+    undoes the outward growth of the edges from pre_process's dilation.
+    '''
+    pts = pts.astype(np.float32)
+    shrunk = pts.copy()
+    for i in range(4):
+        p, a, b = pts[i], pts[i - 1], pts[(i + 1) % 4]
+        u1 = (a - p) / max(np.linalg.norm(a - p), 1e-6)
+        u2 = (b - p) / max(np.linalg.norm(b - p), 1e-6)
+        bisector = u1 + u2
+        norm = np.linalg.norm(bisector)
+        if norm < 1e-6:
+            continue
+        # half the angle between the two sides meeting at this vertex
+        sin_half = np.sqrt(max((1 - float(np.dot(u1, u2))) / 2, 1e-6))
+        shrunk[i] = p + bisector / norm * (distance / sin_half)
+    return shrunk
+
+
+def equalize_histogram(image, dst=None):
     """
     Applies adaptive histogram equalization to the input image to improve contrast.
     
     Parameters:
-    image (numpy.ndarray): Input image in BGR format.
+    image (numpy.ndarray): Input image, grayscale or BGR.
+    dst (numpy.ndarray): Optional grayscale buffer to write the result to.
     
     Returns:
-    numpy.ndarray: Image after applying CLAHE.
+    numpy.ndarray: Grayscale image after applying CLAHE.
     """
-    # convert the image to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # create a CLAHE object with a clip limit of 2.0 and a tile grid size of 8x8
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    
-    # apply CLAHE to the grayscale image
-    equalized = clahe.apply(gray)
-    
-    # convert the equalized grayscale image back to BGR format
-    return cv2.cvtColor(equalized, cv2.COLOR_GRAY2BGR)
+    # the thread's CLAHE object, clip limit of 2.0 and a tile grid size of 8x8
+    return scratch.clahe.apply(to_gray(image), dst=dst)
+
+
+def refine_corners(image, corners, search_radius:int, samples:int=24):
+    '''
+    refine document corners that were found on a downscaled copy against the full resolution image.
+
+    every side of the quadrilateral is probed with short intensity profiles taken across it,
+    the strongest step in each profile is the paper's edge. A line is fit through those edge
+    points per side and neighbouring lines are intersected to give the refined corners.
+    Only the probed pixels are ever read, the full image is never converted or scanned.
+
+    Parameters:
+    image (numpy.ndarray): full resolution grayscale (or BGR) image
+    corners (numpy.ndarray): (4, 2) float32 corners in image's pixel space, in order around the quad
+    search_radius (int): how far (px) across each side to look for the edge
+    samples (int): profiles taken along each side
+
+    Returns:
+    numpy.ndarray: the refined (4, 2) float32 corners, or corners if a side could not be fit
+    '''
+    corners = corners.astype(np.float32)
+    offsets = np.arange(-search_radius, search_radius + 1, dtype=np.float32)
+    # stay clear of the alignment images printed in the sheet's corners
+    along = np.linspace(0.15, 0.85, samples, dtype=np.float32)
+
+    lines = []
+    for i in range(4):
+        p0, p1 = corners[i], corners[(i + 1) % 4]
+        direction = (p1 - p0) / max(np.linalg.norm(p1 - p0), 1e-6)
+        normal = np.array([-direction[1], direction[0]], dtype=np.float32)
+
+        base = p0 + (p1 - p0) * along[:, None]
+        map_x = (base[:, 0:1] + normal[0] * offsets[None, :]).astype(np.float32)
+        map_y = (base[:, 1:2] + normal[1] * offsets[None, :]).astype(np.float32)
+        profiles = cv2.remap(image, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        if profiles.ndim == 3:
+            profiles = cv2.cvtColor(profiles, cv2.COLOR_BGR2GRAY)
+
+        steps = np.abs(np.diff(profiles.astype(np.float32), axis=1))
+        edge = steps.argmax(axis=1)
+        strong = steps[np.arange(samples), edge] > 20
+        if strong.sum() < samples // 2:
+            return corners
+
+        shift = offsets[edge[strong]] + 0.5
+        points = base[strong] + normal[None, :] * shift[:, None]
+        vx, vy, x0, y0 = cv2.fitLine(points, cv2.DIST_HUBER, 0, 0.01, 0.01).ravel()
+        lines.append((np.array([x0, y0]), np.array([vx, vy])))
+
+    refined = []
+    for i in range(4):
+        (a, da), (b, db) = lines[i - 1], lines[i]
+        # solve a + s * da = b + t * db
+        matrix = np.array([da, -db]).T
+        if abs(np.linalg.det(matrix)) < 1e-6:
+            return corners
+        s, _ = np.linalg.solve(matrix, b - a)
+        refined.append(a + s * da)
+
+    return np.array(refined, dtype=np.float32)
 
 
 def order_points(pts):
@@ -124,10 +302,13 @@ def order_points(pts):
     return rect
 
 
-def four_point_transform(image, pts):
+def four_point_transform(image, pts, size=None):
     '''
     given four vertices of an identified rectangular contour
     perform a four point birds eye transformation of the answer sheet
+
+    size: (width, height) to warp straight to, like a template's canonical page size.
+          defaults to the size of the identified rectangle.
     '''
     rect = order_points(pts)
     (tl, tr, br, bl) = rect
@@ -140,19 +321,263 @@ def four_point_transform(image, pts):
     heightB = np.sqrt(((tl[0] - bl[0]) ** 2) + ((tl[1] - bl[1]) ** 2))
     maxHeight = max(int(heightA), int(heightB))
 
-    dst = np.array([
-        [0, 0],
-        [maxWidth - 1, 0],
-        [maxWidth - 1, maxHeight - 1],
-        [0, maxHeight - 1]
-    ], dtype="float32")
+    if size is not None:
+        maxWidth, maxHeight = size
 
-    M = cv2.getPerspectiveTransform(rect, dst)
-    warped = cv2.warpPerspective(image, M, (maxWidth, maxHeight), borderMode=cv2.BORDER_REPLICATE)
+    warped = warp_corners(image, rect, (maxWidth, maxHeight))
     # show_image("warped", warped)
     return warped
 
 
+def page_corners(size):
+    '''
+    top-left, top-right, bottom-right, bottom-left pixel of a (width, height) page
+    '''
+    w, h = size
+    return np.array([
+        [0, 0],
+        [w - 1, 0],
+        [w - 1, h - 1],
+        [0, h - 1]
+    ], dtype="float32")
+
+
+def warp_corners(image, corners, size):
+    '''
+    warp the quadrilateral given by the page's top-left, top-right, bottom-right and 
+    bottom-left corners (in that order, no reordering is done) to a (width, height) image
+    '''
+    M = cv2.getPerspectiveTransform(np.asarray(corners, dtype="float32"), page_corners(size))
+    return cv2.warpPerspective(image, M, tuple(size), borderMode=cv2.BORDER_REPLICATE)
+
+
+def rotate_template(template, angle:float):
+    '''
+    template turned by angle degrees (counter clockwise in image coordinates) about its center
+    '''
+    if abs(angle) < 0.5:
+        return template
+    h, w = template.shape[:2]
+    M = cv2.getRotationMatrix2D(((w - 1) / 2, (h - 1) / 2), angle, 1.0)
+    return cv2.warpAffine(template, M, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def fiducial_tilt(gray, template, candidates, angles=np.arange(-15, 15.1, 2.5)):
+    '''
+    the angle (cv2.getRotationMatrix2D convention) the alignment image is turned by in
+    the photo, found by matching turned templates around the strongest candidates.
+
+    candidates: [(score, (cx, cy), size), ...] from fiducial_candidates
+    '''
+    best_angle, best_score = 0.0, -2.0
+    h, w = gray.shape[:2]
+    for _, (cx, cy), size in candidates:
+        margin = max(3, size // 6)
+        x1, y1 = int(max(0, cx - size / 2 - margin)), int(max(0, cy - size / 2 - margin))
+        window = gray[y1:int(min(h, cy + size / 2 + margin)), x1:int(min(w, cx + size / 2 + margin))]
+        if window.shape[0] <= size or window.shape[1] <= size:
+            continue
+        for angle in angles:
+            turned = cv2.resize(rotate_template(template, angle), (size, size), interpolation=cv2.INTER_AREA)
+            score = cv2.minMaxLoc(cv2.matchTemplate(window, turned, cv2.TM_CCOEFF_NORMED))[1]
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def fiducial_candidates(gray, template, sizes, min_score:float=0.35, limit:int=12, min_coarse:int=10):
+    '''
+    multi scale template matching of the alignment image, returns the strongest
+    distinct matches as [(score, (cx, cy), size), ...] best first.
+
+    every size is matched on the coarsest pyramid level of gray where the template
+    still spans min_coarse px (two per checkerboard square), each level costs a
+    quarter of the one above. Matches found on a coarse level are re-matched in 
+    their neighbourhood on gray itself so positions and scores are full resolution.
+
+    a match is kept if it is the local maximum of its response and no better
+    match (at any size) already sits within half a template of it.
+    '''
+    h, w = gray.shape[:2]
+    levels = [gray]
+    peaks = []
+
+    for size in sizes:
+        size = int(round(size))
+        if size < 8 or size >= min(h, w) // 2:
+            continue
+        level = 0
+        while size / 2 ** (level + 1) >= min_coarse:
+            level += 1
+        while len(levels) <= level:
+            levels.append(cv2.resize(levels[-1], None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA))
+        scale = 2 ** level
+        level_size = int(round(size / scale))
+        scaled = cv2.resize(template, (level_size, level_size), interpolation=cv2.INTER_AREA)
+        response = cv2.matchTemplate(levels[level], scaled, cv2.TM_CCOEFF_NORMED)
+
+        # response[y, x] is the match with its top left corner at x, y
+        local_max = (response >= cv2.dilate(response, square_kernel(max(3, level_size // 2)))) & (response >= min_score)
+        ys, xs = np.nonzero(local_max)
+        for x, y in zip(xs, ys):
+            peaks.append((float(response[y, x]), ((x + level_size / 2) * scale, (y + level_size / 2) * scale), size, scale))
+
+    peaks.sort(key=lambda peak: peak[0], reverse=True)
+    kept = []
+    for score, (cx, cy), size, scale in peaks:
+        if any(np.hypot(cx - kx, cy - ky) <= max(size, ks) / 2 for _, (kx, ky), ks in kept):
+            continue
+        if scale > 1:
+            score, (cx, cy) = rematch_fiducial(gray, template, (cx, cy), size, radius=2 * scale)
+        kept.append((score, (cx, cy), size))
+        if len(kept) == limit:
+            break
+    kept.sort(key=lambda peak: peak[0], reverse=True)
+    return kept
+
+
+def rematch_fiducial(gray, template, center, size:int, radius:int):
+    '''
+    match the alignment image at size px within radius px of center,
+    returns (score, (cx, cy)) of the best match
+    '''
+    h, w = gray.shape[:2]
+    cx, cy = center
+    x1, y1 = int(max(0, cx - size / 2 - radius)), int(max(0, cy - size / 2 - radius))
+    x2, y2 = int(min(w, cx + size / 2 + radius + 1)), int(min(h, cy + size / 2 + radius + 1))
+    if x2 - x1 < size or y2 - y1 < size:
+        return -1.0, center
+    scaled = cv2.resize(template, (size, size), interpolation=cv2.INTER_AREA)
+    _, score, _, (x, y) = cv2.minMaxLoc(cv2.matchTemplate(gray[y1:y2, x1:x2], scaled, cv2.TM_CCOEFF_NORMED))
+    return float(score), (x1 + x + size / 2, y1 + y + size / 2)
+
+
+def find_fiducials(gray, template, sizes, aspect:float, spacing:float, min_score:float=0.35, candidates=None):
+    '''
+    locate the four alignment images in a (downscaled) grayscale photo.
+
+    the strongest matches (see fiducial_candidates) are combined four at a time and
+    the best scoring combination that could be the corners of the page wins: a
+    convex quad whose sides have the page's proportions (either way round, allowing
+    for perspective) with fiducials of similar size for its side lengths. Where the
+    sheet lies in the photo does not matter and clutter rarely lines up like a page.
+
+    the alignment checkerboard is symmetric under 90 degree rotations so one template
+    finds it however the sheet is turned.
+
+    Parameters:
+    gray (numpy.ndarray): single channel image to search
+    template (numpy.ndarray): single channel alignment image
+    sizes (iterable): template widths (px) to try
+    aspect (float): width / height of the quad the fiducial centers form on the page
+    spacing (float): fiducial width / distance between the top two fiducial centers on the page
+    min_score (float): lowest accepted normalized correlation
+    candidates (list): fiducial_candidates output to use instead of searching again
+
+    Returns:
+    (centers, size, score): (4, 2) float32 centers ordered top-left, top-right, bottom-right,
+    bottom-left of the photo, the mean matched template width and the summed match
+    score, or (None, None, 0)
+    '''
+    if candidates is None:
+        candidates = fiducial_candidates(gray, template, sizes, min_score)
+    best, best_score = None, -1.0
+
+    for combo in itertools.combinations(candidates, 4):
+        found_sizes = [size for _, _, size in combo]
+        if max(found_sizes) > 1.6 * min(found_sizes):
+            continue
+
+        quad = order_points(np.array([center for _, center, _ in combo], dtype=np.float32))
+        if not cv2.isContourConvex(quad.reshape(-1, 1, 2)):
+            continue
+
+        top, right, bottom, left = (np.linalg.norm(quad[(i + 1) % 4] - quad[i]) for i in range(4))
+        if min(top, right, bottom, left) < 1:
+            continue
+        # opposite sides only differ by perspective
+        if not (0.6 < top / bottom < 1.67 and 0.6 < left / right < 1.67):
+            continue
+        # the page's proportions, upright or turned a quarter
+        ratio = (top + bottom) / (left + right)
+        if min(abs(np.log(ratio / aspect)), abs(np.log(ratio * aspect))) > 0.25:
+            continue
+        # fiducials as big as the page they sit on says they should be
+        if abs(np.log(np.mean(found_sizes) / (spacing * max(top, bottom, left, right)))) > 0.5:
+            continue
+
+        score = sum(score for score, _, _ in combo)
+        if score > best_score:
+            best, best_score = (quad, float(np.mean(found_sizes))), score
+
+    if best is None:
+        return None, None, 0.0
+    return best[0], best[1], best_score
+
+
+def peak_rss_kb():
+    '''
+    peak resident set size of this process so far in KiB, None where it can't be read
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # macOS reports bytes
+
+
+def score_bubbles(thresh, bubbles):
+    '''
+    count the foreground pixels inside every bubble contour in one pass over the page.
+
+    every bubble is filled into a single label image with its own id (1..n), then
+    the thresholded foreground pixels are histogrammed by label. This replaces
+    allocating, masking and scanning a full page sized mask for every bubble.
+
+    Parameters:
+    thresh (numpy.ndarray): binary (0/255) single channel image
+    bubbles (list): contours of the bubbles to score
+
+    Returns:
+    numpy.ndarray: foreground pixel count per bubble, same order as bubbles
+    '''
+    labels = np.zeros(thresh.shape[:2], dtype=np.int32)
+    for i, c in enumerate(bubbles):
+        cv2.drawContours(labels, [c], -1, i + 1, -1)
+
+    counts = np.bincount(labels[thresh > 0], minlength=len(bubbles) + 1)
+    return counts[1:]
+
+
+def score_boxes(thresh, boxes, inset=0.25):
+    '''
+    count the foreground pixels inside the center of every box using an integral image,
+    so each box costs four lookups no matter how many boxes are on the page.
+
+    the outer inset fraction of each side is skipped so the printed bubble outline
+    (and small misregistrations) do not count towards the fill.
+
+    Parameters:
+    thresh (numpy.ndarray): binary (0/255) single channel image
+    boxes (array like): [[x1, y1, x2, y2], ...] in thresh's pixel space
+    inset (float): fraction of the width/height trimmed off every side
+
+    Returns:
+    numpy.ndarray: foreground pixel count per box, same order as boxes
+    '''
+    integral = cv2.integral(thresh // 255)
+    h, w = thresh.shape[:2]
+
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    dx = (boxes[:, 2] - boxes[:, 0]) * inset
+    dy = (boxes[:, 3] - boxes[:, 1]) * inset
+    x1 = np.clip(np.round(boxes[:, 0] + dx), 0, w).astype(np.intp)
+    y1 = np.clip(np.round(boxes[:, 1] + dy), 0, h).astype(np.intp)
+    x2 = np.clip(np.round(boxes[:, 2] - dx), 0, w).astype(np.intp)
+    y2 = np.clip(np.round(boxes[:, 3] - dy), 0, h).astype(np.intp)
+
+    return integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+
+
 class OMRGrader:
     '''
     Handles all functionality surrounding grading LiveTest answer sheet documents
@@ -167,16 +592,55 @@ class OMRGrader:
         - returns Matlike obj of isolated answer sheets post four point transformation.
     
     See run() for the put together process
+
+    template mode: pass the Pictron layout manifest of the sheet's template as layout
+    (see Pictron.layout / Pictron.template_layout) and the bubbles are sampled at their
+    known locations on the canonical page instead of being searched for with contours.
     '''
     def __init__(self, num_choices, num_questions, mechanical:bool=True, 
                  font_path:str="assets/fonts/RobotoMono-Regular.ttf", 
-                 font_size:int=120, show_process:bool=False):
+                 font_size:int=120, show_process:bool=False, layout:dict=None, 
+                 isolate_max_dim:int=1024, refine_corners:bool=True, 
+                 registration:str="contour", render:bool=True, 
+                 min_bubble_px:int=MIN_BUBBLE_PX):
         self.font_path = font_path
         self.font_size = font_size
         self.num_choices = num_choices
         self.num_questions = num_questions
         self.mechanical = mechanical
         self.show_process = show_process
+        self.layout = layout
+        self.isolate_max_dim = isolate_max_dim # None searches for the document at full resolution
+        self.refine_corners = refine_corners
+        # how photographed sheets are found, "contour" or "fiducial" (needs layout)
+        self.registration = registration
+        # draw the graded overlay onto self.image during run(), when off only 
+        # self.result is produced and render_result can draw it later
+        self.render = render
+        # photos are decoded as small as this allows (needs layout), None decodes them at full size
+        self.min_bubble_px = min_bubble_px
+        self.reset()
+
+    def reset(self):
+        '''
+        forget the last image graded, run() starts with this so one grader can grade
+        image after image
+        '''
+        self.image = None
+        self.thresh = None
+        self.corners = None
+        # the sheet in grayscale, what it is graded on. self.image only stays in
+        # color for render to draw on
+        self.gray = None
+        self.source_size = None
+        # the photo/scan as decoded, before it is warped or equalized
+        self.source_image = None
+        # how many times smaller than the upload source_image was decoded (see reduced_decode_factor)
+        self.decode_factor = 1
+        self.result = None
+        # seconds spent in each stage of the last run, see stage()
+        self.timings = {}
+        self.peak_rss_kb = None
 
     @classmethod
     def convert_image_to_bytes(self, image: np.ndarray) -> bytes:
@@ -186,11 +650,24 @@ class OMRGrader:
                 return encoded_image.tobytes()
         return None
     
+    @contextmanager
+    def stage(self, name:str):
+        '''
+        time a step of the pipeline, the seconds are added to self.timings[name]
+
+        with self.stage("decode"):
+            ...
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+
     def show_image(self, title: str, matlike, w=600, h=700):
         temp = cv2.resize(matlike, (w, h))
-        cv2.imshow(title, temp)
-        cv2.waitKey(0)
-        cv2.destroyAllWindows()
+        show_image(title, temp)
 
     def is_circle(self, contour, threshold=0.825, epsilon_factor=0.01):
         '''
@@ -218,25 +695,91 @@ class OMRGrader:
 
     
 
-    def isolate_document(self, image_path:str=None, image_bytes:bytes=None):
-        if image_path is not None:
-            image = cv2.imread(image_path)
-            print("Image loaded from path.")
-        elif image_bytes is not None:
-            image_array = np.frombuffer(image_bytes, dtype=np.uint8)
-            image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-            print("Image decoded from bytes.")
-        else:
-            raise DocumentExtractionFailedError("Must provide a valid image")
+    def decode_document(self, image_path:str=None, image_bytes:bytes=None):
+        with self.stage("decode"):
+            if image_path is not None:
+                image = cv2.imread(image_path)
+                print("Image loaded from path.")
+            elif image_bytes is not None:
+                image_array = np.frombuffer(image_bytes, dtype=np.uint8)
+                min_short_side = self.decode_short_side()
+                factor = reduced_decode_factor(image_bytes, min_short_side) if min_short_side else 1
+                # EXIF orientation is applied at every size
+                image = cv2.imdecode(image_array, REDUCED_DECODE_FLAGS[factor])
+                self.decode_factor = factor
+                print("Image decoded from bytes.")
+            else:
+                raise DocumentExtractionFailedError("Must provide a valid image")
+
+        if image is None:
+            raise DocumentExtractionFailedError("The image could not be decoded")
         
         self.image = image
+        self.source_image = image
+        self.source_size = image.shape[1::-1]
         show_image("original", image) if self.show_process else None
+        return image
+
+
+    def decode_short_side(self):
+        '''
+        the short side, in pixels, a photo can be decoded at while the template's smallest
+        bubble still spans min_bubble_px. None when it has to be decoded at full size.
+        '''
+        if self.min_bubble_px is None or self.layout is None:
+            return None
+        bubble = min(
+            min(x2 - x1, y2 - y1) for boxes in self.layout["questions"].values() for x1, y1, x2, y2 in boxes
+        )
+        return math.ceil(self.min_bubble_px * min(self.layout["page_size"]) / (bubble * MIN_SHEET_FILL))
+
+    def downscale(self, image):
+        '''
+        shrink image by the smallest integer factor that fits it in isolate_max_dim,
+        integer factors take OpenCV's fast INTER_AREA path.
+
+        returns (small, factor)
+        '''
+        factor = 1
+        if self.isolate_max_dim:
+            factor = max(1, int(np.ceil(max(image.shape[:2]) / self.isolate_max_dim)))
+        if factor == 1:
+            return image, factor
+        with self.stage("downscale"):
+            small = cv2.resize(image, None, fx=1 / factor, fy=1 / factor, interpolation=cv2.INTER_AREA)
+        return small, factor
+
+
+    def isolate_document(self, image_path:str=None, image_bytes:bytes=None):
+        '''
+        find the answer sheet in a photo and warp it to a birds eye view.
+
+        the corners are searched for on a copy downscaled to isolate_max_dim, the page
+        outline survives heavy downscaling while pre_process and findContours get
+        cheaper with every pixel removed. The corners are then mapped back (and
+        sub-pixel refined if refine_corners is set) and the full resolution image is
+        warped. They are kept in self.corners.
+        '''
+        image = self.decode_document(image_path, image_bytes)
+        return self.find_document(image)
+
+
+    def find_document(self, image, gray=None):
+        '''
+        gray: image in grayscale when the caller already has it, the document is found 
+        and warped on it, only warped in color too when render is set
+        '''
+        if gray is None:
+            gray = to_gray(image, "photo_gray")
+        small, factor = self.downscale(gray)
         
-        image_proc = pre_process(image)
+        with self.stage("pre_process"):
+            image_proc = pre_process(small)
         show_image("pre_process", image_proc) if self.show_process else None
         
-        contours, _ = cv2.findContours(image_proc, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        contours = sorted(contours, key=cv2.contourArea, reverse=True)[:3]
+        with self.stage("document_contours"):
+            contours, _ = cv2.findContours(image_proc, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            contours = sorted(contours, key=cv2.contourArea, reverse=True)[:3]
         print(f"Found {len(contours)} contours.")
 
         # cv2.drawContours(image, contours, -1, (0,255,255), 111)
@@ -249,53 +792,290 @@ class OMRGrader:
 
             if len(approx) == 4:
                 print("Document found. Performing transformation.")
-                transformed = four_point_transform(image, approx.reshape(4, 2))
+                # map the corners back to the full resolution image
+                corners = shrink_quad(approx.reshape(4, 2), PRE_PROCESS_GROWTH) * factor
+                if self.refine_corners and factor > 1:
+                    with self.stage("refine_corners"):
+                        corners = refine_corners(gray, corners, search_radius=4 * factor)
+                corners = order_points(corners)
+
+                if self.layout is None:
+                    self.corners = corners
+                    transformed = self.warp_page(image, gray, corners)
+                else:
+                    # the page's corners, turned to match however the sheet lies in the photo
+                    size = self.layout["page_size"]
+                    self.corners = self.orient(small, factor, corners, page_corners(size))
+                    transformed = self.warp_page(image, gray, self.corners, size)
+
                 show_image("transformed", transformed) if self.show_process else None
                 return transformed
 
         raise DocumentExtractionFailedError("Document could not be isolated")
 
 
-    def get_answer_bubbles(self, file_path:str=None, bytes_obj:bytes=None):
+    def register_fiducials(self, image_path:str=None, image_bytes:bytes=None):
+        '''
+        register a photographed sheet using the alignment images printed in its corners.
+
+        the four fiducials are found with template matching on the downscaled photo,
+        refined at full resolution, and the homography from them to where they sit on
+        the template page is computed directly. The sheet may be rotated by any multiple
+        of 90 degrees (or upside down), the logo is used to tell which way is up.
+
+        needs the template layout, falls back to isolate_document's contour search when
+        the fiducials cannot be found. self.corners holds the page's corners in the photo.
+        '''
+        image = self.decode_document(image_path, image_bytes)
+        page_size = self.layout["page_size"]
+
+        # the photo is converted to grayscale once, registration only ever reads that
+        photo = to_gray(image, "photo_gray")
+        small, factor = self.downscale(photo)
+        gray = small
+        template = registry.gray(self.layout["fiducial_image"])
+
+        # the sheet's short side is assumed to span 30-100% of the photo's short side
+        fx1, _, fx2, _ = self.layout["fiducials"][0]
+        fiducial_ratio = (fx2 - fx1) / min(page_size)
+        short_side = min(gray.shape[:2])
+        sizes = short_side * fiducial_ratio * np.geomspace(0.3, 1.0, num=7)
+
+        # where the fiducial centers sit on the page and the proportions of the quad they form
+        page_centers = np.array([
+            [(x1 + x2) / 2, (y1 + y2) / 2] for x1, y1, x2, y2 in self.layout["fiducials"]
+        ], dtype=np.float32)
+        aspect = (page_centers[1, 0] - page_centers[0, 0]) / (page_centers[3, 1] - page_centers[0, 1])
+        spacing = (fx2 - fx1) / (page_centers[1, 0] - page_centers[0, 0])
+
+        with self.stage("fiducials"):
+            candidates = fiducial_candidates(gray, template, sizes)
+            centers, size, score = find_fiducials(gray, template, sizes, aspect, spacing, candidates=candidates)
+
+            # the checkerboard only correlates with itself within a few degrees of
+            # rotation. When the strongest matches say the sheet is tilted, search
+            # again with the template turned to match
+            tilt = fiducial_tilt(gray, template, candidates[:3])
+            if abs(tilt) > 3:
+                # the straight search already told the scale, only sizes close to it are tried
+                near = [s for s in sizes if any(0.75 < s / size < 1.33 for _, _, size in candidates[:3])]
+                turned = find_fiducials(gray, rotate_template(template, tilt), near, aspect, spacing)
+                if turned[0] is not None and turned[2] > score:
+                    centers, size, score = turned
+        if centers is None:
+            print("Fiducials not found, falling back to the document contour.")
+            return self.find_document(image, photo)
+
+        centers = self.orient(small, factor, centers * factor, page_centers)
+
+        with self.stage("refine_fiducials"):
+            centers = self.refine_fiducials(photo, centers, page_centers, template)
+
+        # express the registration as the page corners in the photo so the 
+        # warp can be reproduced later from self.corners alone
+        M = cv2.getPerspectiveTransform(page_centers, centers)
+        self.corners = cv2.perspectiveTransform(page_corners(page_size).reshape(-1, 1, 2), M).reshape(4, 2)
+
+        transformed = self.warp_page(image, photo, self.corners, page_size)
+        show_image("registered", transformed) if self.show_process else None
+        return transformed
+
+
+    def warp_page(self, image, gray, corners, size=None):
+        '''
+        warp the sheet out of the photo into self.gray, the color photo is only warped
+        as well when render will draw on it. size: the page's (width, height), None
+        for the size of the corners' quad
+
+        returns the page self.image becomes
+        '''
+        with self.stage("warp"):
+            if size is None:
+                self.gray = four_point_transform(gray, corners)
+                return four_point_transform(image, corners) if self.render else self.gray
+            self.gray = warp_corners(gray, corners, size)
+            return warp_corners(image, corners, size) if self.render else self.gray
+
+
+    def refine_fiducials(self, image, centers, page_centers, template, margin:int=40, iterations:int=2):
+        '''
+        re-match the fiducials on the page itself. Each one's neighbourhood is warped 
+        from the photo into template page coordinates with the homography of the current
+        estimate, there the alignment image is upright and at its printed size whatever
+        the tilt and perspective. How far the match sits from where the layout puts it 
+        corrects the estimate.
+
+        centers: the fiducials in the full resolution photo, in the same order as page_centers
+        margin: search radius in page pixels, under the checkerboard's square so the
+                match cannot slip onto a neighbouring one
+
+        returns the corrected centers
+        '''
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        boxes = self.layout["fiducials"]
+
+        for _ in range(iterations):
+            M = cv2.getPerspectiveTransform(page_centers, centers) # page -> photo
+            corrected = page_centers.copy()
+            for i, (x1, y1, x2, y2) in enumerate(boxes):
+                x1, y1, x2, y2 = (int(v) for v in (x1, y1, x2, y2))
+                scaled = template if template.shape[1] == x2 - x1 else \
+                    cv2.resize(template, (x2 - x1, y2 - y1), interpolation=cv2.INTER_AREA)
+                # window pixel (u, v) is page pixel (u + x1 - margin, v + y1 - margin)
+                shift = np.array([[1, 0, x1 - margin], [0, 1, y1 - margin], [0, 0, 1]], dtype=np.float64)
+                window = cv2.warpPerspective(
+                    gray, M @ shift, (x2 - x1 + 2 * margin, y2 - y1 + 2 * margin),
+                    flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+                _, _, _, (x, y) = cv2.minMaxLoc(cv2.matchTemplate(window, scaled, cv2.TM_CCOEFF_NORMED))
+                corrected[i] += (x - margin, y - margin)
+            centers = cv2.perspectiveTransform(corrected.reshape(-1, 1, 2), M).reshape(4, 2)
+
+        return centers.astype(np.float32)
+
+
+    def orient(self, small, factor, points, page_points):
+        with self.stage("orient"):
+            return self.resolve_orientation(small, factor, points, page_points)
+
+
+    def resolve_orientation(self, small, factor, points, page_points):
+        '''
+        points: four points in the photo ordered top-left, top-right, bottom-right, bottom-left
+                of the photo. page_points: where they belong on the template page.
+
+        the sheet can lie in the photo turned by 0, 90, 180 or 270 degrees. The quad's
+        aspect ratio narrows that to two candidates, the one that puts the logo where
+        the template has it wins.
+
+        returns points reordered to line up with page_points
+        '''
+        top = np.linalg.norm(points[1] - points[0])
+        side = np.linalg.norm(points[3] - points[0])
+        page_top = np.linalg.norm(page_points[1] - page_points[0])
+        page_side = np.linalg.norm(page_points[3] - page_points[0])
+        turned = (top > side) != (page_top > page_side)
+        candidates = (1, 3) if turned else (0, 2)
+
+        if "logo" not in self.layout:
+            return np.roll(points, -candidates[0], axis=0)
+
+        # check the logo on a quarter size page warped from the downscaled photo
+        page_w, page_h = self.layout["page_size"]
+        preview = 4
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        logo = registry.gray(self.layout["logo_image"])
+        lx1, ly1, lx2, ly2 = (v // preview for v in self.layout["logo"])
+        logo = cv2.resize(logo, (lx2 - lx1, ly2 - ly1), interpolation=cv2.INTER_AREA)
+        pad = 8
+
+        best, best_score = candidates[0], -2.0
+        for turns in candidates:
+            src = np.roll(points, -turns, axis=0) / factor
+            M = cv2.getPerspectiveTransform(src.astype(np.float32), (page_points / preview).astype(np.float32))
+            warped = cv2.warpPerspective(gray, M, (page_w // preview, page_h // preview))
+            region = warped[max(0, ly1 - pad):ly2 + pad, max(0, lx1 - pad):lx2 + pad]
+            if region.shape[0] < logo.shape[0] or region.shape[1] < logo.shape[1]:
+                continue
+            score = cv2.minMaxLoc(cv2.matchTemplate(region, logo, cv2.TM_CCOEFF_NORMED))[1]
+            if score > best_score:
+                best, best_score = turns, score
+
+        return np.roll(points, -best, axis=0)
+
+
+    def load_image(self, file_path:str=None, bytes_obj:bytes=None):
         if file_path is not None:
             print("file path ran")
-            self.image = cv2.imread(file_path)
+            with self.stage("decode"):
+                self.image = cv2.imread(file_path)
         elif bytes_obj is not None:
             print("bytes obj eing used")
-            nparr = np.frombuffer(bytes_obj, np.uint8)
-            self.image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            with self.stage("decode"):
+                nparr = np.frombuffer(bytes_obj, np.uint8)
+                self.image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
             print("loaded image!")
-        else:
-            if not len(self.image) > 0:
-                raise ValueError("Either file_path or bytes_obj must be provided.")
+        elif self.image is None:
+            raise ValueError("Either file_path or bytes_obj must be provided.")
         
         if self.image is None:
             raise ValueError("The image could not be loaded. Check the input data.")
-        print("starting bubbles")
-        if len(self.image.shape) == 3: # rectangle
-            self.image = equalize_histogram(self.image) # levels out inconsistent brightness
-            self.show_image("histogram equalized", self.image) if self.show_process else None
-            gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-            self.show_image("grayed!", gray) if self.show_process else None
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            self.show_image("blurred image", blurred) if self.show_process else None
+
+        if self.source_size is None:
+            self.source_image = self.image
+            self.source_size = self.image.shape[1::-1]
+        if self.gray is None:
+            self.gray = to_gray(self.image)
+
+
+    def threshold_image(self):
+        '''
+        levels out the brightness of self.gray and stores the inverted OTSU threshold in self.thresh.
+        When rendering, self.image becomes the leveled sheet (in color, for the overlay)
+        '''
+        shape = self.gray.shape
+        with self.stage("clahe"):
+            # levels out inconsistent brightness
+            equalized = equalize_histogram(self.gray, dst=scratch.buffer("equalized", shape))
+            if self.render:
+                self.image = cv2.cvtColor(equalized, cv2.COLOR_GRAY2BGR)
+        self.show_image("histogram equalized", equalized) if self.show_process else None
+        with self.stage("threshold"):
+            blurred = cv2.GaussianBlur(equalized, (5, 5), 0, dst=scratch.buffer("blurred", shape))
             self.thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
-            print("thresholded image!")
+        self.show_image("blurred image", blurred) if self.show_process else None
+        print("thresholded image!")
         self.show_image("Thresholded image", self.thresh) if self.show_process else None
 
-        contours, _ = cv2.findContours(self.thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        question_contours = []
-        # print(f"contours: {len(contours)}")
-        for contour in contours:
-            x, y, w, h = cv2.boundingRect(contour)
-            if self.is_circle(contour):
-                question_contours.append(contour)
-                cv2.drawContours(self.image, [contour], -1, (0,255,0), 2)
+
+    def get_answer_bubbles(self, file_path:str=None, bytes_obj:bytes=None):
+        self.load_image(file_path, bytes_obj)
+        print("starting bubbles")
+        self.threshold_image()
+
+        with self.stage("bubbles"):
+            contours, _ = cv2.findContours(self.thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            question_contours = []
+            # print(f"contours: {len(contours)}")
+            for contour in contours:
+                x, y, w, h = cv2.boundingRect(contour)
+                if self.is_circle(contour):
+                    question_contours.append(contour)
+                    if self.render:
+                        cv2.drawContours(self.image, [contour], -1, (0,255,0), 2)
         self.show_image("Bubbles identified image", self.image) if self.show_process else None
 
         return question_contours
 
 
+    def get_template_bubbles(self, file_path:str=None, bytes_obj:bytes=None):
+        '''
+        template mode replacement for get_answer_bubbles + group_bubbles_by_row + sort_rows_to_questions.
+
+        the bubble locations come from the Pictron layout manifest, so all that is needed is
+        the sheet at the canonical page size. Mechanical sheets already are, isolated documents
+        are warped straight to it.
+
+        returns --> {1: [[x1, y1, x2, y2], ...one box per choice], 2: [...]}
+        '''
+        self.load_image(file_path, bytes_obj)
+
+        page_w, page_h = self.layout["page_size"]
+        if self.gray.shape != (page_h, page_w):
+            with self.stage("resize"):
+                self.gray = cv2.resize(self.gray, (page_w, page_h), interpolation=cv2.INTER_AREA)
+                if self.render:
+                    self.image = cv2.resize(self.image, (page_w, page_h), interpolation=cv2.INTER_AREA)
+
+        self.threshold_image()
+
+        layout_questions = {int(q): boxes for q, boxes in self.layout["questions"].items()}
+        if len(layout_questions) < self.num_questions:
+            raise AnswerBubbleIdentificationFailedError(
+                "Template layout has fewer questions than the test")
+
+        return {q: layout_questions[q] for q in range(1, self.num_questions + 1)}
+
+
     def sort_contours(self, cnts, method="left-to-right"):
         reverse = method in ["right-to-left", "bottom-to-top"]
         i = 1 if method in ["top-to-bottom", "bottom-to-top"] else 0
@@ -325,16 +1105,7 @@ class OMRGrader:
             current_row, _ = self.sort_contours(current_row, "left-to-right")
             rows.append(current_row)
 
-        # TODO clean up repeated code
-        template_counts = (10, 20, 30, 40, 50, 75, 100, 150, 200)
-        template = 0
-
-        for question_count in template_counts:
-            if self.num_questions <= question_count:
-                template = question_count
-                break
-
-        expected_num_contours = self.num_choices * template
+        expected_num_contours = self.num_choices * (template_size(self.num_questions) or 0)
 
         print(f"# question contours: {len(cnts)}  expected_num_contours: {expected_num_contours}")
         # TODO implement better solution?
@@ -361,8 +1132,20 @@ class OMRGrader:
                 col_num += self.num_choices
 
         return questions
-    
-    
+
+
+    def fill_matrix(self, questions:dict) -> np.ndarray:
+        '''
+        given a dictionary of questions from sort_rows_to_questions, return the
+        question x choice matrix of foreground pixel counts.
+
+        row i holds the counts for question i + 1, column j for choice chr(j + 65)
+        '''
+        bubbles = [c for contours in questions.values() for c in contours]
+        totals = score_bubbles(self.thresh, bubbles)
+        return totals.reshape(len(questions), self.num_choices)
+
+
     def identify_question_choices(self, questions:dict):
         '''
         questions: 
@@ -382,24 +1165,48 @@ class OMRGrader:
         non zero counts of each answer choice. So long as they mark the first few questions
         it works but it needs a more surefire solution. We could measure this value at blank-test-creation.
 
-        returns --> answer-sheets recorded results. 
+        returns --> answer-sheets recorded results.
         {}
         '''
+        totals = self.fill_matrix(questions)
+        # mark the choice with the highest total number of non zero
+        marked = totals.argmax(axis=1)
+
         choices = {}
-        for question, contours in questions.items():
-            for j, c in enumerate(contours):
-                mask = np.zeros_like(self.thresh, dtype="uint8")
-                cv2.drawContours(mask, [c], -1, 255, -1) 
-                
-                mask = cv2.bitwise_and(self.thresh, self.thresh, mask=mask)
-                total = cv2.countNonZero(mask)
-
-                # mark the choice with the highest total number of non zero
-                if question not in choices or total > choices[question][0]:
-                    choices[question] = (total, c, chr(j + 65))
+        for i, (question, contours) in enumerate(questions.items()):
+            j = int(marked[i])
+            choices[question] = (int(totals[i, j]), contours[j], chr(j + 65))
+
+        return choices
+
+
+    def identify_template_choices(self, questions:dict):
+        '''
+        template mode counterpart of identify_question_choices.
+
+        questions: {1: [[x1, y1, x2, y2], ...], 2: [...]} from get_template_bubbles
+
+        returns the same {question: (total, contour, letter)} shape, the contour being
+        an ellipse (or the box for square bubbles) traced around the chosen bubble so
+        grade_choices can outline it.
+        '''
+        boxes = [box for question_boxes in questions.values() for box in question_boxes]
+        totals = score_boxes(self.thresh, boxes).reshape(len(questions), self.num_choices)
+        marked = totals.argmax(axis=1)
+
+        choices = {}
+        for i, (question, question_boxes) in enumerate(questions.items()):
+            j = int(marked[i])
+            x1, y1, x2, y2 = (int(v) for v in question_boxes[j])
+            if self.layout.get("bubble_shape", "circle") in ["circle", "ellipse"]:
+                contour = cv2.ellipse2Poly(
+                    ((x1 + x2) // 2, (y1 + y2) // 2), ((x2 - x1) // 2, (y2 - y1) // 2), 0, 0, 360, 10)
+            else:
+                contour = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.int32)
+            choices[question] = (int(totals[i, j]), contour.reshape(-1, 1, 2), chr(j + 65))
 
         return choices
-    
+
 
     def grade_choices(self, choices:dict, key:dict, outline_thickness:int=10):
         '''
@@ -414,16 +1221,87 @@ class OMRGrader:
             if choices[question_num][2] == key[str(question_num)]:
                 graded[question_num] = True
                 # draw green outline
-                cv2.drawContours(self.image, [choices[question_num][1]], -1, (0, 255, 0), outline_thickness)
+                if self.render:
+                    cv2.drawContours(self.image, [choices[question_num][1]], -1, (0, 255, 0), outline_thickness)
                 correct += 1
             else:
                 graded[question_num] = False
                 # draw red outline
-                cv2.drawContours(self.image, [choices[question_num][1]], -1, (0, 0, 255), outline_thickness)
+                if self.render:
+                    cv2.drawContours(self.image, [choices[question_num][1]], -1, (0, 0, 255), outline_thickness)
 
         return graded, round(correct/len(choices) * 100, 2)
 
 
+    def build_result(self, grade:float, graded:dict, choices:dict) -> dict:
+        '''
+        compact, JSON serializable record of a graded sheet. Holds everything 
+        render_result needs to redraw the graded image from the original image.
+
+        {
+            "grade": 96.0,
+            "source_size": [w, h],         # the image as it was decoded
+            "corners": [[x, y], ...] | None, # tl, tr, br, bl page corners in the source image
+            "page_size": [w, h],           # the sheet the bubbles were read on
+            "bubble_shape": "circle",
+            "questions": {"1": {"box": [x1, y1, x2, y2], "choice": "B", "correct": True}, ...}
+        }
+        '''
+        shape = self.layout.get("bubble_shape", "circle") if self.layout is not None else "circle"
+        questions = {}
+        for question_num in choices:
+            x, y, w, h = cv2.boundingRect(choices[question_num][1])
+            questions[str(question_num)] = {
+                "box": [x, y, x + w, y + h],
+                "choice": choices[question_num][2],
+                "correct": bool(graded[question_num]),
+            }
+
+        return {
+            "grade": grade,
+            "source_size": [int(v) for v in self.source_size] if self.source_size else None,
+            "corners": np.asarray(self.corners).round(2).tolist() if self.corners is not None else None,
+            "page_size": [int(v) for v in self.gray.shape[::-1]],
+            "bubble_shape": shape,
+            "questions": questions,
+        }
+
+
+    def render_result(self, image, result:dict, outline_thickness:int=10):
+        '''
+        draw a graded sheet from the original image and the result of build_result.
+
+        the sheet is cut out of image with the recorded corners (scaled if image is
+        not the size it was graded at), every chosen bubble is outlined green or red
+        and the grade is added to the top right like run() does.
+        '''
+        page_size = tuple(result["page_size"])
+        if result["corners"] is not None:
+            corners = np.array(result["corners"], dtype=np.float32)
+            if result["source_size"]:
+                corners *= np.array(image.shape[1::-1], dtype=np.float32) / result["source_size"]
+            image = warp_corners(image, corners, page_size)
+        elif image.shape[1::-1] != page_size:
+            image = cv2.resize(image, page_size, interpolation=cv2.INTER_AREA)
+        else:
+            image = image.copy()
+
+        for question in result["questions"].values():
+            x1, y1, x2, y2 = question["box"]
+            color = (0, 255, 0) if question["correct"] else (0, 0, 255)
+            if result["bubble_shape"] in ["circle", "ellipse"]:
+                cv2.ellipse(image, ((x1 + x2) // 2, (y1 + y2) // 2), ((x2 - x1) // 2, (y2 - y1) // 2), 
+                            0, 0, 360, color, outline_thickness)
+            else:
+                cv2.rectangle(image, (x1, y1), (x2, y2), color, outline_thickness)
+
+        grade = result["grade"]
+        grade_color = (255, 0, 0) if grade < 66 \
+                else (0, 255, 0) if grade >= 85 \
+                else (0, 255, 255) # yellow 70-84
+        return self.add_grade(image, grade, color=grade_color)
+
+
     def add_grade(self, image, grade, 
                 color=(0, 0, 0), 
                 output_size=(1920, 1080)):
@@ -442,7 +1320,7 @@ class OMRGrader:
 
         # Draw grade on PIL image
         draw = ImageDraw.Draw(pil_image)
-        font = ImageFont.truetype(self.font_path, self.font_size)
+        font = registry.font(self.font_path, self.font_size)
         
         # Calculate the width and height of the text to be drawn
         text = f"{round(grade, 2)}%"
@@ -482,28 +1360,55 @@ class OMRGrader:
             grade: int --> ex: 96 or 73
             graded: dict --> {1: False, 2: False, 3: True}
             choices: dict --> {1: (_, contour, chr(j + 65))}
+
+        the compact result (see build_result) is left in self.result, the seconds
+        spent per stage in self.timings and the process' peak memory in self.peak_rss_kb
         '''
+        self.reset()
+        with self.stage("total"):
+            try:
+                return self.run_stages(file_path, bytes_obj, key)
+            finally:
+                self.peak_rss_kb = peak_rss_kb()
+
+
+    def run_stages(self, file_path:str=None, bytes_obj:bytes=None, key:dict=None):
         try:
             # determine if the run is on a mechanical or a real life image of a submission. 
             if not self.mechanical: # run the document method
-                self.image = self.isolate_document(file_path, bytes_obj)
-                bubbles = self.get_answer_bubbles()
+                if self.registration == "fiducial" and self.layout is not None:
+                    self.image = self.register_fiducials(file_path, bytes_obj)
+                else:
+                    self.image = self.isolate_document(file_path, bytes_obj)
+                file_path, bytes_obj = None, None
+
+            # template mode, the bubble locations are already known from the layout
+            if self.layout is not None:
+                questions = self.get_template_bubbles(file_path, bytes_obj)
             else:
-                bubbles = self.get_answer_bubbles(file_path, bytes_obj)     
+                bubbles = self.get_answer_bubbles(file_path, bytes_obj)
         except DocumentExtractionFailedError as err:
             return (False, False, err)
         except AnswerBubbleIdentificationFailedError as err:
             return (False, False, err)
         
-        # start by grouping the question choices by rows
-        sorted_rows = self.group_bubbles_by_row(bubbles)
-        # once you have your rows, organize the rows into questions
-        questions = self.sort_rows_to_questions(sorted_rows)
-        # determine which of the answ6er choices were selected using OMR
-        choices = self.identify_question_choices(questions)
+        if self.layout is not None:
+            with self.stage("scoring"):
+                choices = self.identify_template_choices(questions)
+        else:
+            with self.stage("bubbles"):
+                # start by grouping the question choices by rows
+                sorted_rows = self.group_bubbles_by_row(bubbles)
+                # once you have your rows, organize the rows into questions
+                questions = self.sort_rows_to_questions(sorted_rows)
+            with self.stage("scoring"):
+                # determine which of the answ6er choices were selected using OMR
+                choices = self.identify_question_choices(questions)
         # using the provided key, grade the selected choices
         # marking wrong choices red and right choices green
-        graded, grade = self.grade_choices(choices, key)
+        with self.stage("grade"):
+            graded, grade = self.grade_choices(choices, key)
+            self.result = self.build_result(grade, graded, choices)
 
         # place a grade on the image that will change 
         # color based on their performance if show_process is true
@@ -512,10 +1417,98 @@ class OMRGrader:
                 else (0, 255, 255) # yellow 70-84
 
         # add the grade to the image
-        self.image = self.add_grade(self.image, grade, color=grade_color) if self.show_process else self.image
+        if self.render and self.show_process:
+            with self.stage("overlay"):
+                self.image = self.add_grade(self.image, grade, color=grade_color)
         show_image("graded", self.image) if self.show_process else None
         return grade, graded, choices
 
+
+    @classmethod
+    def grade_batch(cls, images, key:dict, num_choices:int, num_questions:int, 
+                    mechanical:bool=True, layout:dict=None, registration:str="fiducial",
+                    max_workers:int=None, cv_threads:int=1):
+        '''
+        grade many answer sheets of the same test across all cores.
+
+        images: iterable of file paths (str) and/or raw image bytes, consumed lazily
+        key: the test's answer key {'1': 'A', '2': 'C'}
+        layout: Pictron layout manifest of the template, enables template mode (see __init__)
+        registration: how photos are registered, "fiducial" (needs layout) like the API or "contour"
+        max_workers: worker processes, defaults to the number of cores
+        cv_threads: OpenCV threads inside each worker
+
+        the grader settings, key and layout are sent to each worker once when it starts,
+        every task after that only carries its image. Each worker grades all of its images
+        with one grader, no overlay is drawn (see render_result). At most two images per 
+        worker are in flight so large stacks are never fully loaded in memory.
+
+        yields (index, (grade, graded, choices)) in completion order, index being the
+        image's position in images. Sheets that fail to grade yield (False, False, err)
+        like run() does instead of stopping the batch.
+        '''
+        max_workers = max_workers or os.cpu_count() or 1
+        config = {
+            "num_choices": num_choices,
+            "num_questions": num_questions,
+            "mechanical": mechanical,
+            "layout": layout,
+            "registration": registration,
+            "render": False,
+        }
+
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_batch_worker,
+            initargs=(cv_threads, config, key),
+        ) as executor:
+            pending = {}
+            images = enumerate(images)
+            exhausted = False
+
+            while pending or not exhausted:
+                # keep the workers fed without queueing the whole stack
+                while not exhausted and len(pending) < max_workers * 2:
+                    try:
+                        index, image = next(images)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(_grade_batch_image, image)] = index
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+
+
+# per process state of grade_batch workers, set once by _init_batch_worker
+_batch_grader = None
+_batch_key = None
+
+
+def _init_batch_worker(cv_threads:int, config:dict, key:dict):
+    global _batch_grader, _batch_key
+    cv2.setNumThreads(cv_threads)
+    _batch_grader = OMRGrader(**config)
+    _batch_key = key
+
+
+def _grade_batch_image(image):
+    '''
+    grade one image of a grade_batch call inside a worker process
+    '''
+    grader = _batch_grader
+    try:
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return grader.run(bytes_obj=bytes(image), key=_batch_key)
+        return grader.run(file_path=os.fspath(image), key=_batch_key)
+    except Exception as err: # a corrupt image (cv2.error...) fails that image, not the batch
+        return (False, False, err)
+
 # usage
 if __name__ == "__main__":
     num_choices = 4
@@ -9,31 +9,23 @@ Garrett Mathers
 Terry Griffin
 """
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import os
 import textwrap
 import datetime
+import functools
 import json
+import math
 import random
+import threading
+import numpy as np
+from collections import OrderedDict
+from xml.sax.saxutils import escape
 
-# this line is to facilitate usage of Pictron in backend/routers/submission.py
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-
-# LiveTest's default configurations for Pictron
-PRIMARY_CONFIG = {
-    "page_size": (8.5, 11), # only tested page size
-    "img_align_path": os.path.join(BASE_DIR, "assets/images/checkerboard_144x_adj_color.jpg"),
-    "logo_path": os.path.join(BASE_DIR, "assets/images/LiveTestLogo_144x.png"),
-    "bubble_shape": "circle",
-    "bubble_ratio": 1,
-    "font_path": os.path.join(BASE_DIR, "assets/fonts/RobotoMono-Regular.ttf"),
-    "font_bold": os.path.join(BASE_DIR, "assets/fonts/RobotoMono-Bold.ttf"),
-    "page_margins": (300, 100, 100, 50), # only tested page margins
-    "zebra_shading": False,
-    "font_alpha": 50,
-    "outPath": os.path.join(BASE_DIR, "generatedSheets/perfTEST"),
-    "outName": None,
-}
+try:
+    from answer_sheets.templates import registry
+except ModuleNotFoundError: # run as a script from answer_sheets/
+    from templates import registry
 
 
 def wrap_with_indent(text, width, indent):
@@ -105,13 +97,8 @@ def get_params(fname="docs.json"):
 
 
 def open_image(image_path):
-    # Check if the file exists
-    if not os.path.exists(image_path):
-        # If the file does not exist, raise FileNotFoundError
-        raise FileNotFoundError(f"No such file: '{image_path}'")
-
-    # If the file exists, open and return the image
-    return Image.open(image_path)
+    # decoded once per process and shared, raises FileNotFoundError
+    return registry.image(image_path)
 
 
 def inchesToPixels(dpi, inches):
@@ -140,12 +127,67 @@ def fontSizeToPixels(dpi, font_size):
     return int(pixels)
 
 
+# memory budget of the base layer cache, a page is ~23MB so 96MB keeps 4 templates
+BASE_LAYER_CACHE_MB = 96
+
+
+def layerBytes(image):
+    """Memory a PIL image's pixels take."""
+    return image.width * image.height * len(image.getbands())
+
+
+class LayerCache:
+    """
+    The base layers (see Pictron.base_layer) of the recently used templates, the least
+    recently used go first once they take more than max_bytes. 0 keeps none.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.layers = OrderedDict()
+        self.size = 0
+
+    def get_or_draw(self, key, draw):
+        with self.lock:
+            if key in self.layers:
+                self.layers.move_to_end(key)
+                return self.layers[key]
+
+        layer = draw()
+        with self.lock:
+            if key not in self.layers and layerBytes(layer) <= self.max_bytes:
+                self.layers[key] = layer
+                self.size += layerBytes(layer)
+                self.evict()
+        return layer
+
+    def resize(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def evict(self):
+        while self.size > self.max_bytes:
+            _, evicted = self.layers.popitem(last=False)
+            self.size -= layerBytes(evicted)
+
+
 def generateName(num_questions, num_ans_options):
     timestamp = datetime.datetime.now().timestamp()
     return f"{num_questions}-{num_ans_options}-const"   # {int(timestamp)}
 
 
 class Pictron:
+    # where the logo is pasted on every page
+    logo_xy = (180, 20)
+    # where the course and test name and the "Full Name: " label are written
+    course_test_name_xy = (350, 35)
+    signature_xy = (350, 130)
+    # the signature line, offset from the label and its size
+    signature_line = (300, 50, 500, 3)
+    # blank pages of the recently used templates, see base_layer
+    base_layers = LayerCache(BASE_LAYER_CACHE_MB * 1024 * 1024)
+
     def __init__(self, **kwargs):
         """
         define all configurable kwargs
@@ -218,6 +260,8 @@ class Pictron:
         self.zebra_shading = kwargs.get("zebra_shading", False)
         self.outPath = kwargs.get("outPath", "./generatedSheets")
         self.outName = kwargs.get("outName", None)
+        # identifies the template for base_layer
+        self.config_key = json.dumps(kwargs, sort_keys=True, default=str)
 
         if self.outName is None:
             self.outName = generateName(self.num_questions, self.num_ans_options)
@@ -232,10 +276,10 @@ class Pictron:
         )
 
         if self.font_path:
-            self.font = ImageFont.truetype(self.font_path, self.font_size_adj)
+            self.font = registry.font(self.font_path, self.font_size_adj)
 
         if self.font_bold:
-            self.font_bold = ImageFont.truetype(self.font_bold, self.font_size_adj)
+            self.font_bold = registry.font(self.font_bold, self.font_size_adj)
 
         try:
             self.alignment_image = open_image(self.img_align_path)
@@ -258,30 +302,52 @@ class Pictron:
         # allows for marking on the new blank white image with shapes, text, etc
         self.draw = ImageDraw.Draw(self.image)
 
+        # (choice, filled, subpixel offset): pre-drawn bubble tiles, see bubbleSprite
+        self.sprites = {}
+
     @classmethod
     def find_best_config(cls, num_questions: int, num_choices: int):
         """
         Class method to help find the best configuration for a range of questions and choices.
         Returns the best fitting template configuration from perfect_configs.json
+        (see answer_sheets.templates), False when there is none
         """
-        with open(os.path.join(BASE_DIR, "perfect_configs.json"), "r") as conf_file:
-            config_templates = json.load(conf_file)
+        return registry.config(num_questions, num_choices) or False
 
-        if num_questions <= 0 or num_questions > 200:
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def template_layout(cls, num_questions: int, num_choices: int):
+        """
+        Layout manifest (see Pictron.layout) of the template find_best_config picks 
+        for this question/choice count. Computed once per template per process.
+        """
+        config = cls.find_best_config(num_questions, num_choices)
+        if not config:
             return False
 
-        templates = config_templates[str(num_choices)]
-        template_counts = (10, 20, 30, 40, 50, 75, 100, 150, 200)
-        template = 0
+        return cls(**config).layout()
 
-        for question_count in template_counts:
-            if num_questions <= question_count:
-                template = question_count
-                break
+    @classmethod
+    def base_layer(cls, config_key: str):
+        """
+        Everything every sheet of a template has in common, drawn once per template
+        per process: the alignment images, the logo, the signature line and the empty
+        bubbles with their labels. generate() starts each sheet from a copy of it and
+        only draws the course/test name and the filled bubbles.
 
-        for temp in templates:
-            if int(temp['num_questions']) == template:
-                return temp | PRIMARY_CONFIG
+        Never drawn on. A page is ~23MB so only the recently used templates are kept, 
+        as many as fit base_layers' budget (base_layers.resize).
+        """
+        return cls.base_layers.get_or_draw(config_key, lambda: cls.drawBaseLayer(config_key))
+
+    @classmethod
+    def drawBaseLayer(cls, config_key: str):
+        pictron = cls(**json.loads(config_key))
+        pictron.pasteAlignmentImages(pictron.alignmentPositions())
+        pictron.drawSignatureLine()
+        pictron.pasteImage(*cls.logo_xy, pictron.logo_image)
+        pictron.addAnswerBubbles(pictron.page_margins[3], pictron.page_margins[0])
+        return pictron.image
 
     def pasteImage(self, x, y, img_obj):
         """ """
@@ -294,12 +360,12 @@ class Pictron:
             x, y = xy
             self.pasteImage(x, y, self.alignment_image)
 
-    def addBubbleLabel(self, x, y, label, fill=(0, 0, 0)):
+    def addBubbleLabel(self, x, y, label, fill=(0, 0, 0), draw=None):
         # self.draw.text(
         #     [x, y - self.font_size_adj // 2], label, fill="black", font=self.font
         # )
 
-        self.draw.text(
+        (draw or self.draw).text(
             [x + self.bubble_width // 6, y],
             label,
             fill=fill,
@@ -326,44 +392,89 @@ class Pictron:
                 self.addRectangle(x, y, w, h, color=(240, 240, 240), line=None)
             y += h
 
-    def addBubble(self, x, y, line_thickness=2, filled:bool=False):
+    def bubbleBox(self, x, y):
+        """
+        bounding box [x1, y1, x2, y2] of the bubble anchored at x, y
+        """
         x1 = x - (self.font_size_adj // 2)
         y1 = y - (self.font_size_adj // 2)
         x2 = x1 + self.bubble_width
         y2 = y1 + self.bubble_height
+        return [x1, y1, x2, y2]
+
+    def addBubble(self, x, y, line_thickness=2, filled:bool=False, draw=None):
+        x1, y1, x2, y2 = self.bubbleBox(x, y)
+        draw = draw or self.draw
 
         if self.bubble_shape in ["circle", "ellipse"]:
             if filled:
-                self.draw.ellipse([x1, y1, x2, y2], outline="black", width=line_thickness, fill="black")
+                draw.ellipse([x1, y1, x2, y2], outline="black", width=line_thickness, fill="black")
             else:
-                self.draw.ellipse([x1, y1, x2, y2], outline="black", width=line_thickness)
+                draw.ellipse([x1, y1, x2, y2], outline="black", width=line_thickness)
 
         elif self.bubble_shape in ["rectangle", "square"]:
             if filled:
-                self.draw.rectangle([x1, y1, x2, y2], outline="black", fill="black")
+                draw.rectangle([x1, y1, x2, y2], outline="black", fill="black")
             else:
-                self.draw.rectangle([x1, y1, x2, y2], outline="black", width=line_thickness)
+                draw.rectangle([x1, y1, x2, y2], outline="black", width=line_thickness)
+
+    def bubbleSprite(self, choice:int, filled:bool=False, dx=0, dy=0):
+        """
+        the bubble of a choice, with its gray label when it is not filled, drawn once
+        on a white tile. dx, dy is the fraction of a pixel the bubble sits at, some
+        templates use half pixel spacings. Returns (tile array, left, top), the tile's
+        offset from the bubble's anchor.
+        """
+        key = (choice, filled, dx, dy)
+        if key not in self.sprites:
+            label = chr(choice + 65)
+            x1, y1, x2, y2 = self.bubbleBox(dx, dy)
+            if not filled:
+                lx1, ly1, lx2, ly2 = self.draw.textbbox([dx + self.bubble_width // 6, dy], label, font=self.font)
+                x1, y1, x2, y2 = min(x1, lx1), min(y1, ly1), max(x2, lx2), max(y2, ly2)
+            left, top = math.floor(x1) - 1, math.floor(y1) - 1
+
+            tile = Image.new("RGB", (math.ceil(x2) - left + 2, math.ceil(y2) - top + 2), (255, 255, 255))
+            draw = ImageDraw.Draw(tile)
+            self.addBubble(dx - left, dy - top, filled=filled, line_thickness=self.line_thickness, draw=draw)
+            if not filled:
+                self.addBubbleLabel(dx - left, dy - top, label, (200, 200, 200), draw=draw)
+            self.sprites[key] = (np.asarray(tile), left, top)
+
+        return self.sprites[key]
+
+    def stampSprite(self, page, x, y, choice:int, filled:bool=False):
+        """
+        darken the page array with the sprite of a bubble anchored at x, y. Everything
+        is dark ink on white so taking the minimum keeps what the neighbouring sprites drew.
+        """
+        ix, iy = math.floor(x), math.floor(y)
+        tile, left, top = self.bubbleSprite(choice, filled, x - ix, y - iy)
+        region = page[iy + top:iy + top + tile.shape[0], ix + left:ix + left + tile.shape[1]]
+        np.minimum(region, tile[:region.shape[0], :region.shape[1]], out=region)
     
     def addRectangle(self, x, y, w, h, color=(0, 0, 0), line=0):
         self.draw.rectangle([x, y, x + w, y + h], fill=color, outline=line)
 
         # draw.rectangle(rectangle_coordinates, fill=rectangle_color, outline=None)
 
-    def drawCourseTestName(self, course_name, test_name, x=650, y=35):
+    def drawCourseTestName(self, course_name, test_name, x=None, y=None):
         """
         draw the course and test name on top of the answer sheet to make the answer sheet more unique
 
         Params:
             course_name (str)
             test_name (str)
-            x (int) : startx
+            x (int) : startx, course_test_name_xy by default
             y (int) : starty
 
         """
-        courseTestFont = ImageFont.truetype(self.font_path, fontSizeToPixels(self.dpi, 12))
+        courseTestFont = registry.font(self.font_path, fontSizeToPixels(self.dpi, 12))
+        x = self.course_test_name_xy[0] if x is None else x
+        y = self.course_test_name_xy[1] if y is None else y
 
         self.draw.text(
-            [x - 300, y],
+            [x, y],
             f"{course_name} : {test_name}",
             fill=(0, 0, 0),
             font=courseTestFont,
@@ -371,18 +482,118 @@ class Pictron:
 
         
 
-    def drawSignatureLine(self, x, y):
-        signatureLabelFont = ImageFont.truetype(self.font_path, fontSizeToPixels(self.dpi, 10))
+    def drawSignatureLine(self, x=None, y=None):
+        x = self.signature_xy[0] if x is None else x
+        y = self.signature_xy[1] if y is None else y
+        signatureLabelFont = registry.font(self.font_path, fontSizeToPixels(self.dpi, 10))
         self.draw.text(
             [x, y],
             "Full Name: ",
             fill=(0, 0, 0),
             font=signatureLabelFont,
         )
-        self.addRectangle(x + 300, y + 50, 500, 3, (0, 0, 0), 2)
+        dx, dy, w, h = self.signature_line
+        self.addRectangle(x + dx, y + dy, w, h, (0, 0, 0), 2)
 
 
-    def addAnswerBubbles(self, start_x, start_y, randomize_filled:bool=False, answers:dict=None):
+    def bubblePositions(self, start_x, start_y):
+        '''
+        compute where every question label and answer bubble lands on the page without drawing anything.
+
+        start_x(int), start_y(int) = starting coordinates in pixels to start placing bubbles
+
+        returns --> {question_num: ((label_x, label_y), [(x, y) for each answer choice])}
+        '''
+        positions = {}
+
+        x = start_x
+        y = start_y
+        option_set_width = (self.bubble_width + self.answer_spacing) \
+                * self.num_ans_options + self.column_width
+
+        for n in range(1, self.num_questions + 1):
+            # check if starting a new column is needed only when new answer is being created
+            if y + self.bubble_height > self.img_height - self.page_margins[2]:
+                start_x += option_set_width + self.label_spacing  # Shift to next column
+                x = start_x
+                y = start_y
+            question_label = f"{n:>3}"
+            label_xy = (x - self.label_spacing, y)
+
+            # dynamically allocate necessary spacing between question number and first answer choice. 
+            x += len(question_label) + ((self.font_size_adj // 2) * 3) + (self.bubble_width  // 2)
+
+            bubbles = []
+            for _ in range(self.num_ans_options):
+                bubbles.append((x, y))
+                # increment x to place the next answer_choice
+                x += self.bubble_width + self.answer_spacing
+
+            positions[n] = (label_xy, bubbles)
+            x = start_x
+            y += self.bubble_height + self.line_spacing
+
+        return positions
+
+
+    def layout(self):
+        '''
+        layout manifest of this template, the pixel bounding box of every answer bubble
+        on the canonical page. OMRGrader can sample these regions directly once a sheet
+        has been warped to page_size instead of searching for the bubbles.
+
+        the alignment images (fiducials) and the logo are included so a photographed
+        sheet can be registered and oriented against the page.
+
+        returns --> 
+        {
+            "page_size": (2448, 3168),
+            "fiducials": [[x1, y1, x2, y2] top left, top right, bottom right, bottom left],
+            "fiducial_image": "/path/to/alignment/image",
+            "logo": [x1, y1, x2, y2],
+            "logo_image": "/path/to/logo",
+            "bubble_shape": "circle",
+            "num_choices": 4,
+            "questions": {1: [[x1, y1, x2, y2], ...one box per choice], 2: [...]}
+        }
+        '''
+        positions = self.bubblePositions(self.page_margins[3], self.page_margins[0])
+        align_w, align_h = self.alignment_image.size
+        tl, tr, bl, br = self.alignmentPositions()
+        logo_w, logo_h = self.logo_size
+        return {
+            "page_size": (self.img_width, self.img_height),
+            "fiducials": [[x, y, x + align_w, y + align_h] for x, y in (tl, tr, br, bl)],
+            "fiducial_image": self.img_align_path,
+            "logo": [*self.logo_xy, self.logo_xy[0] + logo_w, self.logo_xy[1] + logo_h],
+            "logo_image": self.logo_path,
+            "bubble_shape": self.bubble_shape,
+            "num_choices": self.num_ans_options,
+            "questions": {
+                n: [self.bubbleBox(x, y) for x, y in bubbles]
+                for n, (_, bubbles) in positions.items()
+            },
+        }
+
+
+    def fillAnswer(self, n, randomize_filled:bool=False, answers:dict=None):
+        """
+        index of the choice filled in on question n, None when it is left empty
+        """
+        # if we are randomizing filled circles, choose the answer for this question here, save to random_choices
+        if randomize_filled:
+            fill_answer = random.choice(range(self.num_ans_options))
+            self.random_choices[n] = chr(fill_answer + 65)
+            return fill_answer
+        # if we are generating an answer sheet for a test key, we may already have the key to generate as well. 
+        elif type(answers) == dict:
+            vals = {"A": 0, "B": 1,  "C": 2, "D": 3, "E": 4, "F": 5, "G": 6}
+            return vals[answers[n]] if n in answers else None
+        # blank sheet meant for use in LiveTest
+        return None
+
+    def addAnswerBubbles(self, start_x, start_y, randomize_filled:bool=False, answers:dict=None,
+                         blank_drawn:bool=False):
         '''
         build the answer sheets answer bubbles with the given settings set in the constructor. 
         
@@ -394,69 +605,48 @@ class Pictron:
 
         answers: dict --> {1: 'A', 2:'E', 3:'C'}. For building a Test that has an established answer key. 
 
+        blank_drawn: bool --> the labels and empty bubbles are already on the page (base_layer), 
+        only draw the filled bubbles over them.
+
         '''
         self.random_choices = {}
-    
-        x = start_x
-        y = start_y
-        i = 0  # Overall count for number of answer choices placed
-        n = 1  # Question number
-        option_set_width = (self.bubble_width + self.answer_spacing) \
-                * self.num_ans_options + self.column_width
+        positions = self.bubblePositions(start_x, start_y)
+
+        if blank_drawn:
+            # one solid shape per question, drawn straight onto the page
+            for n, (_, bubbles) in positions.items():
+                fill_answer = self.fillAnswer(n, randomize_filled, answers)
+                if fill_answer is not None:
+                    self.addBubble(*bubbles[fill_answer], filled=True, line_thickness=self.line_thickness)
+            return
+
+        # the bubbles are stamped from sprites into an array of the page
+        page = np.array(self.image)
+        question_labels = []
 
         # begin outputting answer choices
-        while n <= self.num_questions:
-            # check to see if we are on to the next question
-            if i % self.num_ans_options == 0:
-                # check if starting a new column is needed only when new answer is being created
-                if y + self.bubble_height > self.img_height - self.page_margins[2]:
-                    start_x += option_set_width + self.label_spacing  # Shift to next column
-                    x = start_x
-                    y = start_y
-                question_label = f"{n:>3}"
-
-                # if we are randomizing filled circles, choose the answer for this question here, save to random_choices
-                if randomize_filled:
-                    fill_answer = random.choice(range(self.num_ans_options))
-                    self.random_choices[n] = chr(fill_answer + 65)
-                # if we are generating an answer sheet for a test key, we may already have the key to generate as well. 
-                elif type(answers) == dict:
-                    vals = {"A": 0, "B": 1,  "C": 2, "D": 3, "E": 4, "F": 5, "G": 6}
-                    fill_answer = vals[answers[n]] if n in answers else None
-                    # print(f"fill_answer: {vals[answers[n]]}")
-                # blank sheet meant for use in LiveTest
-                else:
-                    fill_answer = None
-
-                # add question number to start off the new row
-                self.addBubbleLabel(x - self.label_spacing, y, question_label) 
-
-                # dynamically allocate necessary spacing between question number and first answer choice. 
-                x += len(question_label) + ((self.font_size_adj // 2) * 3) + (self.bubble_width  // 2)
-
-            # add answer choice - determine if it will be filled or not
-            answer_label = chr((i % self.num_ans_options) + 65)  # A, B, C, etc.
-            self.addBubble(x, y, filled=(i % self.num_ans_options) == fill_answer, 
-                           line_thickness=self.line_thickness)
-            self.addBubbleLabel(x, y, answer_label, (200, 200, 200)) \
-                if (i % self.num_ans_options) != fill_answer else None
-            
-            # increment x to place the next answer_choice
-            x += self.bubble_width + self.answer_spacing
-            
-            # check to see if we placed all answer choices for this question. 
-            if (i + 1) % self.num_ans_options == 0:
-                x = start_x
-                y += self.bubble_height + self.line_spacing
-                n += 1
+        for n, (label_xy, bubbles) in positions.items():
+            fill_answer = self.fillAnswer(n, randomize_filled, answers)
 
-            i += 1
+            # question number to start off the new row, drawn once the page is an image again
+            question_labels.append((label_xy, f"{n:>3}"))
 
+            for choice, (x, y) in enumerate(bubbles):
+                # add answer choice - determine if it will be filled or not
+                self.stampSprite(page, x, y, choice, filled=choice == fill_answer)
 
-    def generate(self, random_filled:bool=False, answers:dict=None, 
-                 course_name:str=None, test_name:str=None):
+        self.image = Image.fromarray(page)
+        self.draw = ImageDraw.Draw(self.image)
+        for label_xy, label in question_labels:
+            self.addBubbleLabel(*label_xy, label)
+
+
+    def alignmentPositions(self):
+        """
+        top left corner of the alignment image in each corner of the page
+        """
         w, h = self.alignment_image.size
-        positions = [
+        return [
             (0, 0),
             (self.img_width - w, 0),
             (0, self.img_height - h),
@@ -466,19 +656,120 @@ class Pictron:
             ),
         ]
 
-        top = self.page_margins[0]
-        right = self.page_margins[3]
+    def generate(self, random_filled:bool=False, answers:dict=None, 
+                 course_name:str=None, test_name:str=None):
+        # alignment images, signature line, logo and empty bubbles come with the base
+        self.image = self.base_layer(self.config_key).copy()
+        self.draw = ImageDraw.Draw(self.image)
 
-        self.pasteAlignmentImages(positions)
         self.drawCourseTestName(course_name, test_name) \
             if course_name is not None and test_name is not None else None
-        self.drawSignatureLine(350, 130)
-        self.pasteImage(
-            180, 20, self.logo_image
-        )
-        self.addAnswerBubbles(right, top, randomize_filled=random_filled, answers=answers)
+        self.fillAnswers(answers=answers, random_filled=random_filled)
+
+    def fillAnswers(self, answers:dict=None, random_filled:bool=False):
+        """
+        fill in the answer bubbles on the sheet generate() drew, a blank sheet becomes
+        its answer key (answers) without drawing the page again
+        """
+        top = self.page_margins[0]
+        right = self.page_margins[3]
+        self.addAnswerBubbles(right, top, randomize_filled=random_filled, answers=answers,
+                              blank_drawn=True)
         
 
+    def svgText(self, x, y, text, font):
+        # PIL places text by its top left corner, SVG by the baseline
+        return f'<text x="{x}" y="{y + font.getmetrics()[0]}">{escape(text)}</text>'
+
+    def svgGroup(self, elements, font=None, fill="black"):
+        font_size = f' font-size="{font.size}"' if font is not None else ""
+        return f'<g{font_size} fill="{fill}">' + "".join(elements) + "</g>"
+
+    def svgBubble(self, filled:bool=False):
+        """
+        the bubble anchored at 0, 0 (see bubbleBox), placed on the page with <use>
+        """
+        x1, y1, x2, y2 = self.bubbleBox(0, 0)
+        fill = "black" if filled else "none"
+        # PIL covers the pixels x1..x2 and draws the outline inside them, SVG centers the stroke on the shape
+        width = self.line_thickness if self.bubble_shape in ["circle", "ellipse"] or not filled else 1
+        element_id = "filled" if filled else "bubble"
+
+        if self.bubble_shape in ["circle", "ellipse"]:
+            return (f'<ellipse id="{element_id}" cx="{(x1 + x2 + 1) / 2}" cy="{(y1 + y2 + 1) / 2}" '
+                    f'rx="{(x2 - x1 + 1 - width) / 2}" ry="{(y2 - y1 + 1 - width) / 2}" '
+                    f'fill="{fill}" stroke="black" stroke-width="{width}"/>')
+        return (f'<rect id="{element_id}" x="{x1 + width / 2}" y="{y1 + width / 2}" '
+                f'width="{x2 - x1 + 1 - width}" height="{y2 - y1 + 1 - width}" '
+                f'fill="{fill}" stroke="black" stroke-width="{width}"/>')
+
+    def generateSVG(self, random_filled:bool=False, answers:dict=None, 
+                    course_name:str=None, test_name:str=None) -> str:
+        """
+        the sheet generate() draws, as an SVG document. The page is laid out in the
+        pixels of the raster page (same bubble boxes, same layout manifest) and sized
+        in inches, so it prints at the scale the grader expects at any resolution.
+        The font, alignment image and logo are embedded once each, bubbles are <use>s
+        of two shapes.
+        """
+        top = self.page_margins[0]
+        right = self.page_margins[3]
+        name_font = registry.font(self.font_path, fontSizeToPixels(self.dpi, 12))
+        signature_font = registry.font(self.font_path, fontSizeToPixels(self.dpi, 10))
+        align_w, align_h = self.alignment_image.size
+        logo_w, logo_h = self.logo_size
+
+        defs = [
+            f'<image id="fiducial" width="{align_w}" height="{align_h}" href="{registry.data_uri(self.img_align_path)}"/>',
+            self.svgBubble(filled=False),
+            self.svgBubble(filled=True),
+        ]
+        page = [f'<rect width="{self.img_width}" height="{self.img_height}" fill="white"/>']
+        page += [f'<use href="#fiducial" x="{x}" y="{y}"/>' for x, y in self.alignmentPositions()]
+
+        if course_name is not None and test_name is not None:
+            page.append(self.svgGroup([self.svgText(*self.course_test_name_xy, f"{course_name} : {test_name}", 
+                                                    name_font)], name_font))
+        # see drawSignatureLine, PIL's rectangle covers both its corner pixels
+        x, y = self.signature_xy
+        dx, dy, w, h = self.signature_line
+        page.append(self.svgGroup([self.svgText(x, y, "Full Name: ", signature_font)], signature_font))
+        page.append(f'<rect x="{x + dx}" y="{y + dy}" width="{w + 1}" height="{h + 1}" fill="black"/>')
+        page.append(f'<image x="{self.logo_xy[0]}" y="{self.logo_xy[1]}" width="{logo_w}" height="{logo_h}" '
+                    f'href="{registry.data_uri(self.logo_path)}"/>')
+
+        self.random_choices = {}
+        bubbles_used, question_labels, choice_labels = [], [], []
+        for n, (label_xy, bubbles) in self.bubblePositions(right, top).items():
+            fill_answer = self.fillAnswer(n, random_filled, answers)
+            question_labels.append(self.svgText(*label_xy, f"{n:>3}", self.font))
+
+            for choice, (x, y) in enumerate(bubbles):
+                filled = choice == fill_answer
+                bubbles_used.append(f'<use href="#{"filled" if filled else "bubble"}" x="{x}" y="{y}"/>')
+                if not filled:
+                    choice_labels.append(self.svgText(x + self.bubble_width // 6, y, chr(choice + 65), self.font))
+
+        page += [
+            *bubbles_used,
+            self.svgGroup(question_labels, self.font),
+            self.svgGroup(choice_labels, self.font, fill="rgb(200,200,200)"),
+        ]
+
+        return "\n".join([
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.page_size[0]}in" height="{self.page_size[1]}in" '
+            f'viewBox="0 0 {self.img_width} {self.img_height}">',
+            '<style>',
+            f'@font-face {{ font-family: "Pictron"; src: url("{registry.data_uri(self.font_path)}"); }}',
+            'text { font-family: "Pictron", monospace; white-space: pre; }',
+            '</style>',
+            '<defs>', *defs, '</defs>',
+            *page,
+            '</svg>',
+            '',
+        ])
+
     def saveImage(self, outPath=None, outName=None, show=False):
         # Save the image
         print("saving...")
@@ -492,6 +783,18 @@ class Pictron:
         print(f"{self.name}.png")
         self.image.save(f"{self.name}.png")
 
+    def saveLayout(self, outPath=None, outName=None):
+        """
+        save the layout manifest next to the saved image as {outName}.layout.json
+        """
+        if outPath is None:
+            outPath = self.outPath
+        if outName is None:
+            outName = self.outName
+
+        with open(f"{outPath}/{outName}.layout.json", "w") as layout_file:
+            json.dump(self.layout(), layout_file, indent=2)
+
 
 def create_blank_image_with_overlay():
     blank_image = Image.new("RGB", (2550, 3300), "white")
@@ -536,18 +839,13 @@ if __name__ == "__main__":
     # pictron.saveImage(outPath="generatedSheets/", outName=f"{26}-{30}")
     
     
-    # load the perfect configs for each count/choice combination
-    perf_configs = json.load(open("perfect_configs.json", "r"))
-    question_counts = [10,20,30,40,50,75,100,150,200]
-    question_choices = [2,3,4,5,6,7]
-    
-    
-    for choice in question_choices:
+    # the perfect configs for each count/choice combination
+    for choice, question_counts in registry.counts().items():
         perfTest = f"generatedSheets/perfTEST2/{choice}-choices"
         
-        for index, count in enumerate(question_counts):
+        for count in question_counts:
            
-            info = PRIMARY_CONFIG | perf_configs[str(choice)][index]
+            info = registry.config(count, choice)
             print(json.dumps(info, indent=2))
 
             pictron = Pictron(**info)
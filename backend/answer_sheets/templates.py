@@ -0,0 +1,155 @@
+'''
+The answer sheet templates of perfect_configs.json, loaded and checked once per
+process and shared by Pictron (drawing sheets) and OMRGrader (grading them).
+
+A template is picked by its number of choices and the smallest question count
+(TEMPLATE_COUNTS) that holds the test's questions, a 35 question test with 4
+choices is printed on the 40 question 4 choice template.
+
+    config = registry.config(num_questions=35, num_choices=4)
+
+The registry also keeps the fonts and the decoded alignment/logo images so they
+are read from disk once, not for every sheet.
+'''
+
+import base64
+import functools
+import json
+import mimetypes
+import os
+
+import cv2
+from PIL import Image, ImageFont
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+CONFIGS_PATH = os.path.join(BASE_DIR, "perfect_configs.json")
+
+# question counts there is a template for (per number of choices)
+TEMPLATE_COUNTS = (10, 20, 30, 40, 50, 75, 100, 150, 200)
+
+# LiveTest's default configurations for Pictron
+PRIMARY_CONFIG = {
+    "page_size": (8.5, 11), # only tested page size
+    "img_align_path": os.path.join(BASE_DIR, "assets/images/checkerboard_144x_adj_color.jpg"),
+    "logo_path": os.path.join(BASE_DIR, "assets/images/LiveTestLogo_144x.png"),
+    "bubble_shape": "circle",
+    "bubble_ratio": 1,
+    "font_path": os.path.join(BASE_DIR, "assets/fonts/RobotoMono-Regular.ttf"),
+    "font_bold": os.path.join(BASE_DIR, "assets/fonts/RobotoMono-Bold.ttf"),
+    "page_margins": (300, 100, 100, 50), # only tested page margins
+    "zebra_shading": False,
+    "font_alpha": 50,
+    "outPath": os.path.join(BASE_DIR, "generatedSheets/perfTEST"),
+    "outName": None,
+}
+
+# every template sets these, the rest fall back to Pictron's defaults
+REQUIRED_KEYS = ("num_ans_options", "num_questions")
+# sizes and spacings, in points or pixels
+NUMERIC_KEYS = ("font_size", "bubble_size", "line_spacing", "answer_spacing",
+                "label_spacing", "column_width", "line_thickness")
+
+
+def template_size(num_questions:int):
+    '''
+    question count of the smallest template that fits num_questions, None when none does
+    '''
+    for question_count in TEMPLATE_COUNTS:
+        if 0 < num_questions <= question_count:
+            return question_count
+    return None
+
+
+class TemplateRegistry:
+    def __init__(self, path:str=CONFIGS_PATH):
+        self.path = path
+        # (num_choices, template size): template as written in perfect_configs.json
+        self.templates = self.load(path)
+
+    @staticmethod
+    def load(path:str) -> dict:
+        '''
+        read and check perfect_configs.json, a broken template fails here instead of
+        while a teacher is creating a test
+        '''
+        with open(path, "r") as conf_file:
+            config_templates = json.load(conf_file)
+
+        templates = {}
+        for num_choices, choice_templates in config_templates.items():
+            for template in choice_templates:
+                missing = [key for key in REQUIRED_KEYS if key not in template]
+                if missing:
+                    raise ValueError(f"{path}: a {num_choices} choice template is missing {missing}")
+
+                for name in NUMERIC_KEYS:
+                    value = template.get(name, 1)
+                    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                        raise ValueError(f"{path}: {name} of a {num_choices} choice template is {value!r}")
+
+                key = (int(num_choices), int(template["num_questions"]))
+                if int(template["num_ans_options"]) != key[0]:
+                    raise ValueError(f"{path}: template {key} has {template['num_ans_options']} choices")
+                if key[1] not in TEMPLATE_COUNTS:
+                    raise ValueError(f"{path}: template {key} is not one of {TEMPLATE_COUNTS} questions")
+                if key in templates:
+                    raise ValueError(f"{path}: template {key} is defined twice")
+                templates[key] = template
+        return templates
+
+    def config(self, num_questions:int, num_choices:int):
+        '''
+        Pictron kwargs of the template for this many questions and choices (a new dict
+        every call), None when there is no such template
+        '''
+        template = self.templates.get((num_choices, template_size(num_questions)))
+        if template is None:
+            return None
+        return template | PRIMARY_CONFIG
+
+    def counts(self) -> dict[int, list[int]]:
+        '''
+        {num_choices: [num_questions, ...]} of every template
+        '''
+        counts = {}
+        for num_choices, num_questions in sorted(self.templates):
+            counts.setdefault(num_choices, []).append(num_questions)
+        return counts
+
+    @functools.lru_cache(maxsize=None)
+    def font(self, path:str, size:int):
+        return ImageFont.truetype(path, size)
+
+    @functools.lru_cache(maxsize=None)
+    def image(self, path:str):
+        '''
+        decoded asset image (alignment image, logo), only read from, never drawn on
+        '''
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No such file: '{path}'")
+        image = Image.open(path)
+        image.load()
+        return image
+
+    @functools.lru_cache(maxsize=None)
+    def gray(self, path:str):
+        '''
+        grayscale copy of an asset image for the grader's template matching
+        '''
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise FileNotFoundError(f"No such file: '{path}'")
+        return image
+
+
+    @functools.lru_cache(maxsize=None)
+    def data_uri(self, path:str) -> str:
+        '''
+        the asset file (font, image) as a data: URI, for embedding it in SVG sheets
+        '''
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        with open(path, "rb") as asset:
+            return f"data:{media_type};base64,{base64.b64encode(asset.read()).decode()}"
+
+
+registry = TemplateRegistry()
@@ -5,12 +5,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from routers import user_router, course_router, test_router, submission_router, auth_router, enrollment_router
+from routers import user_router, course_router, test_router, submission_router, auth_router, enrollment_router, metrics_router
 
 # NEW: pull in DB + models + env (loads .env already)
 from db import engine, SessionLocal
 from tables import Base, Teacher
 from env import admin_user, admin_pass  # reads ADMIN_USER / ADMIN_PASS
+from env import base_layer_cache_mb
+from answer_sheets import Pictron
+import grading
 
 def get_api() -> FastAPI:
     """
@@ -42,6 +45,21 @@ def get_api() -> FastAPI:
     app.include_router(enrollment_router)
     app.include_router(test_router)
     app.include_router(submission_router)
+    app.include_router(metrics_router)
+
+    @app.on_event("startup")
+    def _start_grading_pool():
+        # spawn and warm up the grading workers before the first upload arrives
+        grading.start_executor()
+
+    @app.on_event("shutdown")
+    def _stop_grading_pool():
+        grading.shutdown_executor()
+
+    @app.on_event("startup")
+    def _size_base_layer_cache():
+        # answer sheets are drawn on a copy of their template's blank page, ~23MB each
+        Pictron.base_layers.resize(base_layer_cache_mb * 1024 * 1024)
 
     @app.on_event("startup")
     def _seed_admin():
@@ -0,0 +1,160 @@
+"""
+Content addressed storage for the image blobs (submission originals, graded
+images, answer keys).
+
+Rows only keep the sha256 of their image and its size, the bytes live in a
+BlobStore. Identical images are stored once, so a blob can be referenced by
+several rows and is only deleted once none of them are left (see
+db.release_blobs).
+
+    BLOB_STORE_BACKEND  which BlobStore to use, "local" (default)
+    BLOB_STORE_PATH     root directory of the local store (default ./blobs)
+    IMAGE_CACHE_MAX_AGE seconds browsers may reuse a served image without asking
+
+The local store shards the files by hash, blobs/ab/cd/abcd1234...  so no single
+directory grows past a few thousand entries, and can hand out the path of a
+blob so routes serve it with a FileResponse instead of reading it in memory.
+"""
+
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from env import blob_store_backend, blob_store_path, image_cache_max_age
+
+
+def blob_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore(ABC):
+    """
+    interface every store implements, blobs are addressed by blob_hash(data)
+    """
+    @abstractmethod
+    def put(self, data: bytes) -> tuple[str, int]:
+        """
+        store data, returns (hash, size). Storing the same bytes twice is a no-op
+        """
+
+    @abstractmethod
+    def get(self, digest: str) -> bytes:
+        """
+        the bytes of a blob, raises FileNotFoundError if it is not stored
+        """
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, digest: str):
+        """
+        remove a blob, missing blobs are ignored
+        """
+
+    def path(self, digest: str) -> str | None:
+        """
+        local file holding the blob when the store has one (served zero copy),
+        None for stores that don't
+        """
+        return None
+
+
+class LocalBlobStore(BlobStore):
+    """
+    blobs as files under root, sharded in two levels of directories by hash prefix
+    """
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError(f"not a blob hash: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, data: bytes) -> tuple[str, int]:
+        digest = blob_hash(data)
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest, len(data)
+
+        # written next to its final place then renamed, readers never see a
+        # partial file and two writers of the same blob can't corrupt it
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest, len(data)
+
+    def get(self, digest: str) -> bytes:
+        with open(self.path(digest), "rb") as blob_file:
+            return blob_file.read()
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def delete(self, digest: str):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+
+BACKENDS = {
+    "local": lambda: LocalBlobStore(blob_store_path),
+}
+
+
+def make_blob_store(backend: str = blob_store_backend) -> BlobStore:
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown BLOB_STORE_BACKEND {backend!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend]()
+
+
+blob_store = make_blob_store()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    whether an If-None-Match header names etag (or is *), weak or not
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def blob_response(digest: str | None, media_type: str, request: Request | None = None) -> Response:
+    """
+    serve a stored blob, straight from its file when the store has one.
+
+    the blob's hash is its strong ETag. A request that already holds it gets a
+    304 without the blob being read or even looked up.
+    """
+    if digest is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={image_cache_max_age}"}
+    if request is not None and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if not blob_store.exists(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    path = blob_store.path(digest)
+    if path is not None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    return Response(blob_store.get(digest), media_type=media_type, headers=headers)
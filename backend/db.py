@@ -5,7 +5,7 @@ Also includes image compression helpers.
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from tables import Base
+from tables import Base, Submission, Test
 from env import database_url  # uses the resolved URL from env.py
 
 # --- Engine ---
@@ -30,25 +30,93 @@ def get_db():
     finally:
         db.close()
 
-# ----- Optional: image compression helpers -----
+# ----- Blob references -----
+from blobstore import blob_store
+
+SUBMISSION_BLOB_COLUMNS = (
+    Submission.submission_image_hash,
+    Submission.graded_image_hash,
+    Submission.graded_preview_hash,
+    Submission.graded_thumbnail_hash,
+)
+TEST_BLOB_COLUMNS = (
+    Test.answer_key_blank_hash,
+    Test.answer_key_filled_hash,
+)
+BLOB_COLUMNS = SUBMISSION_BLOB_COLUMNS + TEST_BLOB_COLUMNS
+
+def release_blobs(db, *digests):
+    """
+    delete the blobs no row references anymore, call after committing the
+    deletion of the rows that held them. Blobs are content addressed so an
+    identical image may still be used by another row.
+    """
+    for digest in set(d for d in digests if d):
+        if not any(db.query(column).filter(column == digest).first() for column in BLOB_COLUMNS):
+            blob_store.delete(digest)
+
+# ----- Image encoding helpers -----
 from PIL import Image
 import io
-import zlib
 import cv2
 import numpy as np
+from env import image_format
 
-def compress_image(image_bytes: bytes, quality: int = 50) -> bytes:
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    buf = io.BytesIO()
-    image.save(buf, format="JPEG", quality=quality, optimize=True)
-    return buf.getvalue()
+# IMAGE_FORMAT / SUBMISSION_IMAGE_FORMAT value: (Pillow format, media type, encoder options)
+IMAGE_FORMATS = {
+    # method 2 is ~25% larger than the default 4 but encodes twice as fast
+    "webp": ("WEBP", "image/webp", {"method": 2}),
+    "avif": ("AVIF", "image/avif", {"speed": 8}),
+    "jpeg": ("JPEG", "image/jpeg", {"optimize": True}),
+}
 
-def compress_data(data: bytes) -> bytes:
-    return zlib.compress(data, level=9)
+def array_to_pil(image: np.ndarray) -> Image.Image:
+    """
+    wrap an OpenCV (BGR or grayscale) array for Pillow's encoders, the BGR order is
+    unpacked by Pillow as it reads the buffer instead of in a separate conversion
+    """
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    if image.ndim == 2:
+        return Image.frombuffer("L", (width, height), image, "raw", "L", 0, 1)
+    return Image.frombuffer("RGB", (width, height), image, "raw", "BGR", 0, 1)
 
-def decompress_data(compressed_data: bytes) -> bytes:
-    return zlib.decompress(compressed_data)
+def encode_image(image: bytes | Image.Image | np.ndarray, quality: int = 50, 
+                 image_format: str = image_format) -> tuple[bytes, str]:
+    """
+    encode an image (encoded bytes of any format Pillow reads, a PIL image, or an
+    OpenCV array as the grader holds it) for storage. The formats are already
+    compressed, nothing else is done to them.
+
+    returns (image bytes, media type)
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"unknown image format {image_format!r}, expected one of {sorted(IMAGE_FORMATS)}")
+    pil_format, media_type, options = IMAGE_FORMATS[image_format]
+
+    if isinstance(image, np.ndarray):
+        if image_format == "jpeg":
+            # OpenCV's JPEG encoder takes the array as is (Pillow's WebP encoder is the faster one)
+            params = [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, int(options.get("optimize", False))]
+            success, encoded = cv2.imencode(".jpg", image, params)
+            if not success:
+                raise ValueError("the image could not be encoded")
+            return encoded.tobytes(), media_type
+        image = array_to_pil(image)
+    elif not isinstance(image, Image.Image):
+        image = Image.open(io.BytesIO(image))
+
+    buf = io.BytesIO()
+    image = image if image.mode in ("RGB", "L") else image.convert("RGB")
+    image.save(buf, format=pil_format, quality=quality, **options)
+    return buf.getvalue(), media_type
 
-def decompress_image(compressed_image_bytes: bytes):
-    image = Image.open(io.BytesIO(compressed_image_bytes)).convert("RGB")
-    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+def decode_image(image_bytes: bytes):
+    """
+    stored image bytes to a BGR array
+    """
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None: # a format this OpenCV build doesn't read (AVIF)
+        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    return image
@@ -32,3 +32,28 @@ if docker_flag.strip() in ("", "0", "false", "False", "FALSE", "no", "No"):
 secret_key = os.getenv("SECRET_KEY")
 admin_user = os.getenv("ADMIN_USER", "").strip()
 admin_pass = os.getenv("ADMIN_PASS", "").strip()
+
+# grading process pool, 0 workers grades on a thread instead of a process pool
+grader_workers = int(os.getenv("GRADER_WORKERS", str(os.cpu_count() or 1)))
+# OpenCV's own thread count inside each grading worker, keeps workers from oversubscribing cores
+grader_cv_threads = int(os.getenv("GRADER_CV_THREADS", "1"))
+
+# where image blobs (submissions, graded images, answer keys) are stored, see blobstore.py
+blob_store_backend = os.getenv("BLOB_STORE_BACKEND", "local").strip()
+blob_store_path = os.getenv("BLOB_STORE_PATH", "./blobs")
+# Cache-Control max-age of image responses. The image urls name a row, not the
+# content, so they are revalidated (cheaply, by ETag) instead of cached forever
+image_cache_max_age = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+# how stored images are encoded: "webp", "avif" or "jpeg", see db.IMAGE_FORMATS.
+# answer keys and graded images are encoded once and served many times
+image_format = os.getenv("IMAGE_FORMAT", "webp").strip().lower()
+# originals are encoded on the grading path, where jpeg is several times faster
+submission_image_format = os.getenv("SUBMISSION_IMAGE_FORMAT", "jpeg").strip().lower()
+
+# rendered answer sheet cache, see sheet_cache.py
+sheet_cache_mb = int(os.getenv("SHEET_CACHE_MB", "64"))
+sheet_cache_path = os.getenv("SHEET_CACHE_PATH", "").strip() or None
+sheet_cache_disk_mb = int(os.getenv("SHEET_CACHE_DISK_MB", "256"))
+# blank pages every sheet of a template starts from, ~23MB a template, see Pictron.base_layer
+base_layer_cache_mb = int(os.getenv("BASE_LAYER_CACHE_MB", "96"))
@@ -0,0 +1,225 @@
+"""
+Runs the OMRGrader off of the event loop.
+
+Grading a submission is pure CPU work (OpenCV pipeline and image encoding). It 
+is dispatched to a pool of pre-warmed worker processes so an upload never stalls
+the other requests being served.
+
+The graded image is not drawn at grade time, only the compact grading result is
+kept. render_graded_image draws it (and its preview and thumbnail sizes) from 
+the stored original the first time it is asked for.
+
+    GRADER_WORKERS     number of worker processes (0 grades on a thread instead)
+    GRADER_CV_THREADS  OpenCV threads per worker, keep workers * threads <= cores
+"""
+
+import asyncio
+import json
+import time
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import cv2
+
+from answer_sheets import Pictron
+from answer_sheets.grader import OMRGrader, peak_rss_kb
+from db import encode_image, decode_image
+from env import grader_workers, grader_cv_threads, submission_image_format
+from metrics import grading_metrics
+
+FONT_PATH = "answer_sheets/assets/fonts/RobotoMono-Regular.ttf"
+# width in pixels of the smaller graded images rendered with the full one, the
+# preview for review screens and the thumbnail for galleries
+GRADED_SIZES = {"preview": 960, "thumbnail": 320}
+
+executor: ProcessPoolExecutor | None = None
+# held while a broken pool is swapped for a new one
+executor_lock = threading.Lock()
+
+
+def init_worker(cv_threads: int):
+    """
+    runs once in every worker process as it starts.
+    """
+    cv2.setNumThreads(cv_threads)
+
+
+def warm_up():
+    """
+    no-op task submitted once per worker so the processes are spawned at startup
+    instead of on the first submission.
+    """
+    return True
+
+
+def start_executor():
+    global executor
+    if executor is not None or grader_workers <= 0:
+        return
+
+    # spawn instead of fork, forking a process that already initialized
+    # OpenCV's thread pool can deadlock the child
+    executor = ProcessPoolExecutor(
+        max_workers=grader_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(grader_cv_threads,),
+    )
+    for _ in range(grader_workers):
+        executor.submit(warm_up)
+
+
+def replace_executor(broken: ProcessPoolExecutor):
+    """
+    swap a pool whose worker died for a new one. Every grade that was running on it
+    fails at once, only the first to get here replaces it, the others find the new
+    pool already in place and leave it be.
+    """
+    global executor
+    with executor_lock:
+        if executor is not broken:
+            return
+        executor = None
+        start_executor()
+    broken.shutdown(wait=False)
+
+
+def shutdown_executor():
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        executor = None
+
+
+def grade_submission(image_data: bytes, num_choices: int, num_questions: int,
+                     key: dict, mechanical: bool = False) -> dict:
+    """
+    grade a submission and prepare everything that gets stored for it.
+
+    runs inside a worker process, so the arguments and return value stay plain
+    picklable data.
+
+    returns:
+        {
+            "grade": 96.0,
+            "answers": '{"1": ["A", true], ...}',
+            "submission_image": encoded original image bytes,
+            "submission_image_type": "image/jpeg",
+            "result": '{"grade": 96.0, "corners": ..., "questions": ...}',
+            "metrics": {"timings": {"decode": 0.02, ...}, "peak_rss_kb": 183000},
+        }
+    """
+    grader = OMRGrader(
+        num_choices=num_choices, 
+        num_questions=num_questions, 
+        font_path=FONT_PATH,
+        mechanical=mechanical, 
+        render=False,
+        # sheets are sampled at the template's known bubble locations, photos are
+        # registered to the template page by the alignment images in their corners
+        layout=Pictron.template_layout(num_questions, num_choices),
+        registration="fiducial"
+    )
+    grade, graded, choices = grader.run(bytes_obj=image_data, key=key)
+    if grade is False: # check to make sure no errors were raised while trying to grade the submission
+        print(f"error: {choices}")
+        raise ValueError(str(choices)) # raise the error
+
+    with grader.stage("encode"):
+        if grader.decode_factor > 1:
+            # graded on a reduced decode, the upload (a JPEG, see reduced_decode_factor)
+            # is kept as sent: full size and never decoded at full size
+            submission_image, submission_image_type = image_data, "image/jpeg"
+        else:
+            # the photo as the grader decoded it, the upload isn't decoded a second time
+            submission_image, submission_image_type = encode_image(
+                grader.source_image if grader.source_image is not None else image_data, 
+                quality=5, image_format=submission_image_format)
+
+    return {
+        "grade": grade,
+        "answers": json.dumps({
+            question_num: (choices[question_num][2], graded[question_num])
+            for question_num in graded
+        }), # {1: ("A", True), 2: ("F", False)}  -->  answers (JSON str)
+        "submission_image": submission_image,
+        "submission_image_type": submission_image_type,
+        "result": json.dumps(grader.result),
+        "metrics": {"timings": grader.timings, "peak_rss_kb": peak_rss_kb()},
+    }
+
+
+def render_graded_image(submission_image: bytes, result: str, 
+                        num_choices: int, num_questions: int) -> dict[str, tuple[bytes, str]]:
+    """
+    draw the graded image of a submission from its stored original image and 
+    grading result, along with its smaller GRADED_SIZES renditions.
+
+    returns {"full": (encoded image, media type), "preview": ..., "thumbnail": ...},
+    ready to be stored and served
+    """
+    grader = OMRGrader(
+        num_choices=num_choices, 
+        num_questions=num_questions, 
+        font_path=FONT_PATH
+    )
+    with grader.stage("decode"):
+        image = decode_image(submission_image)
+    with grader.stage("overlay"):
+        graded = grader.render_result(image, json.loads(result))
+    with grader.stage("encode"):
+        renditions = {"full": encode_image(graded, quality=15)}
+    with grader.stage("resize"):
+        height, width = graded.shape[:2]
+        resized = {
+            name: cv2.resize(graded, (size, round(height * size / width)), interpolation=cv2.INTER_AREA)
+            for name, size in GRADED_SIZES.items()
+        }
+    with grader.stage("encode_small"):
+        # small images need the quality the full one gets away without
+        for name, image in resized.items():
+            renditions[name] = encode_image(image, quality=50)
+
+    grading_metrics.observe(
+        {f"render_{stage}": seconds for stage, seconds in grader.timings.items()}, 
+        peak_rss_kb(), 
+        outcome="rendered"
+    )
+    return renditions
+
+
+async def grade(image_data: bytes, num_choices: int, num_questions: int,
+                key: dict, mechanical: bool = False) -> dict:
+    """
+    await grade_submission on the worker pool.
+    """
+    loop = asyncio.get_running_loop()
+    task = partial(grade_submission, image_data, num_choices, num_questions, key, mechanical)
+    # the pool this grade runs on, the global may be replaced while it does
+    pool = executor
+
+    start = time.perf_counter()
+    try:
+        result = await loop.run_in_executor(pool, task)
+    except ValueError:
+        grading_metrics.count("failed")
+        raise
+    except BrokenProcessPool:
+        # a worker died mid grade (killed, out of memory). Replace the pool 
+        # so the next submission is not stuck with a dead one
+        replace_executor(pool)
+        grading_metrics.count("crashed")
+        raise RuntimeError("grading worker crashed, please resubmit")
+
+    metrics = result.pop("metrics")
+    timings = dict(metrics["timings"])
+    # whatever the worker did not spend working was spent waiting for a free
+    # worker and moving the data between processes, the number to size the pool by
+    worker_seconds = timings["total"] + timings.get("encode", 0.0)
+    timings["pool_wait"] = max(0.0, time.perf_counter() - start - worker_seconds)
+    grading_metrics.observe(timings, metrics["peak_rss_kb"])
+
+    return result
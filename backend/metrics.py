@@ -0,0 +1,129 @@
+"""
+In process metrics for the grading pipeline.
+
+Every graded submission reports how long each OMRGrader stage took (decode,
+registration, CLAHE, threshold, scoring, encode...) and the peak memory of the
+worker that graded it. They are aggregated here into cumulative
+histograms and served by routers/metrics.py, both as JSON and in the
+Prometheus text format.
+
+The numbers live in the API process, each uvicorn worker keeps its own.
+"""
+
+import threading
+from bisect import bisect_left
+
+# seconds, a full photo grade lands around 0.3-0.5s on a single core
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# KiB, 64 MiB to 4 GiB
+MEMORY_BUCKETS = tuple(2 ** i * 1024 for i in range(6, 13))
+
+
+class Histogram:
+    """
+    fixed bucket histogram, counts[i] holds the observations <= buckets[i]
+    (the last slot being +Inf) like a Prometheus histogram.
+    """
+    def __init__(self, buckets: tuple):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """
+        [(upper bound, observations <= bound), ..., ("+Inf", count)]
+        """
+        total, out = 0, []
+        for bound, n in zip(self.buckets + ("+Inf",), self.counts):
+            total += n
+            out.append((str(bound), total))
+        return out
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class GradingMetrics:
+    """
+    thread safe aggregate of the per stage timings and memory samples attached
+    to grading results.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages: dict[str, Histogram] = {}
+        self.peak_rss_kb = Histogram(MEMORY_BUCKETS)
+        self.outcomes: dict[str, int] = {}
+
+    def observe(self, timings: dict, peak_rss_kb: int | None = None, outcome: str = "graded"):
+        """
+        timings: {"decode": 0.021, "warp": 0.034, ...} seconds per stage
+        peak_rss_kb: peak resident memory of the process that did the work
+        outcome: "graded", "failed", "rendered"...
+        """
+        with self.lock:
+            for stage, seconds in timings.items():
+                if stage not in self.stages:
+                    self.stages[stage] = Histogram(STAGE_BUCKETS)
+                self.stages[stage].observe(seconds)
+            if peak_rss_kb is not None:
+                self.peak_rss_kb.observe(peak_rss_kb)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def count(self, outcome: str):
+        self.observe({}, outcome=outcome)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "outcomes": dict(self.outcomes),
+                "stages": {stage: h.snapshot() for stage, h in sorted(self.stages.items())},
+                "peak_rss_kb": self.peak_rss_kb.snapshot(),
+            }
+
+    def prometheus(self) -> str:
+        """
+        the metrics in the Prometheus text exposition format
+        """
+        lines = [
+            "# HELP livetest_grading_total Grading requests by outcome.",
+            "# TYPE livetest_grading_total counter",
+        ]
+        with self.lock:
+            for outcome, n in sorted(self.outcomes.items()):
+                lines.append(f'livetest_grading_total{{outcome="{outcome}"}} {n}')
+
+            lines += [
+                "# HELP livetest_grading_stage_seconds Time spent in each grading stage.",
+                "# TYPE livetest_grading_stage_seconds histogram",
+            ]
+            for stage, h in sorted(self.stages.items()):
+                for bound, n in h.cumulative():
+                    lines.append(f'livetest_grading_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+                lines.append(f'livetest_grading_stage_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'livetest_grading_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+            lines += [
+                "# HELP livetest_grading_peak_rss_kilobytes Peak resident memory of the grading process.",
+                "# TYPE livetest_grading_peak_rss_kilobytes histogram",
+            ]
+            h = self.peak_rss_kb
+            for bound, n in h.cumulative():
+                lines.append(f'livetest_grading_peak_rss_kilobytes_bucket{{le="{bound}"}} {n}')
+            lines.append(f"livetest_grading_peak_rss_kilobytes_sum {h.sum:.0f}")
+            lines.append(f"livetest_grading_peak_rss_kilobytes_count {h.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+grading_metrics = GradingMetrics()
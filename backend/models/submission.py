@@ -1,5 +1,5 @@
 from pydantic import BaseModel, StringConstraints, Field
-from typing_extensions import Annotated, Optional, Dict
+from typing_extensions import Annotated, Optional, Dict, List
 from fastapi import UploadFile, Form
 from datetime import datetime
 
@@ -32,3 +32,14 @@ class AnswerDetail(BaseModel):
 
 class GetSubmissionAnswers(BaseModel):
     answers: Dict[int, AnswerDetail] = Field(..., example={"1": {"choice": "A", "correct": True}})
+
+
+class GallerySubmission(GetSubmission):
+    thumbnail: Optional[str] = None # data: URI of the graded thumbnail, None until it is rendered
+
+class GetSubmissionGallery(BaseModel):
+    test_id: str
+    page: int
+    per_page: int
+    total: int
+    submissions: List[GallerySubmission]
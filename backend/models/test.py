@@ -42,11 +42,13 @@ class GetTest(BaseModel):
     num_questions: int
     num_choices: int
     course_id: int
+    answer_key_status: str # pending, ready or failed
 
 
 class CreateTestConfirmation(BaseModel):
     id: str
     name: str
+    answer_key_status: str
 
 
 class GetTestImage(BaseModel):
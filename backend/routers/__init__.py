@@ -4,3 +4,4 @@ from routers.users import router as user_router
 from routers.test import router as test_router
 from routers.course import router as course_router
 from routers.enrollment import router as enrollment_router
+from routers.metrics import router as metrics_router
@@ -1,6 +1,6 @@
 # routers/course.py
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import IntegrityError
 from typing import List
 
@@ -8,6 +8,7 @@ from models.course import CreateCourse, UpdateCourse, GetCourse, GetCourseMinimu
 from models.users import GetStudentMinimum
 from tables import Course, Student, Teacher
 from db import get_db
+from sheet_cache import sheet_cache
 # from routers.auth import jwt_token_verification
 
 router = APIRouter(
@@ -28,27 +29,34 @@ def create_course(course: CreateCourse, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="This course already exists")
     return course
 
+def courses_query(db: Session):
+    '''
+    GetCourse lists the students and tests of every course, load them in two
+    extra queries for the whole listing instead of two per course
+    '''
+    return db.query(Course).options(selectinload(Course.students), selectinload(Course.tests))
+
 @router.get("/", response_model=List[GetCourse])
 def get_all_courses(db: Session = Depends(get_db)):
-    return db.query(Course).all()
+    return courses_query(db).all()
 
 @router.get("/student/{student_id}", response_model=List[GetCourse])
 def get_all_courses_for_student(student_id: int, db: Session = Depends(get_db)):
     student = db.query(Student).get(student_id)
     if not student:
         raise HTTPException(404, detail=f"student_id: {student_id} not found")
-    return student.courses
+    return courses_query(db).filter(Course.students.any(Student.id == student_id)).all()
 
 @router.get("/teacher/{teacher_id}", response_model=List[GetCourse])
 def get_all_courses_for_teacher(teacher_id: int, db: Session = Depends(get_db)):
     teacher = db.query(Teacher).get(teacher_id)
     if not teacher:
         raise HTTPException(404, detail=f"teacher_id: {teacher_id} not found")
-    return teacher.courses
+    return courses_query(db).filter(Course.teacher_id == teacher_id).all()
 
 @router.get("/{course_id}", response_model=GetCourse)
 def get_course_by_id(course_id: int, db: Session = Depends(get_db)):
-    course = db.query(Course).filter(Course.id == course_id).first()
+    course = courses_query(db).filter(Course.id == course_id).first()
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     return course
@@ -66,6 +74,7 @@ def update_course(course_id: int, update_data: UpdateCourse, db: Session = Depen
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
+    old_name = course.name
     for key, value in update_data.model_dump().items():
         if value is not None:
             setattr(course, key, value)
@@ -75,6 +84,9 @@ def update_course(course_id: int, update_data: UpdateCourse, db: Session = Depen
         db.rollback()
         if "UNIQUE" in str(err):
             raise HTTPException(status_code=400, detail="A course with the same section, course number, name, season and year already exists.")
+    if course.name != old_name:
+        # its tests' sheets are printed with the course name
+        sheet_cache.invalidate(old_name)
     return course
 
 @router.delete("/{course_id}")
@@ -82,6 +94,8 @@ def delete_course(course_id: int, db: Session = Depends(get_db)):
     course = db.query(Course).filter(Course.id == course_id).first()
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
+    name = course.name
     db.delete(course)
     db.commit()
+    sheet_cache.invalidate(name)
     return {"message": "Course deleted successfully"}
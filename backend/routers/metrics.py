@@ -0,0 +1,36 @@
+# routers/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from metrics import grading_metrics
+from sheet_cache import sheet_cache
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+    redirect_slashes=True
+)
+
+
+@router.get("/", response_class=PlainTextResponse)
+def get_metrics():
+    '''
+    grading stage timings and worker memory in the Prometheus text format
+    '''
+    return PlainTextResponse(
+        grading_metrics.prometheus(), 
+        media_type="text/plain; version=0.0.4"
+    )
+
+
+@router.get("/json")
+def get_metrics_json():
+    '''
+    the same metrics as a JSON document
+    {
+        "outcomes": {"graded": 12, "failed": 1},
+        "stages": {"decode": {"count": 12, "sum": 0.31, "mean": 0.026, "buckets": {...}}, ...},
+        "peak_rss_kb": {...},
+        "sheet_cache": {"entries": 3, "bytes": 690000, "hits": 9, "misses": 3}
+    }
+    '''
+    return {**grading_metrics.snapshot(), "sheet_cache": sheet_cache.stats()}
@@ -1,20 +1,21 @@
 # routers/submission.py
 import json
 import datetime
-import io
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from fastapi import HTTPException, APIRouter, Depends, Form, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi import HTTPException, APIRouter, Depends, Form, UploadFile, Request
 from pydantic import BaseModel
-from typing import List
+import base64
+from typing import List, Literal
 import cv2
 from tables import Submission, Student, Test
-from db import get_db, compress_data, compress_image
+from db import get_db, release_blobs, SUBMISSION_BLOB_COLUMNS
+from blobstore import blob_store, blob_response
 from models.submission import GetStudentSubmission, \
-    GetSubmission, UpdateSubmission, GetSubmissionAnswers
-from answer_sheets.grader import OMRGrader
+    GetSubmission, UpdateSubmission, GetSubmissionAnswers, GetSubmissionGallery
+import grading
 from routers.auth import get_current_user
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 
 router = APIRouter(
     prefix="/submission",
@@ -41,8 +42,8 @@ async def create_submission_live(
     '''
     try:
         # query student and test to make sure they exist
-        student = session.query(Student).get(student_id) if student_id else None
-        test = db.query(Test).get(test_id)
+        student = db.query(Student).get(student_id) if student_id else None
+        test = db.query(Test).options(undefer(Test.answers)).get(test_id)
         
         # perform checks on both
         if student_id and student is None:
@@ -56,30 +57,27 @@ async def create_submission_live(
         # grab the bytes of whatever image was submitted
         image_data = await submission_image.read()
 
-        # grade the submission
-        grader = OMRGrader(
+        # grade the submission on the grading pool, keeps the event loop free 
+        # for other requests while OpenCV works
+        result = await grading.grade(
+            image_data, 
             num_choices=test.num_choices, 
             num_questions=test.num_questions, 
-            font_path="answer_sheets/assets/fonts/RobotoMono-Regular.ttf",
-            mechanical=mechanical, 
-            show_process=True
+            key=test_key, 
+            mechanical=mechanical
         )
-        grade, graded, choices = grader.run(bytes_obj=image_data, key=test_key)
-        if not grade: # check to make sure no errors were raised while trying to grade the submission
-            print(f"error: {choices}")
-            raise ValueError(choices) # raise the error
         
         # if all went well with grading process, gather the submission data
-        graded_image_bytes = OMRGrader.convert_image_to_bytes(grader.image)
+        image_hash, image_size = blob_store.put(result["submission_image"])
         new_submission = Submission(
             submission_time=datetime.datetime.now(), 
-            submission_image=compress_data(compress_image(image_data, quality=5)),
-            graded_image=compress_data(compress_image(graded_image_bytes, quality=15)), 
-            answers=json.dumps({
-                question_num: (choices[question_num][2], graded[question_num])
-                for question_num in graded
-            }), # {1: ("A", True), 2: ("F", False)}  -->  answers (JSON str)
-            grade=grade,
+            submission_image_hash=image_hash,
+            submission_image_size=image_size,
+            submission_image_type=result["submission_image_type"],
+            graded_image_hash=None, # drawn from result the first time it is viewed
+            result=result["result"],
+            answers=result["answers"], # {1: ("A", True), 2: ("F", False)}  -->  answers (JSON str)
+            grade=result["grade"],
             student_id=student_id,
             test_id=test.id
         )
@@ -99,6 +97,10 @@ async def create_submission_live(
         raise HTTPException(status_code=409, detail=f"""Error: Unable to extract the 
 answer sheet. Make sure the answer sheet is the focus of the image. Ensure the 
 background is a solid color and there is no irregular brightness across the image.""")
+    # grading worker died
+    except RuntimeError as e:
+        print(f"Grading pool error: {e}")
+        raise HTTPException(status_code=503, detail=f"{e}")
     except SQLAlchemyError as e:
         print(f"Database error: {e}")
         if "UNIQUE" in str(e):
@@ -113,110 +115,194 @@ def delete_submission(submission_id: int, db: Session = Depends(get_db)):
     if submission is None:
         raise HTTPException(status_code=404, detail="Submission not found")
     
+    blobs = [getattr(submission, column.key) for column in SUBMISSION_BLOB_COLUMNS]
     db.delete(submission)
     db.commit()
+    release_blobs(db, *blobs)
 
     return {"detail": "successfully deleted submission"}
 
 
+def submission_listing(db: Session):
+    '''
+    query of just the columns a GetSubmission shows, no Submission objects are 
+    loaded and the student name comes from the same query instead of one per row
+    '''
+    return db.query(
+        Submission.id,
+        Submission.student_id,
+        func.coalesce(Student.name, "").label("student_name"), # anonymous submissions
+        Submission.grade,
+        Submission.submission_time,
+    ).outerjoin(Student, Submission.student_id == Student.id)
+
+
 @router.get("/{submission_id}", response_model=GetSubmission)
 def get_submission(submission_id: int, db: Session = Depends(get_db)):
-    submission = db.query(Submission).get(submission_id)
+    submission = submission_listing(db).filter(Submission.id == submission_id).first()
     
     if submission is None:
         raise HTTPException(status_code=404, detail="Submission not found")
     
-    student = db.query(Student).get(submission.student_id)
-    sub = {
-        'student_name': student.name, 
-        'student_id': submission.student_id, 
-        'grade': submission.grade, 
-        'id': submission_id, 
-        'submission_time': submission.submission_time 
-    }
-    
-    return sub
+    return submission._asdict()
 
 
 @router.get("/test/{test_id}", response_model=List[GetSubmission])
 def get_submissions_for_test(test_id: str, db: Session = Depends(get_db)):
-    test = db.query(Test).get(test_id)
-
-    if test is None:
+    if db.query(Test.id).filter(Test.id == test_id).first() is None:
         raise HTTPException(status_code=404, detail="Test not found")
 
-    submissions = [
-        {
-            'id': sub.id,
-            'student_id': sub.student.id,
-            'student_name': sub.student.name,
-            'grade': sub.grade, 
-            'submission_time': sub.submission_time            
-        } 
-        for sub in test.submissions
-    ]
+    submissions = submission_listing(db).filter(Submission.test_id == test_id)
     
-    return submissions
+    return [sub._asdict() for sub in submissions]
+
+
+# rendition of the graded image: Submission column prefix
+GRADED_RENDITIONS = {
+    "full": "graded_image",
+    "preview": "graded_preview",
+    "thumbnail": "graded_thumbnail",
+}
+
+def render_graded_images(submission: Submission, db: Session):
+    '''
+    render the graded image of a submission and its smaller sizes, once. Every 
+    later request is served the stored copies.
+
+    submissions graded before the grading result was kept (migration 5c1e9a7f3b20)
+    can't be drawn again, they only have the full image stored with them
+    '''
+    if all(getattr(submission, f"{column}_hash") for column in GRADED_RENDITIONS.values()):
+        return
+    if submission.result is None:
+        return
+
+    renditions = grading.render_graded_image(
+        blob_store.get(submission.submission_image_hash), 
+        submission.result, 
+        num_choices=submission.test.num_choices, 
+        num_questions=submission.test.num_questions
+    )
+    # submissions graded before the smaller sizes existed have a full image already
+    replaced = [getattr(submission, f"{column}_hash") for column in GRADED_RENDITIONS.values()]
+    for rendition, (image, media_type) in renditions.items():
+        column = GRADED_RENDITIONS[rendition]
+        digest, size = blob_store.put(image)
+        setattr(submission, f"{column}_hash", digest)
+        setattr(submission, f"{column}_size", size)
+        setattr(submission, f"{column}_type", media_type)
+    db.commit()
+    release_blobs(db, *replaced)
+
+
+@router.get("/test/{test_id}/gallery", response_model=GetSubmissionGallery)
+def get_submission_gallery_for_test(test_id: str, page: int = 1, per_page: int = 24, 
+                                    db: Session = Depends(get_db)):
+    '''
+    a page of a test's submissions with their graded thumbnails inlined as data 
+    URIs, a whole review screen in one request instead of one per image.
+
+    only thumbnails already stored are inlined, nothing is rendered here. A submission
+    whose graded image was never viewed is listed with thumbnail None, its
+    /image/graded/{id}?size=thumbnail renders it.
+
+    page: 1 based
+    per_page: 1 to 100
+    '''
+    if page < 1 or not 1 <= per_page <= 100:
+        raise HTTPException(status_code=422, detail="page must be >= 1 and per_page within 1-100")
+    if db.query(Test.id).filter(Test.id == test_id).first() is None:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    listing = submission_listing(db).filter(Submission.test_id == test_id)
+    total = listing.count()
+    rows = listing.add_columns(
+        Submission.graded_thumbnail_hash, Submission.graded_thumbnail_type
+    ).order_by(Submission.id).offset((page - 1) * per_page).limit(per_page).all()
+
+    submissions = []
+    for row in rows:
+        item = row._asdict()
+        thumbnail_hash, thumbnail_type = item.pop("graded_thumbnail_hash"), item.pop("graded_thumbnail_type")
+        item["thumbnail"] = None
+        if thumbnail_hash is not None:
+            encoded = base64.b64encode(blob_store.get(thumbnail_hash)).decode("ascii")
+            item["thumbnail"] = f"data:{thumbnail_type};base64,{encoded}"
+        submissions.append(item)
+
+    return {
+        "test_id": test_id,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "submissions": submissions,
+    }
 
 
 @router.get("/image/graded/{submission_id}")
-def get_submission_graded_image(submission_id: int, db: Session = Depends(get_db)):
+def get_submission_graded_image(submission_id: int, 
+                                request: Request,
+                                size: Literal["full", "preview", "thumbnail"] = "full",
+                                db: Session = Depends(get_db)):
+    '''
+    size: "full", "preview" (960px wide) or "thumbnail" (320px wide)
+    '''
     submission = db.query(Submission).get(submission_id)
 
     if submission is None:
         raise HTTPException(status_code=404, detail="Test not found")
     
-    return StreamingResponse(io.BytesIO(submission.graded_image), media_type="image/png")
+    render_graded_images(submission, db)
+    
+    column = GRADED_RENDITIONS[size]
+    if getattr(submission, f"{column}_hash") is None: # nothing to render it from
+        raise HTTPException(status_code=404, detail="Graded image not available")
+    return blob_response(getattr(submission, f"{column}_hash"), 
+                         media_type=getattr(submission, f"{column}_type"), request=request)
 
 
 @router.get("/image/original/{submission_id}")
-def get_submission_original_image(submission_id: int, db: Session = Depends(get_db)):
-    submission = db.query(Submission).get(submission_id)
+def get_submission_original_image(submission_id: int, request: Request, db: Session = Depends(get_db)):
+    submission = db.query(Submission.submission_image_hash, Submission.submission_image_type).filter(
+        Submission.id == submission_id).first()
 
     if submission is None:
         raise HTTPException(status_code=404, detail="Test not found")
     
-    return StreamingResponse(io.BytesIO(submission.submission_image), media_type="image/png")
+    return blob_response(submission.submission_image_hash, 
+                         media_type=submission.submission_image_type, request=request)
 
 
 
 @router.get("/student/{student_id}", response_model=List[GetSubmission])
 def get_submissions_for_student(student_id: int, db: Session = Depends(get_db)):
-    student = db.query(Student).get(student_id)
-
-    if student is None:
+    if db.query(Student.id).filter(Student.id == student_id).first() is None:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    return  [{
-        'id': test_sub.id,
-        'student_id': test_sub.student_id,
-        'student_name': test_sub.student.name,
-        'grade': test_sub.grade
-    } for test_sub in student.submissions]
+    submissions = submission_listing(db).filter(Submission.student_id == student_id)
+
+    return [sub._asdict() for sub in submissions]
 
 
 @router.get("/student/{student_id}/{course_id}", response_model=List[GetStudentSubmission])
 def get_submissions_for_student_for_course(student_id: int, course_id:int, db: Session = Depends(get_db)):
 
-    submissions = db.query(Submission).filter(
-        Submission.student_id == student_id
+    submissions = db.query(
+        Submission.id, Submission.student_id, Submission.grade
+    ).join(Test, Submission.test_id == Test.id).filter(
+        Submission.student_id == student_id,
+        Test.course_id == course_id
     ).all()
 
-    submissions = [x for x in submissions if x.test.course_id == course_id]
-
-    print(f"submissions: {submissions}")
-
     if not submissions:
         raise HTTPException(status_code=404, detail="No submissions found for this student in this course.")
 
-    print(f"submissions: {submissions}")
-
-    return submissions
+    return [sub._asdict() for sub in submissions]
 
 
 @router.get("/{test_id}/{student_id}", response_model=GetSubmission)
 def get_submission_for_test_for_student(test_id:str, student_id:int, db: Session = Depends(get_db)):
-    test_sub = db.query(Submission).filter(
+    test_sub = submission_listing(db).filter(
         Submission.student_id==student_id, 
         Submission.test_id==test_id
     ).first()
@@ -224,17 +310,12 @@ def get_submission_for_test_for_student(test_id:str, student_id:int, db: Session
     if test_sub is None:
         raise HTTPException(404, detail=f"submission with this student and test id not found!")
 
-    return {
-        'id': test_sub.id,
-        'student_id': test_sub.student_id,
-        'student_name': test_sub.student.name,
-        'grade': test_sub.grade
-    }
+    return test_sub._asdict()
 
 
 @router.get("/etc/answers/{submission_id}", response_model=GetSubmissionAnswers)
 def get_submission_answers(submission_id:int, db: Session = Depends(get_db)):
-    submission = db.query(Submission).filter(
+    submission = db.query(Submission.answers).filter(
         Submission.id==submission_id).first()
 
     if submission is None:
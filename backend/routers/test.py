@@ -1,12 +1,12 @@
 # routers/test.py
-from fastapi import HTTPException, APIRouter, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import HTTPException, APIRouter, Depends, Request, BackgroundTasks
+from fastapi.responses import Response
 import json
 import cv2
 import io
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from typing import List, Literal
 from models.test import (
     CreateTest,
     UpdateTest,
@@ -16,8 +16,10 @@ from models.test import (
 )
 from models.users import GetStudentMinimum
 from answer_sheets import Pictron
-from tables import Test, Course
-from db import get_db, compress_data, compress_image
+from tables import Test, Course, Submission
+from db import get_db, SessionLocal, encode_image, release_blobs, SUBMISSION_BLOB_COLUMNS
+from sheet_cache import sheet_cache, sheet_key
+from blobstore import blob_store, blob_response
 import base64
 from time import sleep
 
@@ -29,10 +31,71 @@ router = APIRouter(
 )
 
 
+def render_answer_keys(test: Test, db: Session):
+    '''
+    draw the blank answer sheet of a test and its filled in key, once. Normally done
+    by generate_answer_keys right after the test is created, a request for the images
+    that comes before that finished draws them itself.
+    '''
+    if test.answer_key_blank_hash and test.answer_key_filled_hash:
+        return
+
+    # find the best template for the given number of questions and choices. 
+    answer_sheet_config = Pictron.find_best_config(test.num_questions, test.num_choices)
+    answer_sheet = Pictron(**answer_sheet_config)
+
+    # the blank page is drawn and encoded once, it is kept in the blob store (not
+    # the sheet cache, nothing asks for this test's sheet again) ...
+    answer_sheet.generate(course_name=test.course.name, test_name=test.name)
+    # answer_sheet.image.show(title=f"Blank test: {test.name}") # debug
+    images = {"answer_key_blank": encode_image(answer_sheet.image, quality=30)}
+
+    # ... then becomes the key by filling in the answers' bubbles
+    answer_sheet.fillAnswers(
+        answers={int(question_num): answer for question_num, answer in json.loads(test.answers).items()}
+    )
+    #answer_sheet.image.show(title=f"Test Key: {test.name}") # debug
+    images["answer_key_filled"] = encode_image(answer_sheet.image, quality=30)
+
+    replaced = [test.answer_key_blank_hash, test.answer_key_filled_hash]
+    for column, (image, media_type) in images.items():
+        digest, size = blob_store.put(image)
+        setattr(test, f"{column}_hash", digest)
+        setattr(test, f"{column}_size", size)
+        setattr(test, f"{column}_type", media_type)
+    test.answer_key_status = "ready"
+    db.commit()
+    release_blobs(db, *replaced)
+
+
+def generate_answer_keys(test_id: str):
+    '''
+    background task of create_test_live, runs after the response is sent so it gets
+    its own session
+    '''
+    db = SessionLocal()
+    try:
+        test = db.query(Test).get(test_id)
+        if test is None: # deleted in the meantime
+            return
+        try:
+            render_answer_keys(test, db)
+        except Exception as e:
+            print(f"Could not draw the answer keys of test {test_id}: {e}")
+            db.rollback()
+            db.query(Test).filter(Test.id == test_id).update({"answer_key_status": "failed"})
+            db.commit()
+    finally:
+        db.close()
+
+
 @router.post("/", response_model=CreateTestConfirmation)  # , dependencies=[Depends(jwt_token_verification)])
-def create_test_live(test: CreateTest, db: Session = Depends(get_db)):
+def create_test_live(test: CreateTest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     '''
-    Create a test using the offical LiveTest answer sheets
+    Create a test using the offical LiveTest answer sheets. 
+
+    The test is saved right away, its blank answer sheet and filled in key are drawn
+    in the background (answer_key_status goes from pending to ready).
     '''
     # #TODO check to see that the user_type and user_id of the JWT 
     # making the call is the teacher that teaches the course
@@ -43,30 +106,13 @@ def create_test_live(test: CreateTest, db: Session = Depends(get_db)):
     if not course:
         raise HTTPException(404, detail=f"course does not exist.")
     
+    # caught here rather than when the key is drawn after the response is sent
+    choices = [chr(choice + 65) for choice in range(test.num_choices)]
+    if any(answer not in choices for answer in test.answers.values()):
+        raise HTTPException(422, detail=f"answers must be one of {', '.join(choices)}")
 
     new_test = Test(**test.model_dump())
-
-    # find the best template for the given number of questions and choices. 
-    answer_sheet_config = Pictron.find_best_config(test.num_questions, test.num_choices)
-    answer_sheet = Pictron(**answer_sheet_config)
-    
-    # generate, compress, and save the blank version image of the test
-    answer_sheet.generate(course_name=course.name, test_name=test.name)
-    # answer_sheet.image.show(title=f"Blank test: {test.name}") # debug
-    blank_bytes = io.BytesIO()
-    answer_sheet.image.save(blank_bytes, format="JPEG")
-    new_test.answer_key_blank = compress_data(compress_image(blank_bytes.getvalue(), quality=30))
-   
-    # generate and save the compressed, filled in key version of the test
-    answer_sheet.generate(
-        answers={int(question_num): answer for question_num, answer in test.answers.items()}, 
-        course_name=course.name, 
-        test_name=test.name
-    )
-    #answer_sheet.image.show(title=f"Test Key: {test.name}") # debug
-    filled_bytes = io.BytesIO()
-    answer_sheet.image.save(filled_bytes, format="JPEG")
-    new_test.answer_key_filled = compress_data(compress_image(filled_bytes.getvalue(), quality=30))
+    new_test.answer_key_status = "pending"
 
     # stringify the answers that were passed for storage in the database
     new_test.answers = json.dumps(test.answers)
@@ -78,9 +124,8 @@ def create_test_live(test: CreateTest, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(409, detail=f"{course.name} already has a test named {test.name}")
 
-
-    db_obj = db.query(Test).filter(Test.name == test.name, Test.course_id == test.course_id).first()
-    return {"id": db_obj.id, "name": test.name}
+    background_tasks.add_task(generate_answer_keys, new_test.id)
+    return {"id": new_test.id, "name": test.name, "answer_key_status": new_test.answer_key_status}
 
 
 @router.get("/", response_model=List[GetTest])
@@ -111,50 +156,72 @@ def get_tests_for_course(course_id: int, db: Session = Depends(get_db)):
     return course.tests
 
 
-@router.get("/image/key/{test_id}/")
-def get_test_key_image(test_id: str, db: Session = Depends(get_db)):
-    test = db.query(Test).get(test_id)
+def answer_key_response(test_id: str, column: str, request: Request, db: Session):
+    '''
+    serve one of a test's answer key images (column answer_key_blank or answer_key_filled),
+    drawing them first when the background task hasn't yet
+    '''
+    image_hash, image_type = getattr(Test, f"{column}_hash"), getattr(Test, f"{column}_type")
+    test = db.query(image_hash, image_type).filter(Test.id == test_id).first()
 
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
-    
-    return StreamingResponse(io.BytesIO(test.answer_key_filled), media_type="image/png")
 
-@router.get("/image/blank/{test_id}/")
-def get_test_blank_image(test_id: str, db: Session = Depends(get_db)):
-    test = db.query(Test).get(test_id)
+    if test[0] is None:
+        try:
+            render_answer_keys(db.query(Test).get(test_id), db)
+        except Exception as e:
+            print(f"Could not draw the answer keys of test {test_id}: {e}")
+            raise HTTPException(status_code=500, detail="The answer key could not be drawn")
+        test = db.query(image_hash, image_type).filter(Test.id == test_id).first()
+
+    return blob_response(test[0], media_type=test[1], request=request)
 
-    if not test:
-        raise HTTPException(status_code=404, detail="Test not found")
-    
-    return StreamingResponse(io.BytesIO(test.answer_key_blank), media_type="image/png")
+
+@router.get("/image/key/{test_id}/")
+def get_test_key_image(test_id: str, request: Request, db: Session = Depends(get_db)):
+    return answer_key_response(test_id, "answer_key_filled", request, db)
+
+@router.get("/image/blank/{test_id}/")
+def get_test_blank_image(test_id: str, request: Request, db: Session = Depends(get_db)):
+    return answer_key_response(test_id, "answer_key_blank", request, db)
 
 
 @router.get("/image/blank/{num_questions}/{num_choices}/{course_id}")
-async def get_test_blank_template(num_questions:int, 
-                                  num_choices:int, 
-                                  course_id:int,
-                                  test_name:str=None,
-                                  db: Session = Depends(get_db)):
+def get_test_blank_template(num_questions:int, 
+                            num_choices:int, 
+                            course_id:int,
+                            test_name:str=None,
+                            output:Literal["png", "svg"]="png",
+                            db: Session = Depends(get_db)):
     '''
     return a templated LiveTest generated answer sheet.
-    '''
-    best_config = Pictron.find_best_config(num_questions, num_choices)
-    obj = Pictron(**best_config)
 
+    output=svg returns it as a vector image, small and sharp at any printer resolution
+    '''
     course = db.query(Course).get(course_id)
     if not course:
         raise HTTPException(404, detail=f"course does not exist.")
 
-    obj.generate(
-        course_name=course.name, 
-        test_name=test_name
-    )
+    best_config = Pictron.find_best_config(num_questions, num_choices)
+
+    if output == "svg":
+        sheet = Pictron(**best_config).generateSVG(course_name=course.name, test_name=test_name)
+        return Response(sheet, media_type="image/svg+xml")
 
-    filled_bytes = io.BytesIO()
-    obj.image.save(filled_bytes, format="PNG")
+    def render_template():
+        obj = Pictron(**best_config)
+        obj.generate(
+            course_name=course.name, 
+            test_name=test_name
+        )
+        filled_bytes = io.BytesIO()
+        obj.image.save(filled_bytes, format="PNG")
+        return filled_bytes.getvalue()
+
+    sheet = sheet_cache.get_or_render(sheet_key(best_config, course.name, test_name, "png"), render_template)
 
-    return StreamingResponse(io.BytesIO(filled_bytes.getvalue()), media_type="image/png")
+    return Response(sheet, media_type="image/png")
 
 
 
@@ -165,6 +232,7 @@ def update_test(test_id: str, update_data: UpdateTest, db: Session = Depends(get
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
 
+    old_name = test.name
     for key, value in update_data.model_dump().items():
         if value != None:
             setattr(test, key, value)
@@ -179,6 +247,9 @@ def update_test(test_id: str, update_data: UpdateTest, db: Session = Depends(get
 {update_data.name} already exists in this course""",
         )
 
+    if test.name != old_name and test.course is not None:
+        sheet_cache.invalidate(test.course.name, old_name)
+
     return {"detail": "Successfully updated test details."}
 
 
@@ -189,8 +260,16 @@ def delete_test(test_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Test not found")
 
     name = test.name
+    course_name = test.course.name if test.course is not None else None
+    # the test's submissions go with it (cascade)
+    blobs = [test.answer_key_blank_hash, test.answer_key_filled_hash]
+    for submission_blobs in db.query(*SUBMISSION_BLOB_COLUMNS).filter(Submission.test_id == test_id):
+        blobs += submission_blobs
     db.delete(test)
     db.commit()
+    release_blobs(db, *blobs)
+    if course_name is not None:
+        sheet_cache.invalidate(course_name, name)
 
     return {"detail": f"Test {name} deleted successfully"}
 
@@ -206,7 +285,8 @@ def get_not_submitted_for_test(test_id: str, db: Session = Depends(get_db)):
     if test is None:
         raise HTTPException(404, detail="Test not found")
     
-    submitted = {x.student_id: None for x in test.submissions}
+    submitted = {student_id for student_id, in db.query(Submission.student_id).filter(
+        Submission.test_id == test_id)}
     not_submitted = [i.__dict__ for i in test.course.students if i.id not in submitted]
 
     return not_submitted
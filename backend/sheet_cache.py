@@ -0,0 +1,180 @@
+"""
+Cache of rendered answer sheets.
+
+A blank sheet only depends on its template config, the course name and the test
+name, yet drawing and encoding one takes 0.3-0.6s. The encoded sheets are kept
+in a size bounded LRU in memory and, when SHEET_CACHE_PATH is set, in a
+directory every uvicorn worker shares, bounded the same way.
+
+    SHEET_CACHE_MB       memory budget of the in process LRU (0 disables it)
+    SHEET_CACHE_PATH     shared on disk cache directory (unset: memory only)
+    SHEET_CACHE_DISK_MB  budget of that directory, least recently used files go first
+
+A key covers everything a sheet depends on, so an entry is never stale, only
+unreachable once its course or test is renamed or deleted. Entries are filed
+under their course and test names so those drop them from memory and disk right
+away (invalidate) instead of leaving them to age out. Other workers' memory
+entries of them age out of their LRU.
+
+    sheet = sheet_cache.get_or_render(
+        sheet_key(config, "PLC", "Exam 1", "png"), lambda: render_png(...))
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from env import sheet_cache_mb, sheet_cache_path, sheet_cache_disk_mb
+
+
+def name_hash(name: str | None) -> str:
+    return hashlib.sha256(str(name).encode()).hexdigest()[:16]
+
+
+def sheet_key(config: dict, course_name: str | None, test_name: str | None,
+              encoding: str) -> tuple[str, str, str]:
+    """
+    (course name hash, test name hash, hash of everything the sheet depends on)
+
+    encoding tells apart the encoded forms of the same sheet, "png", "webp-30"...
+    """
+    inputs = json.dumps([config, course_name, test_name, encoding], sort_keys=True, default=str)
+    return name_hash(course_name), name_hash(test_name), hashlib.sha256(inputs.encode()).hexdigest()
+
+
+class SheetCache:
+    def __init__(self, max_bytes: int, path: str | None = None, max_disk_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self.path = os.path.abspath(path) if path else None
+        # None leaves the directory unbounded
+        self.max_disk_bytes = max_disk_bytes
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[tuple, bytes] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def file_path(self, key: tuple) -> str:
+        course, test, digest = key
+        return os.path.join(self.path, course, test, digest)
+
+    def get(self, key: tuple) -> bytes | None:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+        data = None
+        if self.path is not None:
+            try:
+                with open(self.file_path(key), "rb") as sheet_file:
+                    data = sheet_file.read()
+                # the mtime is when it was last used, see trim_disk
+                os.utime(self.file_path(key))
+            except FileNotFoundError: # not cached, or trimmed away by another worker
+                pass
+
+        with self.lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.remember(key, data)
+        return data
+
+    def put(self, key: tuple, data: bytes):
+        self.remember(key, data)
+        if self.path is None:
+            return
+
+        # renamed into place, other workers never read a partial file
+        path = self.file_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # the disk cache is best effort, the sheet is still served
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.trim_disk()
+
+    def trim_disk(self):
+        """
+        delete the least recently used files (oldest mtime) until the directory fits
+        max_disk_bytes. Every worker trims after it writes, so the shared directory
+        stays within budget whichever worker fills it
+        """
+        if self.path is None or self.max_disk_bytes is None:
+            return
+
+        files = []
+        for directory, _, names in os.walk(self.path):
+            for name in names:
+                if name.startswith(".tmp-"): # being written
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError: # trimmed by another worker
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                os.rmdir(os.path.dirname(path)) # the test's directory, once empty
+            except OSError:
+                pass
+            total -= size
+
+    def remember(self, key: tuple, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get_or_render(self, key: tuple, render: Callable[[], bytes]) -> bytes:
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def invalidate(self, course_name: str | None, test_name: str | None = None):
+        """
+        drop the sheets of a course, or of one of its tests
+        """
+        course = name_hash(course_name)
+        test = name_hash(test_name) if test_name is not None else None
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == course and test in (None, k[1])]:
+                self.size -= len(self.entries.pop(key))
+
+        if self.path is not None:
+            directory = os.path.join(self.path, course, test) if test else os.path.join(self.path, course)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+sheet_cache = SheetCache(sheet_cache_mb * 1024 * 1024, sheet_cache_path, sheet_cache_disk_mb * 1024 * 1024)
@@ -14,7 +14,6 @@ main tables for the backend are
 
 from sqlalchemy import (
     Column,
-    LargeBinary,
     Integer,
     DateTime,
     String,
@@ -24,7 +23,7 @@ from sqlalchemy import (
     CheckConstraint,
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 import uuid
 
 Base = declarative_base()
@@ -98,11 +97,28 @@ class Submission(Base):
     __tablename__ = "submission"
     id = Column(Integer, primary_key=True)
 
-    submission_image = Column(LargeBinary, nullable=False)
-    graded_image = Column(LargeBinary, nullable=False)
+    # images live in the blob store (blobstore.py), rows keep their hash, size
+    # and media type ("image/webp", see db.IMAGE_FORMATS). The hashes are indexed
+    # for db.release_blobs, which looks every released blob up in each of them
+    submission_image_hash = Column(String(64), nullable=False, index=True)
+    submission_image_size = Column(Integer, nullable=False)
+    submission_image_type = Column(String(32), nullable=False)
+    graded_image_hash = Column(String(64), nullable=True, index=True)  # rendered on first view
+    graded_image_size = Column(Integer, nullable=True)
+    graded_image_type = Column(String(32), nullable=True)
+    # smaller renditions of the graded image, rendered along with it
+    graded_preview_hash = Column(String(64), nullable=True, index=True)
+    graded_preview_size = Column(Integer, nullable=True)
+    graded_preview_type = Column(String(32), nullable=True)
+    graded_thumbnail_hash = Column(String(64), nullable=True, index=True)
+    graded_thumbnail_size = Column(Integer, nullable=True)
+    graded_thumbnail_type = Column(String(32), nullable=True)
     submission_time = Column(DateTime)
-    answers = Column(String, nullable=False)  # JSON string produced by
+    # the JSON payloads are deferred, they are only read by the endpoints that
+    # need them instead of with every row of a listing
+    answers = deferred(Column(String, nullable=False))  # JSON string produced by
     # grade_answers in SubmissionProcessor
+    result = deferred(Column(String, nullable=True))  # JSON, OMRGrader.build_result
     grade = Column(Float, nullable=False)
 
     # correlate the submission to a student
@@ -127,9 +143,15 @@ class Test(Base):
     num_questions = Column(Integer, nullable=False)
     num_choices = Column(Integer, nullable=False)
     
-    answers = Column(String, nullable=False)
-    answer_key_blank = Column(LargeBinary, nullable=False)
-    answer_key_filled = Column(LargeBinary, nullable=False)
+    answers = deferred(Column(String, nullable=False))  # JSON key, only read to grade
+    # blob store, drawn after the test is created (see routers/test.py render_answer_keys)
+    answer_key_status = Column(String(16), nullable=False, default="pending")  # pending, ready, failed
+    answer_key_blank_hash = Column(String(64), nullable=True, index=True)
+    answer_key_blank_size = Column(Integer, nullable=True)
+    answer_key_blank_type = Column(String(32), nullable=True)
+    answer_key_filled_hash = Column(String(64), nullable=True, index=True)
+    answer_key_filled_size = Column(Integer, nullable=True)
+    answer_key_filled_type = Column(String(32), nullable=True)
 
     # relationships
     submissions = relationship("Submission", back_populates="test", cascade="all, delete")
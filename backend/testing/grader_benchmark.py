@@ -0,0 +1,247 @@
+"""
+Throughput and accuracy benchmark for the OMRGrader.
+
+Builds a corpus of Pictron.generate(random_filled=True) sheets for every template
+in perfect_configs.json (or the --choices / --questions given), grades them and
+compares the read choices with the random_choices the sheets were filled with.
+
+Reports per template and overall:
+    images/sec, latency percentiles, per stage latency percentiles (see
+    OMRGrader.stage), peak RSS and accuracy (questions read right, sheets read
+    perfectly, sheets that failed to grade). Every template is built and graded
+    in a process of its own so its peak RSS is its own.
+
+The corpus is seeded so two runs (say before and after a grader change) grade
+the exact same sheets. Results are written as JSON (--output) for comparing runs.
+
+usage (from backend/):
+    python testing/grader_benchmark.py --sheets 5 --output before.json
+    python testing/grader_benchmark.py --choices 4 --questions 50 100 --mode contour
+    python testing/grader_benchmark.py --workers 8    # adds a grade_batch throughput pass
+    python testing/grader_benchmark.py --photos --severity 1.5   # augmented photos (answer_sheets/augment.py)
+"""
+import argparse
+import io
+import multiprocessing
+import json
+import os
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_sheets import Pictron, OMRGrader
+from answer_sheets.grader import peak_rss_kb
+from answer_sheets.augment import PhotoAugmenter
+from answer_sheets.templates import registry
+
+PERCENTILES = (50, 90, 99)
+
+
+def build_corpus(num_questions:int, num_choices:int, sheets:int, seed:int, severity:float=None):
+    '''
+    sheets random filled answer sheets of one template, seeded per template so the
+    corpus doesn't depend on which other templates are benchmarked. PNG bytes or, 
+    when a severity is given, JPEG photos from PhotoAugmenter.
+
+    returns [(image_bytes, key, corners), ...], key being {'1': 'A', ...} and corners
+    the page's corners in the photo (None for plain sheets)
+    '''
+    random.seed(f"{seed}-{num_choices}-{num_questions}")
+    augmenter = PhotoAugmenter(seed=random.randrange(2 ** 32), severity=severity) \
+        if severity is not None else None
+    corpus = []
+    for _ in range(sheets):
+        pictron = Pictron(**Pictron.find_best_config(num_questions, num_choices))
+        pictron.generate(random_filled=True)
+        key = {str(q): c for q, c in pictron.random_choices.items()}
+        if augmenter is not None:
+            photo, truth = augmenter.augment(pictron.image)
+            corpus.append((photo, key, np.array(truth["corners"])))
+            continue
+        buf = io.BytesIO()
+        pictron.image.save(buf, format="PNG")
+        corpus.append((buf.getvalue(), key, None))
+    return corpus
+
+
+def percentiles(values) -> dict:
+    '''
+    {"p50": ..., "p90": ..., "p99": ..., "mean": ...} in milliseconds
+    '''
+    if not values:
+        return {}
+    values = np.asarray(values) * 1000
+    out = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    out["mean"] = round(float(values.mean()), 3)
+    return out
+
+
+def grader_settings(num_questions:int, num_choices:int, mode:str, photos:bool=False) -> dict:
+    return {
+        "num_choices": num_choices,
+        "num_questions": num_questions,
+        "mechanical": not photos,
+        "render": False,
+        # template mode is what the API grades with, contour the layout free search
+        "layout": Pictron.template_layout(num_questions, num_choices) if mode == "template" else None,
+        "registration": "fiducial" if mode == "template" else "contour",
+    }
+
+
+def benchmark_template(num_questions:int, num_choices:int, corpus:list, mode:str, photos:bool=False) -> dict:
+    '''
+    grade the corpus of one template one sheet at a time
+    '''
+    latencies, stages, corner_errors = [], {}, []
+    correct = total = perfect = failures = 0
+
+    for image, key, corners in corpus:
+        grader = OMRGrader(**grader_settings(num_questions, num_choices, mode, photos))
+        start = time.perf_counter()
+        grade, graded, choices = grader.run(bytes_obj=image, key=key)
+        latencies.append(time.perf_counter() - start)
+
+        for stage, seconds in grader.timings.items():
+            stages.setdefault(stage, []).append(seconds)
+        if corners is not None and grader.corners is not None:
+            # worst corner, in photo pixels (photos may have been decoded at a reduced size)
+            scale = np.array(Image.open(io.BytesIO(image)).size) / grader.source_size
+            corner_errors.append(float(np.linalg.norm(grader.corners * scale - corners, axis=1).max()))
+
+        total += num_questions
+        if grade is False:
+            failures += 1
+            continue
+        right = sum(1 for q, (_, _, letter) in choices.items() if key[str(q)] == letter)
+        correct += right
+        perfect += right == num_questions
+
+    return {
+        "num_choices": num_choices,
+        "num_questions": num_questions,
+        "sheets": len(corpus),
+        "images_per_sec": round(len(corpus) / sum(latencies), 3),
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        "accuracy": round(correct / total, 5) if total else None,
+        "perfect_sheets": perfect,
+        "failures": failures,
+        "corner_error_px": {
+            f"p{p}": round(float(np.percentile(corner_errors, p)), 2) for p in PERCENTILES
+        } if corner_errors else None,
+        "_latencies": latencies,
+    }
+
+
+def batch_throughput(num_questions:int, num_choices:int, corpus:list, mode:str, 
+                     workers:int, photos:bool=False) -> float:
+    '''
+    images/sec of OMRGrader.grade_batch over the corpus, pool start up excluded
+    '''
+    settings = grader_settings(num_questions, num_choices, mode, photos)
+    key = corpus[0][1] # accuracy is measured in the sequential pass
+    images = [image for image, _, _ in corpus] * max(1, (workers * 4) // len(corpus))
+
+    # one extra image per worker warms the pool up, timing starts once they are done
+    done, start = 0, time.perf_counter()
+    for _ in OMRGrader.grade_batch(
+            [images[0]] * workers + images, key, num_choices, num_questions,
+            mechanical=settings["mechanical"], layout=settings["layout"], 
+            registration=settings["registration"], max_workers=workers):
+        done += 1
+        if done == workers:
+            start = time.perf_counter()
+    return round(len(images) / (time.perf_counter() - start), 3)
+
+
+def measure_template(num_questions:int, num_choices:int, args:argparse.Namespace) -> dict:
+    '''
+    corpus, sequential pass and (--workers) batch pass of one template, run in a
+    fresh process by main so peak_rss_kb is this template's alone
+    '''
+    if args.cv_threads is not None:
+        cv2.setNumThreads(args.cv_threads)
+    corpus = build_corpus(num_questions, num_choices, args.sheets, args.seed,
+                          severity=args.severity if args.photos else None)
+    result = benchmark_template(num_questions, num_choices, corpus, args.mode, args.photos)
+    # before the batch pass, its workers are processes of their own
+    result["peak_rss_kb"] = peak_rss_kb()
+    if args.workers:
+        result["batch_images_per_sec"] = batch_throughput(
+            num_questions, num_choices, corpus, args.mode, args.workers, args.photos)
+    return result
+
+
+def main():
+    counts = registry.counts()
+    parser = argparse.ArgumentParser(description="Benchmark OMRGrader speed and accuracy on generated sheets.")
+    parser.add_argument("--choices", type=int, nargs="+", default=sorted(counts),
+                        help="choice counts to benchmark (default: all)")
+    parser.add_argument("--questions", type=int, nargs="+", default=None,
+                        help="question counts to benchmark (default: every template)")
+    parser.add_argument("--sheets", type=int, default=5, help="sheets per template")
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed")
+    parser.add_argument("--mode", choices=["template", "contour"], default="template",
+                        help="template: sample the layout's bubbles (what the API does), contour: search for them")
+    parser.add_argument("--photos", action="store_true",
+                        help="grade augmented photos of the sheets instead of the sheets themselves")
+    parser.add_argument("--severity", type=float, default=1.0, help="PhotoAugmenter severity for --photos")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="also measure grade_batch throughput with this many processes")
+    parser.add_argument("--cv-threads", type=int, default=None, help="cv2.setNumThreads for the sequential pass")
+    parser.add_argument("--output", default="grader_benchmark.json", help="where to write the JSON report")
+    args = parser.parse_args()
+
+    results, latencies = [], []
+    for num_choices in args.choices:
+        for num_questions in (args.questions or counts[num_choices]):
+            # ru_maxrss only ever grows, a new process per template starts it over
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(measure_template, num_questions, num_choices, args).result()
+            latencies += result.pop("_latencies")
+            results.append(result)
+            print(f"{num_choices} choices {num_questions:>3} questions: "
+                  f"{result['images_per_sec']:>7.2f} img/s  "
+                  f"p50 {result['latency_ms']['p50']:>8.1f} ms  "
+                  f"accuracy {result['accuracy']}  failures {result['failures']}", file=sys.stderr)
+
+    sheets = sum(r["sheets"] for r in results)
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "cv_threads": args.cv_threads if args.cv_threads is not None else cv2.getNumThreads(),
+        },
+        "settings": vars(args),
+        "overall": {
+            "sheets": sheets,
+            "images_per_sec": round(len(latencies) / sum(latencies), 3),
+            "latency_ms": percentiles(latencies),
+            "accuracy": round(sum(r["accuracy"] * r["sheets"] * r["num_questions"] for r in results) /
+                              sum(r["sheets"] * r["num_questions"] for r in results), 5),
+            "perfect_sheets": sum(r["perfect_sheets"] for r in results),
+            "failures": sum(r["failures"] for r in results),
+            "peak_rss_kb": max((r["peak_rss_kb"] for r in results if r["peak_rss_kb"]), default=None),
+        },
+        "templates": results,
+    }
+
+    # not stdout, the grader prints its progress there
+    with open(args.output, "w") as out_file:
+        json.dump(report, out_file, indent=2)
+    print(f"report written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
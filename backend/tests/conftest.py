@@ -0,0 +1,149 @@
+'''
+shared fixtures of the backend tests, run them from backend/ with
+
+    python -m pytest tests
+
+the app is pointed at a throwaway sqlite database and blob directory before
+anything imports env.py, and grades on a thread (GRADER_WORKERS=0)
+'''
+
+import itertools
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+from helpers import sheet, png_bytes
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP_DIR = tempfile.mkdtemp(prefix="livetest-tests-")
+# every test created gets its own name, names are unique per course
+TEST_NUMBERS = itertools.count(1)
+
+os.environ.update({
+    "DOCKER": "1", # use DATABASE_URL instead of ./scantron-hacker.db
+    "DATABASE_URL": f"sqlite:///{os.path.join(TMP_DIR, 'livetest.db')}",
+    "BLOB_STORE_PATH": os.path.join(TMP_DIR, "blobs"),
+    "SHEET_CACHE_PATH": "",
+    "GRADER_WORKERS": "0",
+})
+sys.path.insert(0, BACKEND_DIR)
+# grading.py's font path is relative to backend/
+os.chdir(BACKEND_DIR)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+
+def row_id(table:str, **filters):
+    '''
+    id of the row the create endpoints (they don't return it) made
+    '''
+    import tables
+    from db import SessionLocal
+
+    with SessionLocal() as db:
+        return db.query(getattr(tables, table)).filter_by(**filters).one().id
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def course(client):
+    response = client.post("/course/", json={
+        "name": "PLC", "semester_season": "Fall", "course_number": 4883,
+        "section": 1, "year": 2024, "teacher_id": None, "subject": "CMPS",
+    })
+    assert response.status_code == 200, response.text
+    return {"id": row_id("Course", name="PLC"), **response.json()}
+
+
+@pytest.fixture(scope="session")
+def student(client):
+    response = client.post("/users/students/", json={
+        "name": "Ada Lovelace", "email": "ada@example.com", "password": "hunter22",
+    })
+    assert response.status_code == 200, response.text
+    return {"id": row_id("Student", email="ada@example.com"), "name": "Ada Lovelace"}
+
+
+@pytest.fixture
+def make_test(client, course):
+    '''
+    create_test(num_questions, num_choices, name=None) -> (test json, key)
+    '''
+    def create_test(num_questions:int=10, num_choices:int=4, name:str=None):
+        key = {str(q): chr(65 + (q * 7) % num_choices) for q in range(1, num_questions + 1)}
+        response = client.post("/test/", json={
+            "name": name or f"Exam {next(TEST_NUMBERS)}",
+            "start_t": "2024-01-01T00:00:00", "end_t": "2024-01-02T00:00:00",
+            "num_questions": num_questions, "num_choices": num_choices,
+            "course_id": course["id"], "answers": key,
+        })
+        assert response.status_code == 200, response.text
+        return response.json(), key
+
+    return create_test
+
+
+@pytest.fixture
+def submit(client, student):
+    '''
+    submit(test_id, answers, num_questions, num_choices) -> POST /submission/ response
+    '''
+    def submit_sheet(test_id:str, answers:dict, num_questions:int, num_choices:int):
+        image = png_bytes(sheet(num_questions, num_choices, answers).image)
+        return client.post(
+            "/submission/?mechanical=true",
+            files={"submission_image": ("sheet.png", image, "image/png")},
+            data={"test_id": test_id, "student_id": student["id"]},
+        )
+
+    return submit_sheet
+
+
+@pytest.fixture
+def migrations(client, tmp_path, monkeypatch):
+    '''
+    migrations() -> alembic config of a copy of the test database as it is now, stamped
+    at head. Migrate it with alembic.command.downgrade(config, revision), the copy's file
+    is config.attributes["path"]. The migrations work on a copy of the blob store too,
+    every call copies both again
+    '''
+    from alembic import command
+    from alembic.config import Config
+    import blobstore
+
+    copies = itertools.count(1)
+
+    def copy_database():
+        copy_dir = tmp_path / f"copy-{next(copies)}"
+        copy_dir.mkdir()
+        path = str(copy_dir / "migrated.db")
+        source = sqlite3.connect(os.environ["DATABASE_URL"].removeprefix("sqlite:///"))
+        with sqlite3.connect(path) as copy:
+            source.backup(copy)
+        source.close()
+
+        blobs = str(copy_dir / "blobs")
+        shutil.copytree(os.environ["BLOB_STORE_PATH"], blobs)
+        monkeypatch.setattr(blobstore, "blob_store", blobstore.LocalBlobStore(blobs))
+
+        config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+        config.set_main_option("sqlalchemy.url", f"sqlite:///{path}")
+        config.attributes["path"] = path
+        command.stamp(config, "head")
+        return config
+
+    return copy_database
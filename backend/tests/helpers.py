@@ -0,0 +1,46 @@
+'''
+answer sheets for the tests to grade
+'''
+
+import io
+
+
+def sheet(num_questions:int, num_choices:int, answers:dict=None, random_filled:bool=False):
+    '''
+    a rendered answer sheet, Pictron after generate()
+    '''
+    from answer_sheets import Pictron
+
+    pictron = Pictron(**Pictron.find_best_config(num_questions, num_choices))
+    pictron.generate(
+        random_filled=random_filled,
+        answers={int(q): a for q, a in answers.items()} if answers else None,
+    )
+    return pictron
+
+
+def png_bytes(image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def photo(num_questions:int, num_choices:int, answers:dict, seed:int=0, severity:float=0.5, **augment):
+    '''
+    a PhotoAugmenter photo of a filled in sheet, (jpeg bytes, truth)
+    '''
+    from answer_sheets.augment import PhotoAugmenter
+
+    augmenter = PhotoAugmenter(seed=seed, severity=severity, **augment)
+    return augmenter.augment(sheet(num_questions, num_choices, answers).image)
+
+
+def corner_error(grader, truth) -> float:
+    '''
+    worst distance, in photo pixels, between the page corners the grader found and
+    where the augmenter put them. The grader may have decoded the photo smaller
+    '''
+    import numpy as np
+
+    scale = np.array(truth["photo_size"]) / np.array(grader.source_size)
+    return float(np.linalg.norm(grader.corners * scale - np.array(truth["corners"]), axis=1).max())
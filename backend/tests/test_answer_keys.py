@@ -0,0 +1,132 @@
+import sqlite3
+
+import cv2
+import numpy as np
+import pytest
+from alembic import command
+
+from answer_sheets import Pictron, OMRGrader
+from helpers import sheet
+
+LETTERS = "ABCDEFG"
+
+
+@pytest.mark.parametrize("num_questions, num_choices", [(20, 4), (75, 5), (200, 7)])
+def test_filling_a_blank_page_draws_the_key(num_questions, num_choices):
+    answers = {q: LETTERS[(q * 3) % num_choices] for q in range(1, num_questions + 1)}
+    config = Pictron.find_best_config(num_questions, num_choices)
+
+    blank = Pictron(**config)
+    blank.generate(course_name="PLC", test_name="Exam")
+    blank_pixels = np.asarray(blank.image).copy()
+    blank.fillAnswers(answers=answers)
+
+    key = Pictron(**config)
+    key.generate(answers=answers, course_name="PLC", test_name="Exam")
+
+    assert np.array_equal(np.asarray(blank.image), np.asarray(key.image))
+    assert not np.array_equal(blank_pixels, np.asarray(blank.image))
+
+
+def test_fill_answers_only_touches_the_answer_bubbles():
+    answers = {1: "C", 10: "A"}
+    pictron = sheet(10, 4)
+    before = np.asarray(pictron.image).copy()
+
+    pictron.fillAnswers(answers=answers)
+
+    changed = np.argwhere((np.asarray(pictron.image) != before).any(axis=2))
+    boxes = pictron.layout()["questions"]
+    for y, x in changed:
+        assert any(x1 <= x <= x2 and y1 <= y <= y2
+                   for q, letter in answers.items()
+                   for x1, y1, x2, y2 in [boxes[q][LETTERS.index(letter)]])
+
+
+def test_the_stored_key_grades_as_its_answers(client, make_test):
+    test, key = make_test(20, 4)
+
+    response = client.get(f"/test/image/key/{test['id']}/")
+
+    assert response.status_code == 200
+    grader = OMRGrader(4, 20, mechanical=True, render=False, layout=Pictron.template_layout(20, 4))
+    grade, _, choices = grader.run(bytes_obj=response.content, key=key)
+    assert grade == 100.0
+    assert {str(q): letter for q, (_, _, letter) in choices.items()} == key
+
+
+def test_the_stored_blank_has_no_answers(client, make_test):
+    test, key = make_test(20, 4)
+
+    response = client.get(f"/test/image/blank/{test['id']}/")
+
+    assert response.status_code == 200
+    page = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_GRAYSCALE)
+    boxes = Pictron.template_layout(20, 4)["questions"]
+    for q, letter in key.items():
+        x1, y1, x2, y2 = boxes[int(q)][LETTERS.index(letter)]
+        # the outline and a faint label, not a filled bubble
+        assert page[y1:y2 + 1, x1:x2 + 1].mean() > 150
+
+
+def test_status_goes_from_pending_to_ready(client, make_test):
+    test, _ = make_test(10, 4)
+
+    # the images are drawn after the response was sent
+    assert test["answer_key_status"] == "pending"
+    assert client.get(f"/test/{test['id']}/").json()["answer_key_status"] == "ready"
+
+
+def test_images_requested_first_are_drawn_by_the_request(client, make_test, monkeypatch):
+    import routers.test
+
+    monkeypatch.setattr(routers.test, "generate_answer_keys", lambda test_id: None)
+    test, _ = make_test(10, 4)
+    assert client.get(f"/test/{test['id']}/").json()["answer_key_status"] == "pending"
+
+    assert client.get(f"/test/image/blank/{test['id']}/").status_code == 200
+    assert client.get(f"/test/{test['id']}/").json()["answer_key_status"] == "ready"
+
+
+def test_a_failed_draw_is_retried_by_the_next_request(client, make_test, monkeypatch):
+    import routers.test
+
+    def fail(test, db):
+        raise RuntimeError("out of ink")
+
+    draw = routers.test.render_answer_keys
+    monkeypatch.setattr(routers.test, "render_answer_keys", fail)
+    test, _ = make_test(10, 4)
+    assert client.get(f"/test/{test['id']}/").json()["answer_key_status"] == "failed"
+    assert client.get(f"/test/image/key/{test['id']}/").status_code == 500
+
+    monkeypatch.setattr(routers.test, "render_answer_keys", draw)
+    assert client.get(f"/test/image/key/{test['id']}/").status_code == 200
+    assert client.get(f"/test/{test['id']}/").json()["answer_key_status"] == "ready"
+
+
+def test_answers_outside_the_choices_are_rejected(client, course):
+    response = client.post("/test/", json={
+        "name": "Out of range", "start_t": "2024-01-01T00:00:00", "end_t": "2024-01-02T00:00:00",
+        "num_questions": 2, "num_choices": 4, "course_id": course["id"], "answers": {"1": "A", "2": "E"},
+    })
+
+    assert response.status_code == 422
+    assert client.get(f"/test/course/{course['id']}/").json()[-1]["name"] != "Out of range"
+
+
+def test_downgrade_waits_for_every_answer_key(client, make_test, migrations, monkeypatch):
+    import routers.test
+
+    monkeypatch.setattr(routers.test, "generate_answer_keys", lambda test_id: None)
+    test, _ = make_test(10, 4)
+
+    with pytest.raises(RuntimeError, match="no answer key images yet"):
+        command.downgrade(migrations(), "c5e2a8d4f716")
+
+    client.get(f"/test/image/key/{test['id']}/")
+    migrations = migrations()
+    command.downgrade(migrations, "c5e2a8d4f716")
+    with sqlite3.connect(migrations.attributes["path"]) as db:
+        columns = [row[1] for row in db.execute("PRAGMA table_info(tests)")]
+    assert "answer_key_status" not in columns and "answer_key_blank_hash" in columns
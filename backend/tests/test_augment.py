@@ -0,0 +1,69 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from answer_sheets.augment import PhotoAugmenter, generate_corpus
+from helpers import sheet
+
+ANSWERS = {str(q): "ABCD"[q % 4] for q in range(1, 21)}
+
+
+@pytest.fixture(scope="module")
+def answer_sheet():
+    return sheet(20, 4, ANSWERS).image
+
+
+def test_the_same_seed_gives_the_same_photo(answer_sheet):
+    first = PhotoAugmenter(seed=5, photo_size=(900, 1200)).augment(answer_sheet)
+    again = PhotoAugmenter(seed=5, photo_size=(900, 1200)).augment(answer_sheet)
+    other = PhotoAugmenter(seed=6, photo_size=(900, 1200)).augment(answer_sheet)
+
+    assert first == again
+    assert other[1]["corners"] != first[1]["corners"]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_truth_corners_are_where_the_page_is(answer_sheet, seed):
+    image, truth = PhotoAugmenter(seed=seed, severity=0.5, photo_size=(1200, 1600)).augment(answer_sheet)
+    photo = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE)
+    page = cv2.cvtColor(np.asarray(answer_sheet.convert("RGB")), cv2.COLOR_RGB2GRAY)
+    h, w = page.shape
+
+    # warping the photo back with the truth corners gives the sheet again
+    M = cv2.getPerspectiveTransform(np.float32(truth["corners"]),
+                                    np.float32([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]]))
+    size = (w // 4, h // 4)
+    back = cv2.resize(cv2.warpPerspective(photo, M, (w, h)), size, interpolation=cv2.INTER_AREA)
+    page = cv2.resize(page, size, interpolation=cv2.INTER_AREA)
+
+    assert truth["photo_size"] == [1200, 1600] and photo.shape == (1600, 1200)
+    assert np.corrcoef(back.ravel(), page.ravel())[0, 1] > 0.8
+
+
+def test_severity_zero_places_the_sheet_cleanly(answer_sheet):
+    _, truth = PhotoAugmenter(seed=1, severity=0, photo_size=(900, 1200)).augment(answer_sheet)
+    corners = np.array(truth["corners"])
+
+    assert truth["quarter_turns"] == 0 and truth["tilt_deg"] == 0 and not truth["shadow"]
+    # a rectangle with the sheet's proportions
+    width, height = corners[1] - corners[0], corners[3] - corners[0]
+    assert abs(width[1]) < 1 and abs(height[0]) < 1
+    assert width[0] / height[1] == pytest.approx(truth["sheet_size"][0] / truth["sheet_size"][1], rel=0.01)
+
+
+def test_a_sheet_that_cannot_fit_is_refused(answer_sheet):
+    with pytest.raises(ValueError):
+        PhotoAugmenter(seed=0, fill=(1.5, 1.6)).augment(answer_sheet)
+
+
+def test_generate_corpus_writes_photos_and_truth(tmp_path):
+    paths = generate_corpus(str(tmp_path), 2, seed=3, choices=(4,), questions=(10, 20),
+                            photo_size=(900, 1200))
+
+    assert [p.rsplit("/", 1)[1] for p in paths] == ["photo-0000.jpg", "photo-0001.jpg"]
+    for path, num_questions in zip(paths, (10, 20)):
+        truth = json.loads(open(path.replace(".jpg", ".json")).read())
+        assert truth["num_questions"] == num_questions and len(truth["key"]) == num_questions
+        assert cv2.imread(path).shape == (1200, 900, 3)
@@ -0,0 +1,60 @@
+from PIL import Image
+
+from answer_sheets import Pictron
+from answer_sheets.main import LayerCache, layerBytes
+
+PAGE = 100 * 100 * 3 # bytes of a 100x100 RGB layer
+
+
+def layer(color):
+    return Image.new("RGB", (100, 100), color)
+
+
+def test_layers_are_kept_within_the_budget():
+    cache = LayerCache(2 * PAGE)
+    draws = []
+    def draw(name):
+        return lambda: draws.append(name) or layer(name)
+
+    for name in ("red", "blue", "red", "green", "blue"):
+        cache.get_or_draw(name, draw(name))
+
+    # red was used more recently than blue when green pushed one out
+    assert draws == ["red", "blue", "green", "blue"]
+    assert list(cache.layers) == ["green", "blue"] and cache.size == 2 * PAGE
+
+
+def test_resize_evicts_and_zero_keeps_nothing():
+    cache = LayerCache(3 * PAGE)
+    for name in ("red", "blue", "green"):
+        cache.get_or_draw(name, lambda name=name: layer(name))
+
+    cache.resize(PAGE)
+    assert list(cache.layers) == ["green"]
+
+    cache.resize(0)
+    assert cache.get_or_draw("red", lambda: layer("red")).getpixel((0, 0)) == (255, 0, 0)
+    assert not cache.layers and cache.size == 0
+
+
+def test_generate_draws_the_base_layer_once_per_template(monkeypatch):
+    monkeypatch.setattr(Pictron, "base_layers", LayerCache(64 * 1024 * 1024))
+    config = Pictron.find_best_config(20, 4)
+
+    first = Pictron(**config)
+    first.generate(course_name="PLC", test_name="Exam 1")
+    second = Pictron(**config)
+    second.generate(course_name="PLC", test_name="Exam 2")
+
+    assert len(Pictron.base_layers.layers) == 1
+    assert Pictron.base_layers.size == layerBytes(first.image)
+    # sheets are drawn on copies, the cached page stays blank
+    base = Pictron.base_layer(first.config_key)
+    assert base is not first.image and base is not second.image
+    assert base.tobytes() != first.image.tobytes()
+
+
+def test_the_api_sizes_the_cache_from_base_layer_cache_mb(client):
+    from env import base_layer_cache_mb
+
+    assert Pictron.base_layers.max_bytes == base_layer_cache_mb * 1024 * 1024
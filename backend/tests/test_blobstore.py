@@ -0,0 +1,148 @@
+import os
+import sqlite3
+
+import pytest
+from alembic import command
+
+from blobstore import BlobStore, LocalBlobStore, blob_hash, blob_response, etag_matches, make_blob_store
+
+
+def test_local_store_round_trip(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+
+    digest, size = store.put(b"answer sheet")
+
+    assert (digest, size) == (blob_hash(b"answer sheet"), 12)
+    assert store.get(digest) == b"answer sheet" and store.exists(digest)
+    # sharded by the hash' first two byte pairs
+    assert store.path(digest) == os.path.join(str(tmp_path), digest[:2], digest[2:4], digest)
+
+
+def test_local_store_keeps_one_copy(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+
+    assert store.put(b"same") == store.put(b"same")
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == [blob_hash(b"same")]
+
+
+def test_local_store_delete(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    digest, _ = store.put(b"gone soon")
+
+    store.delete(digest)
+    store.delete(digest) # missing blobs are ignored
+
+    assert not store.exists(digest)
+    with pytest.raises(FileNotFoundError):
+        store.get(digest)
+
+
+def test_local_store_rejects_what_is_not_a_hash(tmp_path):
+    with pytest.raises(ValueError):
+        LocalBlobStore(str(tmp_path)).get("../../etc/passwd")
+
+
+def test_stores_implement_the_whole_interface():
+    class PutOnly(BlobStore):
+        def put(self, data):
+            return blob_hash(data), len(data)
+
+    with pytest.raises(TypeError):
+        PutOnly()
+    with pytest.raises(TypeError):
+        BlobStore()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="BLOB_STORE_BACKEND"):
+        make_blob_store("s3")
+
+
+def image_hashes(migrations) -> list:
+    with sqlite3.connect(migrations.attributes["path"]) as db:
+        return db.execute("SELECT id, submission_image_hash FROM submission ORDER BY id").fetchall()
+
+
+def test_images_migration_moves_them_back_and_forth(make_test, submit, migrations):
+    test, key = make_test(10, 4)
+    assert submit(test["id"], key, 10, 4).status_code == 200
+    migrations = migrations()
+    before = image_hashes(migrations)
+
+    command.downgrade(migrations, "5c1e9a7f3b20")
+    with sqlite3.connect(migrations.attributes["path"]) as db:
+        in_rows = db.execute("SELECT count(*) FROM submission WHERE length(submission_image) > 0").fetchone()[0]
+    assert in_rows == len(before)
+
+    command.upgrade(migrations, "head")
+    assert image_hashes(migrations) == before
+    assert hash_indexes(migrations.attributes["path"]) == HASH_INDEXES
+
+
+HASH_INDEXES = {
+    "ix_submission_submission_image_hash", "ix_submission_graded_image_hash",
+    "ix_submission_graded_preview_hash", "ix_submission_graded_thumbnail_hash",
+    "ix_tests_answer_key_blank_hash", "ix_tests_answer_key_filled_hash",
+}
+
+
+def hash_indexes(path:str) -> set:
+    with sqlite3.connect(path) as db:
+        return {name for name, in db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%_hash'")}
+
+
+def test_released_blobs_are_looked_up_by_index(client):
+    from sqlalchemy import select
+    from db import BLOB_COLUMNS, engine
+
+    assert hash_indexes(os.environ["DATABASE_URL"].removeprefix("sqlite:///")) == HASH_INDEXES
+    with engine.connect() as db:
+        for column in BLOB_COLUMNS:
+            query = select(column).where(column == "0" * 64).compile(engine)
+            plan = " ".join(row[-1] for row in db.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {query}", tuple(query.params.values())))
+            assert "USING COVERING INDEX" in plan, plan
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ("", False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ('"xyz"', False),
+    ("*", True),
+    ("abc", False), # unquoted is a different tag
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+def test_blob_response_revalidates_with_the_hash(client, make_test, submit):
+    from env import image_cache_max_age
+
+    test, key = make_test(10, 4)
+    submission_id = submit(test["id"], key, 10, 4).json()["submission_id"]
+    url = f"/submission/image/original/{submission_id}"
+
+    first = client.get(url)
+    etag = first.headers["etag"]
+    assert etag == f'"{blob_hash(first.content)}"'
+    assert first.headers["cache-control"] == f"private, max-age={image_cache_max_age}"
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+
+    stale = client.get(url, headers={"If-None-Match": '"0000"'})
+    assert stale.status_code == 200 and stale.content == first.content
+
+
+def test_blob_response_of_a_missing_blob():
+    from fastapi import HTTPException
+
+    for digest in (None, blob_hash(b"never stored")):
+        with pytest.raises(HTTPException) as error:
+            blob_response(digest, "image/png")
+        assert error.value.status_code == 404
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+import pytest
+
+from answer_sheets import Pictron, OMRGrader
+from answer_sheets.grader import shrink_quad, refine_corners, order_points
+from helpers import photo, corner_error
+
+ANSWERS = {str(q): "ABCD"[q % 4] for q in range(1, 41)}
+
+
+def test_shrink_quad_moves_every_side_inward():
+    square = np.array([[10, 10], [110, 10], [110, 110], [10, 110]], np.float32)
+
+    assert np.allclose(shrink_quad(square, 5), [[15, 15], [105, 15], [105, 105], [15, 105]], atol=0.01)
+
+
+def test_refine_corners_snaps_to_the_paper_edge():
+    image = np.full((400, 300), 40, np.uint8)
+    truth = np.array([[50.5, 60.5], [250.5, 60.5], [250.5, 340.5], [50.5, 340.5]], np.float32)
+    cv2.fillConvexPoly(image, truth.astype(np.int32), 230)
+    rough = truth + np.array([[3, -2], [-3, 2], [2, 3], [-2, -3]], np.float32)
+
+    refined = refine_corners(image, rough, search_radius=8)
+
+    # within the pixel the fill rounded the corner to, closer than the rough estimate
+    assert np.abs(refined - truth).max() < 1.5
+    assert np.abs(refined - truth).sum() < np.abs(rough - truth).sum()
+
+
+def test_order_points():
+    shuffled = np.array([[100, 100], [0, 0], [0, 100], [100, 0]], np.float32)
+
+    assert order_points(shuffled).tolist() == [[0, 0], [100, 0], [100, 100], [0, 100]]
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_document_found_on_the_downscaled_photo(seed):
+    image, truth = photo(40, 4, ANSWERS, seed=seed, severity=0.3)
+    grader = OMRGrader(4, 40, mechanical=False, render=False,
+                       layout=Pictron.template_layout(40, 4), registration="contour")
+
+    grade, _, _ = grader.run(bytes_obj=image, key=ANSWERS)
+
+    assert grade == 100.0
+    assert "downscale" in grader.timings and "refine_corners" in grader.timings
+    assert corner_error(grader, truth) < 12
+
+
+def test_full_resolution_search_finds_the_same_corners():
+    image, truth = photo(40, 4, ANSWERS, seed=2, severity=0.3)
+    layout = Pictron.template_layout(40, 4)
+    corners = []
+    for max_dim in (1024, None):
+        grader = OMRGrader(4, 40, mechanical=False, render=False, layout=layout,
+                           registration="contour", isolate_max_dim=max_dim)
+        grader.run(bytes_obj=image, key=ANSWERS)
+        corners.append(grader.corners)
+
+    assert np.abs(corners[0] - corners[1]).max() < 6
@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+import pytest
+
+from answer_sheets import Pictron, OMRGrader
+from answer_sheets.grader import fiducial_candidates, rematch_fiducial
+from answer_sheets.templates import registry
+from helpers import photo, corner_error
+
+ANSWERS = {str(q): "ABCD"[(q * 5) % 4] for q in range(1, 41)}
+LAYOUT = Pictron.template_layout(40, 4)
+
+
+def turn(image:bytes, truth:dict, quarter_turns:int):
+    '''
+    the photo turned counter clockwise by quarter_turns, and where the page's corners end up
+    '''
+    photo = np.rot90(cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR), quarter_turns)
+    corners = np.array(truth["corners"], np.float64)
+    width, height = truth["photo_size"]
+    for _ in range(quarter_turns):
+        corners = np.stack([corners[:, 1], width - 1 - corners[:, 0]], axis=1)
+        width, height = height, width
+    ok, encoded = cv2.imencode(".jpg", np.ascontiguousarray(photo), [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return encoded.tobytes(), {"corners": corners, "photo_size": [width, height]}
+
+
+def fiducial_grader():
+    return OMRGrader(4, 40, mechanical=False, render=False, layout=LAYOUT, registration="fiducial")
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_fiducials_register_the_page(seed):
+    image, truth = photo(40, 4, ANSWERS, seed=seed, severity=0.5)
+    grader = fiducial_grader()
+
+    grade, _, _ = grader.run(bytes_obj=image, key=ANSWERS)
+
+    assert grade == 100.0
+    assert "fiducials" in grader.timings and "refine_fiducials" in grader.timings
+    assert corner_error(grader, truth) < 6
+
+
+@pytest.mark.parametrize("quarter_turns", [1, 2])
+def test_fiducials_register_a_turned_photo(quarter_turns):
+    image, truth = turn(*photo(40, 4, ANSWERS, seed=4, severity=0.3), quarter_turns)
+    grader = fiducial_grader()
+
+    grade, _, _ = grader.run(bytes_obj=image, key=ANSWERS)
+
+    assert grade == 100.0
+    assert corner_error(grader, truth) < 6
+
+
+def test_coarse_candidates_are_found_at_full_resolution():
+    template = registry.gray(LAYOUT["fiducial_image"])
+    gray = np.full((600, 800), 128, np.uint8)
+    placed = {(100, 120): 24, (500, 150): 40, (320, 420): 56}
+    for (x, y), size in placed.items():
+        gray[y:y + size, x:x + size] = cv2.resize(template, (size, size), interpolation=cv2.INTER_AREA)
+
+    # 24 px is matched on gray itself, 40 and 56 px on halved levels
+    candidates = fiducial_candidates(gray, template, [24, 40, 56], limit=3)
+
+    assert len(candidates) == 3
+    for score, (cx, cy), size in candidates:
+        x, y = int(cx - size / 2), int(cy - size / 2)
+        assert placed.get((x, y)) == size, (x, y, size)
+        assert score > 0.95
+
+
+def test_rematch_fiducial_moves_onto_the_match():
+    template = registry.gray(LAYOUT["fiducial_image"])
+    gray = np.full((200, 200), 128, np.uint8)
+    gray[70:110, 50:90] = cv2.resize(template, (40, 40), interpolation=cv2.INTER_AREA)
+
+    score, center = rematch_fiducial(gray, template, (73, 86), 40, radius=4)
+
+    assert center == (70.0, 90.0) and score > 0.95
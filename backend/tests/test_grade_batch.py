@@ -0,0 +1,80 @@
+import pytest
+
+from answer_sheets import Pictron, OMRGrader
+from answer_sheets import grader as grader_module
+from answer_sheets.augment import PhotoAugmenter
+from helpers import sheet, png_bytes
+
+ANSWERS = {str(q): "ABCD"[(q * 3) % 4] for q in range(1, 21)}
+
+
+@pytest.fixture(scope="module")
+def sheet_png():
+    return png_bytes(sheet(20, 4, ANSWERS).image)
+
+
+def test_grade_batch_grades_paths_and_bytes(sheet_png, tmp_path):
+    path = tmp_path / "sheet.png"
+    path.write_bytes(sheet_png)
+    images = [sheet_png, str(path), b"not an image", bytearray(sheet_png)]
+
+    results = dict(OMRGrader.grade_batch(
+        images, ANSWERS, num_choices=4, num_questions=20,
+        layout=Pictron.template_layout(20, 4), max_workers=1))
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert [results[i][0] for i in (0, 1, 3)] == [100.0] * 3
+    # a sheet that cannot be graded doesn't stop the batch
+    assert results[2][:2] == (False, False)
+
+
+def test_batch_workers_grade_like_the_api():
+    config = {"num_choices": 4, "num_questions": 20, "mechanical": False,
+              "layout": Pictron.template_layout(20, 4), "registration": "fiducial", "render": False}
+
+    grader_module._init_batch_worker(1, config, ANSWERS)
+    first = grader_module._batch_grader
+
+    assert first.render is False and first.registration == "fiducial"
+    # the same grader is used for every image of the worker
+    grader_module._grade_batch_image(b"not an image")
+    assert grader_module._batch_grader is first
+
+
+def test_run_forgets_the_previous_image(sheet_png):
+    augmenter = PhotoAugmenter(seed=3, severity=0)
+    photo, truth = augmenter.augment(sheet(20, 4, ANSWERS).image)
+    grader = OMRGrader(4, 20, mechanical=False, render=False,
+                       layout=Pictron.template_layout(20, 4), registration="fiducial")
+
+    assert grader.run(bytes_obj=photo, key=ANSWERS)[0] == 100.0
+    assert grader.corners is not None
+
+    # the same grader, now on a scan that needs no registration
+    grader.mechanical = True
+    assert grader.run(bytes_obj=sheet_png, key=ANSWERS)[0] == 100.0
+    assert grader.corners is None
+    assert grader.result["corners"] is None
+    assert list(grader.source_size) == list(Pictron.template_layout(20, 4)["page_size"])
+    assert grader.source_image.shape[:2] == grader.gray.shape
+
+
+def test_run_without_an_image_fails():
+    grader = OMRGrader(4, 20)
+
+    with pytest.raises(ValueError):
+        grader.run(key=ANSWERS)
+
+
+def test_any_failure_only_fails_its_image(sheet_png):
+    grader_module._init_batch_worker(1, {"num_choices": 4, "num_questions": 20, "render": False}, ANSWERS)
+
+    # cv2.imdecode asserts on an empty buffer
+    grade, graded, err = grader_module._grade_batch_image(b"")
+    assert (grade, graded) == (False, False) and isinstance(err, Exception)
+
+    results = dict(OMRGrader.grade_batch(
+        [b"", sheet_png], ANSWERS, num_choices=4, num_questions=20,
+        layout=Pictron.template_layout(20, 4), max_workers=1))
+    assert results[0][:2] == (False, False)
+    assert results[1][0] == 100.0
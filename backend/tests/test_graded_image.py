@@ -0,0 +1,185 @@
+import sqlite3
+
+import pytest
+from alembic import command
+
+
+def stored(submission_id:int, column:str):
+    import tables
+    from db import SessionLocal
+
+    with SessionLocal() as db:
+        return getattr(db.get(tables.Submission, submission_id), column)
+
+
+def submission_without_image(make_test, submit) -> int:
+    test, key = make_test(10, 4)
+    response = submit(test["id"], key, 10, 4)
+    assert response.status_code == 200, response.text
+    return response.json()["submission_id"]
+
+
+def test_graded_image_is_rendered_on_first_view(client, make_test, submit):
+    submission_id = submission_without_image(make_test, submit)
+    # grading only keeps the result to draw it from
+    assert stored(submission_id, "graded_image_hash") is None
+    assert stored(submission_id, "result") is not None
+
+    first = client.get(f"/submission/image/graded/{submission_id}")
+    assert first.status_code == 200 and first.headers["content-type"].startswith("image/")
+    digest = stored(submission_id, "graded_image_hash")
+    assert digest is not None
+
+    # later views are served what was stored
+    second = client.get(f"/submission/image/graded/{submission_id}")
+    assert second.content == first.content
+    assert stored(submission_id, "graded_image_hash") == digest
+
+
+def test_graded_image_of_a_missing_submission(client):
+    assert client.get("/submission/image/graded/999999").status_code == 404
+
+
+def submission_count(migrations) -> int:
+    with sqlite3.connect(migrations.attributes["path"]) as db:
+        return db.execute("SELECT count(*) FROM submission").fetchone()[0]
+
+
+def test_downgrade_refuses_to_drop_unrendered_submissions(make_test, submit, migrations):
+    submission_without_image(make_test, submit)
+    migrations = migrations()
+    command.downgrade(migrations, "5c1e9a7f3b20")
+    count = submission_count(migrations)
+
+    with pytest.raises(RuntimeError, match="no graded image yet"):
+        command.downgrade(migrations, "d236ca4eb141")
+    # nothing was deleted
+    assert submission_count(migrations) == count
+
+
+def test_downgrade_once_every_graded_image_is_rendered(client, migrations):
+    import tables
+    from db import SessionLocal
+
+    with SessionLocal() as db:
+        ids = [submission_id for submission_id, in db.query(tables.Submission.id)]
+    for submission_id in ids:
+        client.get(f"/submission/image/graded/{submission_id}")
+    migrations = migrations()
+    count = submission_count(migrations)
+
+    command.downgrade(migrations, "d236ca4eb141")
+
+    assert submission_count(migrations) == count
+
+
+def test_every_size_is_rendered_once(client, make_test, submit, monkeypatch):
+    import io
+    from PIL import Image
+    import grading
+
+    renders = []
+    render = grading.render_graded_image
+    monkeypatch.setattr(grading, "render_graded_image", lambda *args, **kwargs: renders.append(1) or render(*args, **kwargs))
+    submission_id = submission_without_image(make_test, submit)
+
+    widths = {}
+    for size in ("thumbnail", "preview", "full", "thumbnail"):
+        response = client.get(f"/submission/image/graded/{submission_id}?size={size}")
+        assert response.status_code == 200
+        widths[size] = Image.open(io.BytesIO(response.content)).size[0]
+
+    # the first view stored all three sizes, the others were served from the store
+    assert len(renders) == 1
+    assert widths["thumbnail"] == grading.GRADED_SIZES["thumbnail"]
+    assert widths["preview"] == grading.GRADED_SIZES["preview"]
+    assert widths["full"] > widths["preview"]
+    assert client.get(f"/submission/image/graded/{submission_id}?size=poster").status_code == 422
+
+
+def legacy_submission(client, make_test, submit) -> int:
+    '''
+    a submission as 5c1e9a7f3b20 left those graded before it: a full graded image,
+    no grading result and no smaller sizes
+    '''
+    import tables
+    from db import SessionLocal
+
+    submission_id = submission_without_image(make_test, submit)
+    assert client.get(f"/submission/image/graded/{submission_id}").status_code == 200
+    with SessionLocal() as db:
+        db.query(tables.Submission).filter_by(id=submission_id).update({
+            "result": None, "graded_preview_hash": None, "graded_thumbnail_hash": None})
+        db.commit()
+    return submission_id
+
+
+def test_legacy_submissions_keep_their_full_graded_image(client, make_test, submit):
+    submission_id = legacy_submission(client, make_test, submit)
+
+    full = client.get(f"/submission/image/graded/{submission_id}?size=full")
+
+    assert full.status_code == 200
+    assert full.headers["etag"] == f'"{stored(submission_id, "graded_image_hash")}"'
+    # nothing to draw the smaller sizes from
+    for size in ("preview", "thumbnail"):
+        assert client.get(f"/submission/image/graded/{submission_id}?size={size}").status_code == 404
+
+
+def test_no_result_and_no_graded_image_is_not_found(client, make_test, submit):
+    import tables
+    from db import SessionLocal
+
+    submission_id = submission_without_image(make_test, submit)
+    with SessionLocal() as db:
+        db.query(tables.Submission).filter_by(id=submission_id).update({"result": None})
+        db.commit()
+
+    assert client.get(f"/submission/image/graded/{submission_id}").status_code == 404
+    # it would hold up the downgrade tests
+    assert client.delete(f"/submission/{submission_id}").status_code == 200
+
+
+def test_gallery_pages_the_stored_thumbnails(client, make_test, monkeypatch):
+    import base64
+    import grading
+    from helpers import sheet, png_bytes
+
+    test, key = make_test(10, 4)
+    image = png_bytes(sheet(10, 4, key).image)
+    submission_ids = []
+    for _ in range(3):
+        # anonymous, a student submits once per test
+        response = client.post("/submission/?mechanical=true", data={"test_id": test["id"]},
+                               files={"submission_image": ("sheet.png", image, "image/png")})
+        assert response.status_code == 200, response.text
+        submission_ids.append(response.json()["submission_id"])
+    # only the first two were viewed
+    for submission_id in submission_ids[:2]:
+        client.get(f"/submission/image/graded/{submission_id}?size=thumbnail")
+
+    renders = []
+    monkeypatch.setattr(grading, "render_graded_image", lambda *args, **kwargs: renders.append(1))
+    first = client.get(f"/submission/test/{test['id']}/gallery?page=1&per_page=2").json()
+    second = client.get(f"/submission/test/{test['id']}/gallery?page=2&per_page=2").json()
+
+    assert first["total"] == second["total"] == 3
+    assert [s["id"] for s in first["submissions"] + second["submissions"]] == submission_ids
+    thumbnail = first["submissions"][0]["thumbnail"]
+    media_type, encoded = thumbnail.removeprefix("data:").split(";base64,")
+    assert media_type == stored(submission_ids[0], "graded_thumbnail_type")
+    assert len(base64.b64decode(encoded)) == stored(submission_ids[0], "graded_thumbnail_size")
+    # the one never viewed isn't rendered by the gallery
+    assert second["submissions"][0]["thumbnail"] is None
+    assert renders == []
+
+
+@pytest.mark.parametrize("query", ["page=0", "per_page=0", "per_page=101"])
+def test_gallery_rejects_bad_pages(client, make_test, query):
+    test, _ = make_test(10, 4)
+
+    assert client.get(f"/submission/test/{test['id']}/gallery?{query}").status_code == 422
+
+
+def test_gallery_of_an_unknown_test(client):
+    assert client.get("/submission/test/no-such-test/gallery").status_code == 404
@@ -0,0 +1,38 @@
+import json
+import sys
+
+from testing import grader_benchmark
+
+
+def test_corpus_is_seeded_per_template():
+    first = grader_benchmark.build_corpus(10, 4, sheets=2, seed=3)
+    again = grader_benchmark.build_corpus(10, 4, sheets=2, seed=3)
+
+    assert [key for _, key, _ in first] == [key for _, key, _ in again]
+    assert all(corners is None for _, _, corners in first)
+
+
+def test_benchmark_template_reads_every_sheet():
+    corpus = grader_benchmark.build_corpus(20, 4, sheets=2, seed=0)
+
+    result = grader_benchmark.benchmark_template(20, 4, corpus, "template")
+
+    assert result["accuracy"] == 1.0 and result["perfect_sheets"] == 2 and result["failures"] == 0
+    assert result["latency_ms"]["p50"] > 0 and "total" in result["stages_ms"]
+
+
+def test_report_has_every_templates_peak_rss(tmp_path, monkeypatch):
+    output = tmp_path / "report.json"
+    monkeypatch.setattr(sys, "argv", [
+        "grader_benchmark.py", "--choices", "4", "--questions", "10", "20",
+        "--sheets", "1", "--output", str(output),
+    ])
+
+    grader_benchmark.main()
+
+    report = json.loads(output.read_text())
+    assert report["overall"]["sheets"] == 2 and report["overall"]["accuracy"] == 1.0
+    peaks = [template["peak_rss_kb"] for template in report["templates"]]
+    # read in each template's own process
+    assert all(peak > 0 for peak in peaks)
+    assert report["overall"]["peak_rss_kb"] == max(peaks)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import grading
+from helpers import sheet, png_bytes
+
+ANSWERS = {str(q): "ABCD"[q % 4] for q in range(1, 21)}
+
+
+@pytest.fixture(scope="module")
+def sheet_png():
+    return png_bytes(sheet(20, 4, ANSWERS).image)
+
+
+def test_grade_submission(sheet_png):
+    result = grading.grade_submission(sheet_png, 4, 20, ANSWERS, mechanical=True)
+
+    assert result["grade"] == 100.0
+    assert json.loads(result["answers"]) == {q: [a, True] for q, a in ANSWERS.items()}
+    assert result["submission_image"] and result["submission_image_type"].startswith("image/")
+    assert json.loads(result["result"])["grade"] == 100.0
+    assert result["metrics"]["timings"]["total"] > 0
+
+
+def test_grade_submission_rejects_what_it_cannot_grade():
+    with pytest.raises(ValueError):
+        grading.grade_submission(b"not an image", 4, 20, ANSWERS)
+
+
+def test_grade_on_a_thread(sheet_png, monkeypatch):
+    monkeypatch.setattr(grading, "executor", None)
+
+    result = asyncio.run(grading.grade(sheet_png, 4, 20, ANSWERS, mechanical=True))
+
+    assert result["grade"] == 100.0
+    assert "metrics" not in result # folded into grading_metrics
+
+
+def test_grade_on_the_process_pool(sheet_png, monkeypatch):
+    pool = ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=grading.init_worker,
+        initargs=(1,),
+    )
+    monkeypatch.setattr(grading, "executor", pool)
+    try:
+        result = asyncio.run(grading.grade(sheet_png, 4, 20, ANSWERS, mechanical=True))
+    finally:
+        pool.shutdown()
+
+    assert result["grade"] == 100.0
+
+
+class BrokenExecutor:
+    '''
+    an executor whose worker died
+    '''
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+    def shutdown(self, wait=True, **kwargs):
+        self.shut_down = True
+
+
+def test_a_crashed_worker_replaces_the_pool(sheet_png, monkeypatch):
+    broken = BrokenExecutor()
+    monkeypatch.setattr(grading, "executor", broken)
+    crashed = grading.grading_metrics.snapshot()["outcomes"].get("crashed", 0)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(grading.grade(sheet_png, 4, 20, ANSWERS, mechanical=True))
+
+    assert broken.shut_down
+    assert grading.executor is not broken
+    assert grading.grading_metrics.snapshot()["outcomes"]["crashed"] == crashed + 1
+
+
+def test_submission_endpoint_grades_the_upload(client, make_test, submit):
+    test, key = make_test(20, 4)
+
+    response = submit(test["id"], key, 20, 4)
+
+    assert response.status_code == 200, response.text
+    submission = client.get(f"/submission/{response.json()['submission_id']}").json()
+    assert submission["grade"] == 100.0
+
+
+def test_one_broken_pool_is_replaced_once(sheet_png, monkeypatch):
+    broken, replacements = BrokenExecutor(), []
+
+    def start_executor():
+        replacements.append(BrokenExecutor())
+        grading.executor = replacements[-1]
+
+    monkeypatch.setattr(grading, "executor", broken)
+    monkeypatch.setattr(grading, "start_executor", start_executor)
+
+    async def grade_together():
+        return await asyncio.gather(
+            *[grading.grade(sheet_png, 4, 20, ANSWERS, mechanical=True) for _ in range(3)],
+            return_exceptions=True)
+
+    results = asyncio.run(grade_together())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # the later failures left the pool the first one started alone
+    assert len(replacements) == 1 and grading.executor is replacements[0]
+    assert broken.shut_down and not replacements[0].shut_down
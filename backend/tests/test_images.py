@@ -0,0 +1,95 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from db import IMAGE_FORMATS, array_to_pil, decode_image, encode_image
+from helpers import sheet, png_bytes
+
+ANSWERS = {str(q): "ABCD"[q % 4] for q in range(1, 11)}
+
+
+@pytest.fixture(scope="module")
+def page():
+    return sheet(10, 4, ANSWERS).image
+
+
+@pytest.mark.parametrize("image_format", sorted(IMAGE_FORMATS))
+def test_encode_image_writes_the_format_it_reports(page, image_format):
+    data, media_type = encode_image(page, quality=50, image_format=image_format)
+
+    decoded = Image.open(io.BytesIO(data))
+    assert media_type == IMAGE_FORMATS[image_format][1] == Image.MIME[decoded.format]
+    assert decoded.size == page.size
+
+
+def test_encode_image_reads_encoded_bytes(page):
+    data, media_type = encode_image(png_bytes(page), image_format="jpeg")
+
+    assert media_type == "image/jpeg" and data[:2] == b"\xff\xd8"
+
+
+def test_encode_image_unknown_format(page):
+    with pytest.raises(ValueError, match="unknown image format"):
+        encode_image(page, image_format="gif")
+
+
+def test_images_are_served_with_their_type(client, make_test, submit):
+    test, key = make_test(10, 4)
+    submission_id = submit(test["id"], key, 10, 4).json()["submission_id"]
+
+    for url in (f"/submission/image/original/{submission_id}", f"/submission/image/graded/{submission_id}",
+                f"/test/image/key/{test['id']}/"):
+        response = client.get(url)
+        assert response.status_code == 200, url
+        assert response.headers["content-type"] == Image.MIME[Image.open(io.BytesIO(response.content)).format]
+        assert int(response.headers["content-length"]) == len(response.content)
+
+
+@pytest.fixture(scope="module")
+def page_bgr(page):
+    return cv2.cvtColor(np.asarray(page), cv2.COLOR_RGB2BGR)
+
+
+def test_array_to_pil_unpacks_bgr(page, page_bgr):
+    assert np.array_equal(np.asarray(array_to_pil(page_bgr)), np.asarray(page))
+    # a view that isn't contiguous, as the grader's crops are
+    assert np.array_equal(np.asarray(array_to_pil(page_bgr[::2, ::2])), np.asarray(page)[::2, ::2])
+
+    gray = array_to_pil(page_bgr[:, :, 0])
+    assert gray.mode == "L" and np.array_equal(np.asarray(gray), page_bgr[:, :, 0])
+
+
+@pytest.mark.parametrize("image_format", sorted(IMAGE_FORMATS))
+def test_arrays_encode_like_pil_images(page, page_bgr, image_format):
+    from_array, array_type = encode_image(page_bgr, quality=50, image_format=image_format)
+    from_pil, pil_type = encode_image(page, quality=50, image_format=image_format)
+
+    assert array_type == pil_type
+    if image_format != "jpeg": # the same Pillow encoder on the same pixels
+        assert from_array == from_pil
+    difference = cv2.absdiff(decode_image(from_array), decode_image(from_pil))
+    assert difference.mean() < 1
+
+
+@pytest.mark.parametrize("image_format", sorted(IMAGE_FORMATS))
+def test_decode_image_returns_bgr(page, page_bgr, image_format):
+    data, _ = encode_image(page, quality=90, image_format=image_format)
+
+    decoded = decode_image(data)
+
+    assert decoded.shape == page_bgr.shape and decoded.dtype == np.uint8
+    assert cv2.absdiff(decoded, page_bgr).mean() < 2
+    assert np.array_equal(decode_image(png_bytes(page)), page_bgr)
+
+
+def test_the_avif_encoder_is_available(page):
+    from PIL import features
+
+    # Pillow >= 11.2 ships it, see requirements.txt
+    assert features.check("avif")
+    data, media_type = encode_image(page, quality=50, image_format="avif")
+
+    assert media_type == "image/avif" and Image.open(io.BytesIO(data)).format == "AVIF"
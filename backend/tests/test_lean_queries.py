@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event, inspect
+
+from helpers import sheet, png_bytes
+
+
+@contextmanager
+def counted_queries():
+    '''
+    counts the statements the app sends to the database inside the block
+    '''
+    from db import engine
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+def test_json_payloads_are_deferred(make_test, submit):
+    import tables
+    from db import SessionLocal
+
+    test, key = make_test(10, 4)
+    submission_id = submit(test["id"], key, 10, 4).json()["submission_id"]
+
+    with SessionLocal() as db:
+        submission = db.get(tables.Submission, submission_id)
+        assert {"answers", "result"} <= inspect(submission).unloaded
+        assert "answers" in inspect(db.get(tables.Test, test["id"])).unloaded
+        # still there when asked for
+        assert submission.result is not None
+
+
+def test_listing_takes_the_same_queries_for_more_submissions(client, make_test, submit, student):
+    test, key = make_test(10, 4)
+    submit(test["id"], key, 10, 4)
+    with counted_queries() as one:
+        assert len(client.get(f"/submission/test/{test['id']}").json()) == 1
+
+    # a second (anonymous) submission to the same test
+    response = client.post(
+        "/submission/?mechanical=true",
+        files={"submission_image": ("sheet.png", png_bytes(sheet(10, 4, key).image), "image/png")},
+        data={"test_id": test["id"]},
+    )
+    assert response.status_code == 200, response.text
+    with counted_queries() as two:
+        listing = client.get(f"/submission/test/{test['id']}").json()
+
+    assert len(two) == len(one)
+    assert sorted(item["student_name"] for item in listing) == ["", student["name"]]
+    assert set(listing[0]) >= {"id", "student_id", "student_name", "grade", "submission_time"}
+
+
+def test_student_listings(client, make_test, submit, student, course):
+    test, key = make_test(10, 4)
+    submission_id = submit(test["id"], key, 10, 4).json()["submission_id"]
+
+    single = client.get(f"/submission/{submission_id}").json()
+    assert single["student_name"] == student["name"] and single["grade"] == 100.0
+
+    listing = client.get(f"/submission/student/{student['id']}").json()
+    assert submission_id in [item["id"] for item in listing]
+
+    in_course = client.get(f"/submission/student/{student['id']}/{course['id']}").json()
+    assert submission_id in [item["id"] for item in in_course]
+    assert client.get(f"/submission/student/{student['id']}/999999").status_code == 404
+
+
+def test_listings_of_what_does_not_exist(client):
+    assert client.get("/submission/test/no-such-test").status_code == 404
+    assert client.get("/submission/student/999999").status_code == 404
+    assert client.get("/submission/999999").status_code == 404
+
+
+def test_course_listing_loads_students_and_tests_for_the_whole_page(client, course, make_test):
+    make_test(10, 4)
+
+    with counted_queries() as statements:
+        courses = client.get("/course/").json()
+
+    assert any(item["name"] == course["name"] and item["tests"] for item in courses)
+    # the courses, their students and their tests, however many courses there are
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) <= 3
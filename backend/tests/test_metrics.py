@@ -0,0 +1,59 @@
+from metrics import GradingMetrics, Histogram, MEMORY_BUCKETS
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        h.observe(value)
+
+    # an observation on a bound counts in that bucket, like Prometheus' le
+    assert h.cumulative() == [("0.1", 2), ("1.0", 3), ("+Inf", 4)]
+    assert h.snapshot()["mean"] == round(3.65 / 4, 6)
+    assert Histogram((1,)).snapshot()["mean"] is None
+
+
+def test_observe_aggregates_stages_memory_and_outcomes():
+    metrics = GradingMetrics()
+    metrics.observe({"decode": 0.02, "warp": 0.03}, peak_rss_kb=200_000)
+    metrics.observe({"decode": 0.04})
+    metrics.count("failed")
+
+    snapshot = metrics.snapshot()
+
+    assert snapshot["outcomes"] == {"graded": 2, "failed": 1}
+    assert snapshot["stages"]["decode"]["count"] == 2
+    assert snapshot["stages"]["decode"]["sum"] == 0.06
+    assert snapshot["stages"]["warp"]["count"] == 1
+    assert snapshot["peak_rss_kb"]["count"] == 1
+
+
+def test_prometheus_exposition():
+    metrics = GradingMetrics()
+    metrics.observe({"decode": 0.02}, peak_rss_kb=100_000)
+
+    lines = metrics.prometheus().splitlines()
+
+    assert 'livetest_grading_total{outcome="graded"} 1' in lines
+    assert 'livetest_grading_stage_seconds_bucket{stage="decode",le="0.025"} 1' in lines
+    assert 'livetest_grading_stage_seconds_bucket{stage="decode",le="0.01"} 0' in lines
+    assert 'livetest_grading_stage_seconds_count{stage="decode"} 1' in lines
+    assert 'livetest_grading_peak_rss_kilobytes_bucket{le="+Inf"} 1' in lines
+    assert len([line for line in lines if "peak_rss_kilobytes_bucket" in line]) == len(MEMORY_BUCKETS) + 1
+    # every sample is a name, optional labels and a number
+    for line in lines:
+        if not line.startswith("#"):
+            float(line.rsplit(" ", 1)[1])
+
+
+def test_metrics_endpoints_report_graded_submissions(client, make_test, submit):
+    test, key = make_test(10, 4)
+    assert submit(test["id"], key, 10, 4).status_code == 200
+
+    text = client.get("/metrics/")
+    assert text.status_code == 200 and text.headers["content-type"].startswith("text/plain")
+    assert "livetest_grading_stage_seconds_bucket" in text.text
+
+    snapshot = client.get("/metrics/json").json()
+    assert snapshot["outcomes"]["graded"] >= 1
+    assert snapshot["stages"]["total"]["count"] >= 1
+    assert set(snapshot["sheet_cache"]) >= {"entries", "bytes", "hits", "misses"}
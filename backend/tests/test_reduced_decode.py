@@ -0,0 +1,112 @@
+import io
+import json
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import grading
+from answer_sheets import Pictron, OMRGrader
+from answer_sheets.grader import reduced_decode_factor
+from db import decode_image
+from helpers import photo, sheet, png_bytes
+
+ANSWERS = {str(q): "ABCD"[(q * 5) % 4] for q in range(1, 41)}
+
+
+@pytest.fixture(scope="module")
+def phone_photo():
+    # 3024x4032, as a 12MP phone takes them
+    jpeg, _ = photo(40, 4, ANSWERS, seed=4)
+    return jpeg
+
+
+@pytest.fixture(scope="module")
+def rotated_photo(phone_photo):
+    '''
+    the photo stored sideways with an EXIF orientation that turns it upright, like
+    phones save them
+    '''
+    image = Image.open(io.BytesIO(phone_photo)).transpose(Image.Transpose.ROTATE_90)
+    exif = Image.Exif()
+    exif[0x0112] = 6 # rotate 90 clockwise to display
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90, exif=exif)
+    return buffer.getvalue()
+
+
+def grader(**kwargs):
+    return OMRGrader(4, 40, mechanical=False, render=False, registration="fiducial",
+                     layout=Pictron.template_layout(40, 4), **kwargs)
+
+
+def jpeg_of_size(width:int, height:int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("size, min_short_side, factor", [
+    ((3024, 4032), 700, 4), ((3024, 4032), 1000, 2), ((3024, 4032), 3000, 1),
+    ((3024, 4032), 300, 8), ((4032, 3024), 1000, 2), ((600, 800), 700, 1),
+])
+def test_reduced_decode_factor(size, min_short_side, factor):
+    assert reduced_decode_factor(jpeg_of_size(*size), min_short_side) == factor
+
+
+def test_only_jpegs_are_decoded_reduced():
+    assert reduced_decode_factor(png_bytes(Image.new("RGB", (4000, 4000))), 100) == 1
+    assert reduced_decode_factor(b"\xff\xd8 not really a jpeg", 100) == 1
+
+
+def test_the_template_sets_how_small_a_photo_is_decoded():
+    small_bubbles = OMRGrader(7, 200, layout=Pictron.template_layout(200, 7)).decode_short_side()
+
+    assert grader().decode_short_side() < small_bubbles
+    assert grader(min_bubble_px=None).decode_short_side() is None
+    assert OMRGrader(4, 40).decode_short_side() is None
+
+
+def test_a_phone_photo_is_graded_at_a_reduced_size(phone_photo):
+    reduced, full = grader(), grader(min_bubble_px=None)
+
+    assert reduced.run(bytes_obj=phone_photo, key=ANSWERS)[0] == 100.0
+    assert full.run(bytes_obj=phone_photo, key=ANSWERS)[0] == 100.0
+
+    assert reduced.decode_factor == 2 and full.decode_factor == 1
+    assert list(reduced.source_size) == [3024 // 2, 4032 // 2]
+    # the same page corners, in the pixels of each decode
+    assert np.abs(reduced.corners * 2 - full.corners).max() < 6
+
+
+def test_a_scan_is_decoded_in_full():
+    scan = grader()
+    scan.mechanical = True
+
+    assert scan.run(bytes_obj=png_bytes(sheet(40, 4, ANSWERS).image), key=ANSWERS)[0] == 100.0
+    assert scan.decode_factor == 1
+
+
+@pytest.mark.parametrize("upload", ["phone_photo", "rotated_photo"])
+def test_the_original_is_stored_at_full_resolution(upload, request):
+    image = request.getfixturevalue(upload)
+
+    result = grading.grade_submission(image, 4, 40, ANSWERS)
+
+    assert result["grade"] == 100.0
+    # the upload as sent, no full size decode to encode it again
+    assert result["submission_image"] is image and result["submission_image_type"] == "image/jpeg"
+    original = decode_image(result["submission_image"])
+    # upright (EXIF applied when it is decoded), as the grader saw it, but at the size it was taken
+    assert original.shape[1::-1] == (3024, 4032)
+    assert json.loads(result["result"])["source_size"] == [1512, 2016]
+
+    # the corners found at the reduced size still cut the page out of the original
+    renditions = grading.render_graded_image(result["submission_image"], result["result"], 4, 40)
+    graded = decode_image(renditions["full"][0]).astype(np.float32)
+    as_graded = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+    expected = OMRGrader(4, 40, font_path=grading.FONT_PATH).render_result(as_graded, json.loads(result["result"]))
+    assert graded.shape == expected.shape
+    # the rendition is lossy (quality 15), a page off by a few pixels is at 20+
+    assert cv2.absdiff(graded, expected.astype(np.float32)).mean() < 12
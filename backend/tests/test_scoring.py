@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+import pytest
+
+from answer_sheets import OMRGrader
+from answer_sheets.grader import score_bubbles, score_boxes
+from helpers import sheet, png_bytes
+
+
+def circle(cx, cy, r):
+    return cv2.ellipse2Poly((cx, cy), (r, r), 0, 0, 360, 10).reshape(-1, 1, 2)
+
+
+def test_score_bubbles_counts_each_bubble_once():
+    thresh = np.zeros((100, 200), np.uint8)
+    cv2.circle(thresh, (50, 50), 20, 255, -1) # first bubble filled in
+    bubbles = [circle(50, 50, 20), circle(150, 50, 20)]
+
+    totals = score_bubbles(thresh, bubbles)
+
+    assert totals.tolist()[1] == 0
+    # the drawn disc and the traced contour differ on the rim only
+    assert abs(totals[0] - np.pi * 20 ** 2) < 2 * np.pi * 20
+
+
+def test_score_bubbles_matches_one_mask_per_bubble():
+    rng = np.random.default_rng(0)
+    thresh = (rng.random((120, 300)) > 0.5).astype(np.uint8) * 255
+    bubbles = [circle(30 + 60 * i, 60, 22) for i in range(5)]
+
+    expected = []
+    for contour in bubbles:
+        mask = np.zeros_like(thresh)
+        cv2.drawContours(mask, [contour], -1, 255, -1)
+        expected.append(cv2.countNonZero(cv2.bitwise_and(thresh, thresh, mask=mask)))
+
+    assert score_bubbles(thresh, bubbles).tolist() == expected
+
+
+def test_score_boxes_matches_slicing():
+    rng = np.random.default_rng(1)
+    thresh = (rng.random((80, 160)) > 0.3).astype(np.uint8) * 255
+    boxes = [[0, 0, 40, 40], [40, 10, 100, 70], [100, 40, 160, 80]]
+
+    totals = score_boxes(thresh, boxes, inset=0)
+
+    assert totals.tolist() == [int(np.count_nonzero(thresh[y1:y2, x1:x2])) for x1, y1, x2, y2 in boxes]
+
+
+def test_score_boxes_skips_the_outline():
+    thresh = np.zeros((100, 100), np.uint8)
+    cv2.rectangle(thresh, (10, 10), (89, 89), 255, 5) # a printed, empty bubble
+
+    assert score_boxes(thresh, [[10, 10, 90, 90]]).tolist() == [0]
+    assert score_boxes(thresh, [[10, 10, 90, 90]], inset=0).tolist()[0] > 0
+
+
+def test_score_boxes_clips_to_the_image():
+    thresh = np.full((50, 50), 255, np.uint8)
+
+    assert score_boxes(thresh, [[-20, -20, 70, 70]], inset=0).tolist() == [2500]
+
+
+@pytest.mark.parametrize("num_questions, num_choices", [(20, 4), (50, 5)])
+def test_contour_mode_reads_every_bubble(num_questions, num_choices):
+    answer_sheet = sheet(num_questions, num_choices, random_filled=True)
+    key = {str(q): c for q, c in answer_sheet.random_choices.items()}
+
+    grader = OMRGrader(num_choices, num_questions, render=False)
+    grade, graded, choices = grader.run(bytes_obj=png_bytes(answer_sheet.image), key=key)
+
+    assert grade == 100.0
+    assert {str(q): letter for q, (_, _, letter) in choices.items()} == key
@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+from answer_sheets import Pictron, OMRGrader
+from answer_sheets.grader import Scratch, scratch, to_gray, equalize_histogram, pre_process, square_kernel
+from helpers import photo, sheet
+
+ANSWERS = {str(q): "ABCD"[(q * 7) % 4] for q in range(1, 21)}
+
+
+@pytest.fixture(scope="module")
+def page():
+    return cv2.cvtColor(np.asarray(sheet(20, 4, ANSWERS).image), cv2.COLOR_RGB2BGR)
+
+
+@pytest.fixture(scope="module")
+def photos():
+    return [photo(20, 4, ANSWERS, seed=seed)[0] for seed in range(3)]
+
+
+def grader():
+    return OMRGrader(4, 20, mechanical=False, render=False, registration="fiducial",
+                     layout=Pictron.template_layout(20, 4))
+
+
+def test_buffers_are_reused_until_the_shape_changes():
+    buffers = Scratch()
+    first = buffers.buffer("gray", (10, 20))
+
+    assert buffers.buffer("gray", (10, 20)) is first
+    assert buffers.buffer("gray", (20, 10)) is not first
+    assert buffers.buffer("gray", (20, 10), np.float32).dtype == np.float32
+
+
+def test_every_thread_has_its_own_buffers():
+    mine = scratch.buffer("test", (4, 4))
+    theirs = []
+    thread = threading.Thread(target=lambda: theirs.append((scratch.buffer("test", (4, 4)), scratch.clahe)))
+    thread.start()
+    thread.join()
+
+    assert theirs[0][0] is not mine and theirs[0][1] is not scratch.clahe
+
+
+def test_to_gray(page):
+    gray = to_gray(page, "test_gray")
+
+    assert np.array_equal(gray, cv2.cvtColor(page, cv2.COLOR_BGR2GRAY))
+    assert gray is scratch.buffers["test_gray"]
+    # already gray, not copied
+    assert to_gray(gray) is gray
+    assert not np.shares_memory(to_gray(page), gray)
+
+
+def test_equalize_histogram(page):
+    gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+    expected = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+    dst = np.empty_like(gray)
+
+    assert equalize_histogram(gray, dst=dst) is dst
+    assert np.array_equal(dst, expected)
+    assert np.array_equal(equalize_histogram(page), expected)
+
+
+def test_pre_process_matches_the_unbuffered_steps(page):
+    gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+    thresh = cv2.threshold(cv2.GaussianBlur(gray, (5, 5), 0), 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    expected = cv2.dilate(cv2.Canny(thresh, 50, 150), np.ones((5, 5), np.uint8), iterations=2)
+
+    assert np.array_equal(pre_process(page), expected)
+    assert not square_kernel(5).flags.writeable
+
+
+def test_what_a_grader_keeps_is_not_scratch(photos):
+    first, second = grader(), grader()
+
+    assert first.run(bytes_obj=photos[0], key=ANSWERS)[0] == 100.0
+    kept = {name: getattr(first, name).copy() for name in ("image", "gray", "thresh", "source_image")}
+    assert second.run(bytes_obj=photos[1], key=ANSWERS)[0] == 100.0
+
+    for name, copy in kept.items():
+        array = getattr(first, name)
+        assert np.array_equal(array, copy), name
+        assert not any(np.shares_memory(array, buffer) for buffer in scratch.buffers.values()), name
+
+
+def test_threads_grade_like_one_thread(photos):
+    def grade(image):
+        graded = grader()
+        graded.run(bytes_obj=image, key=ANSWERS)
+        return graded.result
+
+    sequential = [grade(image) for image in photos * 2]
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        threaded = list(pool.map(grade, photos * 2))
+
+    assert threaded == sequential
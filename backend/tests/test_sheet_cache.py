@@ -0,0 +1,116 @@
+from sheet_cache import SheetCache, sheet_cache, sheet_key
+
+CONFIG = {"num_questions": 10, "num_choices": 4}
+
+
+def key(course="PLC", test="Exam", encoding="png"):
+    return sheet_key(CONFIG, course, test, encoding)
+
+
+def test_sheet_key_changes_with_every_input():
+    keys = {key(), key(course="CS"), key(test="Quiz"), key(encoding="webp-30"),
+            sheet_key({**CONFIG, "num_choices": 5}, "PLC", "Exam", "png")}
+
+    assert len(keys) == 5
+    # filed under the course and test names
+    assert key()[:2] == key(encoding="webp-30")[:2]
+
+
+def test_least_recently_used_sheets_are_evicted():
+    cache = SheetCache(max_bytes=10)
+    cache.put(key(test="a"), b"aaaa")
+    cache.put(key(test="b"), b"bbbb")
+    cache.get(key(test="a"))
+    cache.put(key(test="c"), b"cccc")
+
+    assert cache.get(key(test="b")) is None
+    assert cache.get(key(test="a")) == b"aaaa" and cache.get(key(test="c")) == b"cccc"
+    assert cache.stats() == {"entries": 2, "bytes": 8, "hits": 3, "misses": 1}
+
+
+def test_sheets_over_the_budget_are_not_kept():
+    cache = SheetCache(max_bytes=3)
+    cache.put(key(), b"toolong")
+
+    assert cache.get(key()) is None and cache.stats()["bytes"] == 0
+
+
+def test_get_or_render_renders_once():
+    cache = SheetCache(max_bytes=100)
+    renders = []
+
+    for _ in range(3):
+        assert cache.get_or_render(key(), lambda: renders.append(1) or b"sheet") == b"sheet"
+
+    assert len(renders) == 1
+
+
+def test_workers_share_the_disk_cache(tmp_path):
+    one, other = SheetCache(100, str(tmp_path)), SheetCache(100, str(tmp_path))
+    one.put(key(), b"sheet")
+
+    assert other.get(key()) == b"sheet"
+    # a memory only budget of 0 still reads the shared directory
+    assert SheetCache(0, str(tmp_path)).get(key()) == b"sheet"
+
+
+def test_invalidate_a_test_or_a_whole_course(tmp_path):
+    cache = SheetCache(100, str(tmp_path))
+    for course, test in (("PLC", "Exam"), ("PLC", "Quiz"), ("CS", "Exam")):
+        cache.put(key(course, test), b"sheet")
+
+    cache.invalidate("PLC", "Exam")
+    assert cache.get(key("PLC", "Exam")) is None
+    assert cache.get(key("PLC", "Quiz")) == b"sheet"
+
+    cache.invalidate("PLC")
+    assert cache.get(key("PLC", "Quiz")) is None
+    assert cache.get(key("CS", "Exam")) == b"sheet"
+    # the files are gone too, not only the memory entries
+    assert SheetCache(100, str(tmp_path)).get(key("PLC", "Quiz")) is None
+
+
+def test_renaming_a_test_drops_its_sheets(client, course, make_test):
+    test, _ = make_test(10, 4)
+    cached = sheet_key(CONFIG, course["name"], test["name"], "png")
+    sheet_cache.put(cached, b"old sheet")
+
+    response = client.patch(f"/test/{test['id']}/", json={"name": test["name"] + " (retake)"})
+
+    assert response.status_code == 200, response.text
+    assert sheet_cache.get(cached) is None
+
+
+def test_the_disk_cache_keeps_to_its_budget(tmp_path):
+    import os
+    cache = SheetCache(0, str(tmp_path), max_disk_bytes=10)
+    cache.put(key(test="a"), b"aaaa")
+    cache.put(key(test="b"), b"bbbb")
+    # a is used again, b is now the least recently used file
+    os.utime(cache.file_path(key(test="b")), (1, 1))
+    assert cache.get(key(test="a")) == b"aaaa"
+
+    cache.put(key(test="c"), b"cccc")
+
+    assert cache.get(key(test="b")) is None
+    assert cache.get(key(test="a")) == b"aaaa" and cache.get(key(test="c")) == b"cccc"
+    # the emptied test directory went with it
+    assert not os.path.exists(os.path.dirname(cache.file_path(key(test="b"))))
+
+
+def test_deleting_a_test_drops_its_sheets(client, course, make_test):
+    test, _ = make_test(10, 4)
+    cached = sheet_key(CONFIG, course["name"], test["name"], "png")
+    sheet_cache.put(cached, b"old sheet")
+
+    assert client.delete(f"/test/{test['id']}/").status_code == 200
+    assert sheet_cache.get(cached) is None
+
+
+def test_answer_keys_are_not_cached_per_test(client, make_test):
+    entries = sheet_cache.stats()["entries"]
+
+    test, _ = make_test(10, 4)
+
+    assert client.get(f"/test/image/blank/{test['id']}/").status_code == 200
+    assert sheet_cache.stats()["entries"] == entries
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from answer_sheets import Pictron
+
+LETTERS = "ABCDEFG"
+
+
+def blank_page(config):
+    pictron = Pictron(**config)
+    pictron.image = Image.new("RGB", (pictron.img_width, pictron.img_height), (255, 255, 255))
+    pictron.draw = ImageDraw.Draw(pictron.image)
+    return pictron
+
+
+def drawn_bubble_by_bubble(config, answers):
+    '''
+    the answer bubbles drawn one ellipse and one label at a time, how they were before sprites
+    '''
+    pictron = blank_page(config)
+    for n, (label_xy, bubbles) in pictron.bubblePositions(pictron.page_margins[3], pictron.page_margins[0]).items():
+        fill_answer = LETTERS.index(answers[n]) if n in answers else None
+        pictron.addBubbleLabel(*label_xy, f"{n:>3}")
+        for choice, (x, y) in enumerate(bubbles):
+            pictron.addBubble(x, y, filled=choice == fill_answer, line_thickness=pictron.line_thickness)
+            if choice != fill_answer:
+                pictron.addBubbleLabel(x, y, LETTERS[choice], (200, 200, 200))
+    return np.asarray(pictron.image)
+
+
+# 200x3 and 200x7 space their bubbles on half pixels
+@pytest.mark.parametrize("num_questions, num_choices", [(20, 4), (50, 5), (200, 3), (200, 7)])
+def test_sprites_draw_what_the_shapes_drew(num_questions, num_choices):
+    config = Pictron.find_best_config(num_questions, num_choices)
+    answers = {q: LETTERS[(q * 3) % num_choices] for q in range(1, num_questions + 1, 2)}
+
+    pictron = blank_page(config)
+    pictron.addAnswerBubbles(pictron.page_margins[3], pictron.page_margins[0], answers=answers)
+
+    assert np.array_equal(np.asarray(pictron.image), drawn_bubble_by_bubble(config, answers))
+
+
+def test_sprites_are_drawn_once_per_choice():
+    config = Pictron.find_best_config(40, 4)
+    pictron = blank_page(config)
+
+    pictron.addAnswerBubbles(pictron.page_margins[3], pictron.page_margins[0], randomize_filled=True)
+    sprites = len(pictron.sprites)
+    pictron.addAnswerBubbles(pictron.page_margins[3], pictron.page_margins[0], randomize_filled=True)
+
+    # a filled and an empty tile per choice and sub pixel offset, however many questions
+    assert len(pictron.sprites) == sprites <= 2 * 4 * 4
+    assert {choice for choice, _, _, _ in pictron.sprites} == {0, 1, 2, 3}
+
+
+def test_generate_fills_the_blank_page_like_a_full_draw():
+    config = Pictron.find_best_config(40, 4)
+    answers = {q: LETTERS[q % 4] for q in range(1, 41)}
+
+    generated = Pictron(**config)
+    generated.generate(answers=answers)
+
+    drawn = blank_page(config)
+    drawn.pasteAlignmentImages(drawn.alignmentPositions())
+    drawn.drawSignatureLine()
+    drawn.pasteImage(*Pictron.logo_xy, drawn.logo_image)
+    drawn.addAnswerBubbles(drawn.page_margins[3], drawn.page_margins[0], answers=answers)
+
+    assert np.array_equal(np.asarray(generated.image), np.asarray(drawn.image))
@@ -0,0 +1,100 @@
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from answer_sheets import Pictron
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+def parse(svg:str):
+    return ElementTree.fromstring(svg.encode())
+
+
+def uses(root, href:str):
+    return [use for use in root.iter(f"{SVG}use") if use.get("href") == href]
+
+
+@pytest.mark.parametrize("num_questions, num_choices", [(10, 2), (50, 5), (200, 7)])
+def test_one_bubble_per_choice(num_questions, num_choices):
+    pictron = Pictron(**Pictron.find_best_config(num_questions, num_choices))
+
+    root = parse(pictron.generateSVG(random_filled=True))
+
+    assert len(uses(root, "#bubble")) == num_questions * (num_choices - 1)
+    assert len(uses(root, "#filled")) == num_questions
+    assert len(uses(root, "#fiducial")) == 4
+    assert root.get("width") == "8.5in" and root.get("viewBox") == f"0 0 {pictron.img_width} {pictron.img_height}"
+
+
+def test_bubbles_sit_in_the_layout_boxes():
+    answers = {1: "B", 2: "D", 7: "A"}
+    pictron = Pictron(**Pictron.find_best_config(10, 4))
+    layout = pictron.layout()
+
+    root = parse(pictron.generateSVG(answers=answers))
+
+    anchors = {(int(use.get("x")), int(use.get("y"))): use.get("href")
+               for use in root.iter(f"{SVG}use") if use.get("href") != "#fiducial"}
+    origin = pictron.bubbleBox(0, 0)[:2]
+    boxes = {(q, "ABCD"[choice]): (x1 - origin[0], y1 - origin[1])
+             for q, choice_boxes in layout["questions"].items()
+             for choice, (x1, y1, _, _) in enumerate(choice_boxes)}
+    assert set(anchors) == set(boxes.values())
+    filled = {answer for answer, anchor in boxes.items() if anchors[anchor] == "#filled"}
+    assert filled == set(answers.items())
+
+
+def test_the_random_choices_are_the_filled_bubbles():
+    pictron = Pictron(**Pictron.find_best_config(20, 4))
+
+    root = parse(pictron.generateSVG(random_filled=True))
+
+    assert sorted(pictron.random_choices) == list(range(1, 21))
+    assert len(uses(root, "#filled")) == 20
+
+
+def test_names_are_escaped():
+    pictron = Pictron(**Pictron.find_best_config(10, 4))
+
+    svg = pictron.generateSVG(course_name="R&D <101>", test_name='"Final"')
+
+    texts = [text.text for text in parse(svg).iter(f"{SVG}text")]
+    assert 'R&D <101> : "Final"' in texts
+    assert "<101>" not in svg
+
+
+def test_signature_line_is_where_the_raster_draws_it():
+    pictron = Pictron(**Pictron.find_best_config(10, 4))
+    pictron.image = Image.new("RGB", (pictron.img_width, pictron.img_height), "white")
+    pictron.draw = ImageDraw.Draw(pictron.image)
+    pictron.drawSignatureLine()
+
+    rects = [rect for rect in parse(pictron.generateSVG()).iter(f"{SVG}rect") if rect.get("fill") == "black"]
+
+    assert len(rects) == 1
+    x, y, w, h = (int(rects[0].get(name)) for name in ("x", "y", "width", "height"))
+    dark = np.asarray(pictron.image.convert("L"))[y:y + h, :] < 128
+    columns = np.flatnonzero(dark.all(axis=0))
+    # every row of the rect is line, the whole line
+    assert columns[0] == x and columns[-1] == x + w - 1
+    assert not (np.asarray(pictron.image.convert("L"))[[y - 1, y + h], x:x + w] < 128).any()
+
+
+def test_blank_template_as_svg(client, course):
+    response = client.get(f"/test/image/blank/20/4/{course['id']}",
+                          params={"output": "svg", "test_name": "Quiz & Co"})
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("image/svg+xml")
+    root = parse(response.text)
+    assert len(uses(root, "#bubble")) == 80
+    assert "PLC : Quiz & Co" in [text.text for text in root.iter(f"{SVG}text")]
+
+
+def test_unknown_output_is_rejected(client, course):
+    response = client.get(f"/test/image/blank/20/4/{course['id']}", params={"output": "pdf"})
+
+    assert response.status_code == 422
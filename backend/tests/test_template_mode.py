@@ -0,0 +1,94 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from answer_sheets import Pictron, OMRGrader
+from answer_sheets.templates import registry
+from helpers import sheet, png_bytes
+
+TEMPLATES = [(q, c) for c, counts in registry.counts().items() for q in counts]
+
+
+@pytest.mark.parametrize("num_questions, num_choices", [(10, 2), (40, 4), (200, 7)])
+def test_layout_has_a_box_per_bubble(num_questions, num_choices):
+    layout = Pictron.template_layout(num_questions, num_choices)
+    page_w, page_h = layout["page_size"]
+
+    assert sorted(layout["questions"]) == list(range(1, num_questions + 1))
+    assert layout["num_choices"] == num_choices
+    for boxes in layout["questions"].values():
+        assert len(boxes) == num_choices
+        for x1, y1, x2, y2 in boxes:
+            assert 0 <= x1 < x2 <= page_w and 0 <= y1 < y2 <= page_h
+
+
+def test_layout_boxes_do_not_overlap():
+    layout = Pictron.template_layout(200, 7)
+    boxes = [box for boxes in layout["questions"].values() for box in boxes]
+
+    for a, b in itertools.combinations(boxes, 2):
+        assert a[2] <= b[0] or b[2] <= a[0] or a[3] <= b[1] or b[3] <= a[1], (a, b)
+
+
+def test_layout_places_the_fiducials_in_the_corners():
+    layout = Pictron.template_layout(40, 4)
+    page_w, page_h = layout["page_size"]
+    centers = np.array([[(x1 + x2) / 2, (y1 + y2) / 2] for x1, y1, x2, y2 in layout["fiducials"]])
+
+    # top left, top right, bottom right, bottom left
+    assert (centers[[0, 3], 0] < page_w / 2).all() and (centers[[1, 2], 0] > page_w / 2).all()
+    assert (centers[[0, 1], 1] < page_h / 2).all() and (centers[[2, 3], 1] > page_h / 2).all()
+
+
+def test_template_layout_is_shared_and_matches_the_sheet():
+    config = Pictron.find_best_config(35, 4)
+
+    assert Pictron.template_layout(35, 4) is Pictron.template_layout(35, 4)
+    assert Pictron.template_layout(35, 4) == Pictron(**config).layout()
+    assert Pictron.template_layout(35, 9) is False
+
+
+def test_filled_bubbles_are_inside_their_boxes():
+    answers = {q: "C" for q in range(1, 11)}
+    layout = Pictron.template_layout(10, 4)
+    page = np.asarray(sheet(10, 4, answers).image.convert("L"))
+
+    for boxes in layout["questions"].values():
+        darkness = [255 - page[y1:y2, x1:x2].mean() for x1, y1, x2, y2 in boxes]
+        assert int(np.argmax(darkness)) == 2
+
+
+@pytest.mark.parametrize("num_questions, num_choices", TEMPLATES)
+def test_template_mode_grades_every_template(num_questions, num_choices):
+    answer_sheet = sheet(num_questions, num_choices, random_filled=True)
+    key = {str(q): c for q, c in answer_sheet.random_choices.items()}
+
+    grader = OMRGrader(num_choices, num_questions, render=False,
+                       layout=Pictron.template_layout(num_questions, num_choices))
+    grade, graded, choices = grader.run(bytes_obj=png_bytes(answer_sheet.image), key=key)
+
+    assert grade == 100.0
+    assert {str(q): letter for q, (_, _, letter) in choices.items()} == key
+
+
+def test_template_mode_grades_fewer_questions_than_the_template():
+    # a 35 question test is printed on the 40 question template
+    answers = {str(q): "B" for q in range(1, 36)}
+    grader = OMRGrader(4, 35, render=False, layout=Pictron.template_layout(35, 4))
+
+    grade, graded, choices = grader.run(bytes_obj=png_bytes(sheet(35, 4, answers).image), key=answers)
+
+    assert grade == 100.0
+    assert sorted(choices) == list(range(1, 36))
+
+
+def test_template_mode_marks_wrong_answers():
+    answers = {str(q): "A" for q in range(1, 11)}
+    key = dict(answers, **{"3": "D", "7": "B"})
+    grader = OMRGrader(4, 10, render=False, layout=Pictron.template_layout(10, 4))
+
+    grade, graded, _ = grader.run(bytes_obj=png_bytes(sheet(10, 4, answers).image), key=key)
+
+    assert grade == 80.0
+    assert [q for q, right in graded.items() if not right] == [3, 7]
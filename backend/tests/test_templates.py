@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from answer_sheets import Pictron
+from answer_sheets.templates import (
+    PRIMARY_CONFIG, TEMPLATE_COUNTS, TemplateRegistry, registry, template_size,
+)
+
+TEMPLATE = {"num_ans_options": 4, "num_questions": 20, "font_size": 8, "bubble_size": 18}
+
+
+def write_configs(tmp_path, configs:dict) -> str:
+    path = tmp_path / "configs.json"
+    path.write_text(json.dumps(configs))
+    return str(path)
+
+
+@pytest.mark.parametrize("num_questions, size", [
+    (1, 10), (10, 10), (11, 20), (35, 40), (51, 75), (101, 150), (200, 200),
+    (0, None), (-5, None), (201, None),
+])
+def test_template_size(num_questions, size):
+    assert template_size(num_questions) == size
+
+
+def test_every_template_of_perfect_configs_is_loaded():
+    counts = registry.counts()
+
+    assert sorted(counts) == [2, 3, 4, 5, 6, 7]
+    assert all(questions == list(TEMPLATE_COUNTS) for questions in counts.values())
+
+
+def test_config_is_the_template_with_the_primary_config():
+    config = registry.config(35, 4)
+
+    assert config["num_questions"] == 40 and config["num_ans_options"] == 4
+    assert config.items() >= PRIMARY_CONFIG.items()
+    # a new dict every call, Pictron can't change the registry's template
+    config["font_size"] = 99
+    assert registry.config(35, 4)["font_size"] != 99
+    assert registry.config(35, 4) == Pictron.find_best_config(35, 4)
+
+
+@pytest.mark.parametrize("num_questions, num_choices", [(201, 4), (0, 4), (20, 8), (20, 1)])
+def test_no_template(num_questions, num_choices):
+    assert registry.config(num_questions, num_choices) is None
+    assert Pictron.find_best_config(num_questions, num_choices) is False
+
+
+def test_a_valid_file_loads(tmp_path):
+    templates = TemplateRegistry(write_configs(tmp_path, {"4": [TEMPLATE]}))
+
+    assert templates.counts() == {4: [20]}
+    assert templates.config(15, 4)["bubble_size"] == 18
+
+
+@pytest.mark.parametrize("configs, message", [
+    ({"4": [{"num_questions": 20}]}, "missing"),
+    ({"4": [{**TEMPLATE, "bubble_size": 0}]}, "bubble_size"),
+    ({"4": [{**TEMPLATE, "font_size": "8"}]}, "font_size"),
+    ({"4": [{**TEMPLATE, "line_spacing": True}]}, "line_spacing"),
+    ({"5": [TEMPLATE]}, "choices"),
+    ({"4": [{**TEMPLATE, "num_questions": 25}]}, "is not one of"),
+    ({"4": [TEMPLATE, TEMPLATE]}, "twice"),
+])
+def test_broken_templates_fail_to_load(tmp_path, configs, message):
+    with pytest.raises(ValueError, match=message):
+        TemplateRegistry(write_configs(tmp_path, configs))
+
+
+def test_assets_are_read_once():
+    config = PRIMARY_CONFIG
+
+    assert registry.font(config["font_path"], 12) is registry.font(config["font_path"], 12)
+    assert registry.image(config["logo_path"]) is registry.image(config["logo_path"])
+    gray = registry.gray(config["img_align_path"])
+    assert gray.ndim == 2 and gray is registry.gray(config["img_align_path"])
+    assert registry.data_uri(config["logo_path"]).startswith("data:image/png;base64,")
+
+
+def test_missing_assets(tmp_path):
+    missing = str(tmp_path / "missing.png")
+
+    with pytest.raises(FileNotFoundError):
+        registry.image(missing)
+    with pytest.raises(FileNotFoundError):
+        registry.gray(missing)
@@ -6,7 +6,6 @@ import { AuthContext } from '../context/auth';
 import { BackButton } from './BackButton';
 import badAnswersImage from '../assets/bad_answers.png';
 import goodAnswersImage from '../assets/good_answers.png';
-import pako from 'pako';
 import { TakeScantronPicture } from './TakeScantronPicture';
 
 export const SubmissionPage = () => {
@@ -106,9 +105,7 @@ export const SubmissionPage = () => {
         throw new Error(`Error fetching graded image: ${response.statusText}`);
       }
 
-      const compressedArrayBuffer = await response.arrayBuffer();
-      const decompressedData = pako.inflate(new Uint8Array(compressedArrayBuffer));
-      const blob = new Blob([decompressedData], { type: 'image/jpeg' });
+      const blob = await response.blob(); // typed by the response's Content-Type
       const imageObjectURL = URL.createObjectURL(blob);
       setGradedImage(imageObjectURL);
     } catch (error) {
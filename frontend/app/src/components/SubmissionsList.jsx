@@ -1,6 +1,5 @@
 import React, { useEffect, useState } from 'react';
 import { StarIcon } from '@heroicons/react/20/solid';
-import pako from 'pako';
 import { instanceURL } from '../api/helpers';
 
 function classNames(...classes) {
@@ -33,14 +32,12 @@ export const SubmissionsList = ({ submissions, onDeleteSubmission }) => {
       try {
         const images = await Promise.all(
           submissions.map(async (submission) => {
-            const gradedImageURL = `${instanceURL}/submission/image/graded/${submission.id}`;
+            const gradedImageURL = `${instanceURL}/submission/image/graded/${submission.id}?size=preview`;
             const response = await fetch(gradedImageURL);
             if (!response.ok) {
               throw new Error('Failed to fetch image');
             }
-            const compressedArrayBuffer = await response.arrayBuffer();
-            const decompressedData = pako.inflate(new Uint8Array(compressedArrayBuffer));
-            const blob = new Blob([decompressedData], { type: 'image/jpeg' });
+            const blob = await response.blob();
             return { ...submission, gradedImage: URL.createObjectURL(blob) };
           })
         );
@@ -1,5 +1,4 @@
 import React, { useState, useEffect, useContext } from "react";
-import pako from 'pako';
 import { useNavigate, useParams } from "react-router-dom";
 import { AuthContext } from "../context/auth";
 import { EasyRequest, defHeaders, instanceURL } from "../api/helpers";
@@ -172,9 +171,7 @@ export const TestPage = () => {
         throw new Error('Failed to fetch image');
       }
 
-      const compressedArrayBuffer = await response.arrayBuffer();
-      const decompressedData = pako.inflate(new Uint8Array(compressedArrayBuffer));
-      const blob = new Blob([decompressedData], { type: 'image/jpeg' });
+      const blob = await response.blob(); // typed by the response's Content-Type
       const downloadUrl = URL.createObjectURL(blob);
 
       // Open the image in a new tab
@@ -12,7 +12,6 @@ import {
 } from "@headlessui/react";
 import { ChevronDownIcon, Bars3Icon } from "@heroicons/react/24/outline";
 import QRCode from "qrcode.react";
-import pako from 'pako';
 
 export const EachCoursePage = () => {
   const { id } = useParams();
@@ -174,17 +173,11 @@ export const EachCoursePage = () => {
               throw new Error('Failed to fetch images');
             }
   
-            const [gradedImageArrayBuffer, originalImageArrayBuffer] = await Promise.all([
-              gradedImageRes.arrayBuffer(),
-              originalImageRes.arrayBuffer(),
+            const [gradedImageBlob, originalImageBlob] = await Promise.all([
+              gradedImageRes.blob(),
+              originalImageRes.blob(),
             ]);
   
-            const gradedImageData = pako.inflate(new Uint8Array(gradedImageArrayBuffer));
-            const originalImageData = pako.inflate(new Uint8Array(originalImageArrayBuffer));
-  
-            const gradedImageBlob = new Blob([gradedImageData], { type: 'image/jpeg' });
-            const originalImageBlob = new Blob([originalImageData], { type: 'image/jpeg' });
-  
             return {
               id: submission.id,
               gradedImage: URL.createObjectURL(gradedImageBlob),